@@ -0,0 +1,386 @@
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional, Callable
+from agents.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+# Task ids become file names, so they may not contain path separators
+TASK_ID_PATTERN = re.compile(r'[A-Za-z0-9_.-]+')
+
+class TaskQueueFull(Exception):
+    """Raised when a task is submitted while the queue is at capacity"""
+
+class A2AServer:
+    """Long-lived A2A task server.
+
+    Task cards are POSTed to ``/tasks`` and queued by ``priority`` (higher
+    first, FIFO within a priority). A fixed pool of worker threads runs them
+    on warm testers, one per worker, built once by ``tester_factory``.
+    Clients poll ``GET /tasks/<id>`` (optionally long-polling with
+    ``?wait=<seconds>``) or stream status changes as server-sent events from
+    ``GET /tasks/<id>/events``. Each finished task is also written to
+    ``<output_dir>/<id>_result.json`` as in one-shot mode; card ids must
+    match ``[A-Za-z0-9_.-]+``.
+    """
+
+    def __init__(self,
+                 task_handler: Callable[[Dict[str, Any], Any], Dict[str, Any]],
+                 tester_factory: Optional[Callable[[], Any]] = None,
+                 host: str = 'localhost',
+                 port: int = 5000,
+                 workers: int = 4,
+                 max_queue: int = 1000,
+                 retain: int = 1000,
+                 output_dir: Optional[str] = 'output'):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.task_handler = task_handler
+        self.tester_factory = tester_factory
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retain = retain
+        self.output_dir = output_dir
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._tasks = OrderedDict()
+        self._changed = threading.Condition()
+        self._threads = []
+        self._worker_errors = {}
+        self._stopping = False
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._http_thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self) -> 'A2AServer':
+        """Start the workers and serve HTTP in a background thread"""
+        self._start_workers()
+        self._http_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._http_thread.start()
+        logger.info(f"A2A server listening on {self.url} with {self.workers} workers")
+        return self
+
+    def serve_forever(self):
+        """Start the workers and serve HTTP on the calling thread"""
+        self._start_workers()
+        logger.info(f"A2A server listening on {self.url} with {self.workers} workers")
+        try:
+            self._server.serve_forever()
+        finally:
+            self.stop()
+
+    def _start_workers(self):
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"a2a-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop serving HTTP; workers finish the queued tasks and exit"""
+        if self._stopping:
+            return
+        self._stopping = True
+        for _ in self._threads:
+            self._queue.put((float('inf'), next(self._sequence), None))
+        if self._http_thread is not None:
+            self._server.shutdown()
+        self._server.server_close()
+        with self._changed:
+            self._changed.notify_all()
+
+    # -- tasks -------------------------------------------------------------
+
+    def submit(self, task_card: Dict[str, Any], priority: Optional[int] = None) -> Dict[str, Any]:
+        """Queue a task card and return its status record"""
+        task_id = str(task_card.get('id') or uuid.uuid4().hex)
+        if not TASK_ID_PATTERN.fullmatch(task_id):
+            raise ValueError(f"Invalid task id {task_id!r}: use letters, digits, '_', '.' and '-'")
+        task_card = dict(task_card, id=task_id)
+        priority = int(priority if priority is not None else task_card.get('priority', 0))
+        with self._changed:
+            existing = self._tasks.get(task_id)
+            if existing and existing['status'] not in TERMINAL_STATUSES:
+                raise ValueError(f"Task {task_id} is already {existing['status']}")
+            if self.queue_depth() >= self.max_queue:
+                raise TaskQueueFull(f"Queue is full ({self.max_queue} tasks)")
+            task = {
+                'task_id': task_id,
+                'status': 'queued',
+                'priority': priority,
+                'submitted_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'result': None,
+                'error': None,
+                'card': task_card,
+                '_queued': time.monotonic(),
+                '_events': [{'status': 'queued', 'timestamp': datetime.now().isoformat()}]
+            }
+            self._tasks.pop(task_id, None)
+            self._tasks[task_id] = task
+            self._prune()
+            self._changed.notify_all()
+        self._queue.put((-priority, next(self._sequence), task_id))
+        get_metrics().inc('a2a_tasks_total', status='queued')
+        return self.get(task_id)
+
+    def get(self, task_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        """Status record of a task, optionally waiting up to ``wait`` seconds for it to finish"""
+        deadline = time.monotonic() + wait
+        with self._changed:
+            while True:
+                task = self._tasks.get(task_id)
+                remaining = deadline - time.monotonic()
+                if task is None or task['status'] in TERMINAL_STATUSES or remaining <= 0 or self._stopping:
+                    return self._public(task) if task else None
+                self._changed.wait(remaining)
+
+    def cancel(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a task that has not started yet"""
+        with self._changed:
+            task = self._tasks.get(task_id)
+            if task and task['status'] == 'queued':
+                self._set_status(task, 'cancelled')
+            return self._public(task) if task else None
+
+    def list_tasks(self) -> List[Dict[str, Any]]:
+        with self._changed:
+            return [
+                {k: task[k] for k in ('task_id', 'status', 'priority', 'submitted_at', 'finished_at')}
+                for task in self._tasks.values()
+            ]
+
+    def queue_depth(self) -> int:
+        return sum(1 for task in self._tasks.values() if task['status'] == 'queued')
+
+    def health(self) -> Dict[str, Any]:
+        with self._changed:
+            counts = {}
+            for task in self._tasks.values():
+                counts[task['status']] = counts.get(task['status'], 0) + 1
+            worker_errors = dict(self._worker_errors)
+        status = 'stopping' if self._stopping else 'degraded' if worker_errors else 'ok'
+        return {'status': status, 'workers': self.workers, 'tasks': counts, 'worker_errors': worker_errors}
+
+    def events(self, task_id: str, timeout: Optional[float] = None):
+        """Yield a task's status events as they happen until it finishes"""
+        position = 0
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            with self._changed:
+                task = self._tasks.get(task_id)
+                if task is None:
+                    return
+                while position >= len(task['_events']) and task['status'] not in TERMINAL_STATUSES:
+                    remaining = deadline - time.monotonic() if deadline else None
+                    if self._stopping or (remaining is not None and remaining <= 0):
+                        return
+                    self._changed.wait(remaining)
+                pending = task['_events'][position:]
+                finished = task['status'] in TERMINAL_STATUSES
+            for event in pending:
+                position += 1
+                yield event
+            if finished and position >= len(task['_events']):
+                return
+
+    def _public(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in task.items() if not k.startswith('_') and k != 'card'}
+
+    def _prune(self):
+        """Forget the oldest finished tasks beyond ``retain``"""
+        finished = [tid for tid, task in self._tasks.items() if task['status'] in TERMINAL_STATUSES]
+        for task_id in finished[:max(0, len(finished) - self.retain)]:
+            del self._tasks[task_id]
+
+    def _set_status(self, task: Dict[str, Any], status: str, **fields):
+        """Update a task under the condition lock and wake waiters"""
+        task['status'] = status
+        task.update(fields)
+        event = {'status': status, 'timestamp': datetime.now().isoformat()}
+        if status in TERMINAL_STATUSES:
+            task['finished_at'] = event['timestamp']
+            event.update(result=task['result'], error=task['error'])
+        task['_events'].append(event)
+        self._changed.notify_all()
+        get_metrics().inc('a2a_tasks_total', status=status)
+
+    def _build_tester(self):
+        """Build this worker's tester; returns it with the error if construction failed"""
+        name = threading.current_thread().name
+        try:
+            tester = self.tester_factory()
+        except Exception as e:
+            logger.error(f"A2A worker {name} could not build its tester: {str(e)}")
+            with self._changed:
+                self._worker_errors[name] = str(e)
+            return None, str(e)
+        with self._changed:
+            self._worker_errors.pop(name, None)
+        return tester, None
+
+    def _worker(self):
+        tester, tester_error = self._build_tester() if self.tester_factory else (None, None)
+        while True:
+            _, _, task_id = self._queue.get()
+            if task_id is None:
+                return
+            with self._changed:
+                task = self._tasks.get(task_id)
+                if task is None or task['status'] != 'queued':
+                    continue
+                self._set_status(task, 'running', started_at=datetime.now().isoformat())
+                card = task['card']
+                get_metrics().observe('a2a_queue_wait_seconds', time.monotonic() - task['_queued'])
+
+            if tester_error is not None:
+                # The failure may have been transient, so try again per task
+                tester, tester_error = self._build_tester()
+            started = time.perf_counter()
+            try:
+                if tester_error is not None:
+                    raise RuntimeError(f"Worker could not build its tester: {tester_error}")
+                response = self.task_handler(card, tester)
+                error = response.get('error') if response.get('status') == 'failed' else None
+                status = 'failed' if error else 'completed'
+            except Exception as e:
+                logger.error(f"A2A task {task_id} failed: {str(e)}")
+                response = {'task_id': task_id, 'timestamp': datetime.now().isoformat(),
+                            'status': 'failed', 'error': str(e)}
+                status, error = 'failed', str(e)
+            get_metrics().observe('a2a_task_seconds', time.perf_counter() - started, status=status)
+
+            self._save(task_id, response)
+            with self._changed:
+                self._set_status(task, status, result=response.get('result'), error=error)
+
+    def _save(self, task_id: str, response: Dict[str, Any]):
+        if not self.output_dir:
+            return
+        try:
+            path = os.path.join(self.output_dir, f"{task_id}_result.json")
+            with open(path, 'w') as f:
+                json.dump(response, f, indent=2, default=str)
+        except Exception as e:
+            logger.error(f"Error saving A2A result for {task_id}: {str(e)}")
+
+    # -- HTTP --------------------------------------------------------------
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _send_json(self, status: int, body: Any):
+                data = json.dumps(body, default=str).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _route(self):
+                path, _, query = self.path.partition('?')
+                params = dict(p.partition('=')[::2] for p in query.split('&') if p)
+                return [part for part in path.split('/') if part], params
+
+            def do_POST(self):
+                parts, params = self._route()
+                if parts != ['tasks']:
+                    self._send_json(404, {'error': 'not found'})
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    card = json.loads(self.rfile.read(length) or b'{}')
+                    if not isinstance(card, dict):
+                        raise ValueError("Task card must be a JSON object")
+                    priority = params.get('priority')
+                    task = server.submit(card, int(priority) if priority is not None else None)
+                except TaskQueueFull as e:
+                    self._send_json(503, {'error': str(e)})
+                    return
+                except ValueError as e:
+                    status = 409 if 'already' in str(e) else 400
+                    self._send_json(status, {'error': str(e)})
+                    return
+                self._send_json(202, task)
+
+            def do_GET(self):
+                parts, params = self._route()
+                if parts == ['health']:
+                    self._send_json(200, server.health())
+                elif parts == ['tasks']:
+                    self._send_json(200, server.list_tasks())
+                elif len(parts) == 2 and parts[0] == 'tasks':
+                    try:
+                        wait = min(max(float(params.get('wait', 0)), 0), 300)
+                    except ValueError as e:
+                        self._send_json(400, {'error': f"Invalid wait: {str(e)}"})
+                        return
+                    task = server.get(parts[1], wait=wait)
+                    if task is None:
+                        self._send_json(404, {'error': f"Unknown task {parts[1]}"})
+                    else:
+                        self._send_json(200, task)
+                elif len(parts) == 3 and parts[0] == 'tasks' and parts[2] == 'events':
+                    try:
+                        timeout = max(float(params['timeout']), 0) if 'timeout' in params else None
+                    except ValueError as e:
+                        self._send_json(400, {'error': f"Invalid timeout: {str(e)}"})
+                        return
+                    self._stream_events(parts[1], timeout)
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+            def do_DELETE(self):
+                parts, _ = self._route()
+                if len(parts) != 2 or parts[0] != 'tasks':
+                    self._send_json(404, {'error': 'not found'})
+                    return
+                task = server.cancel(parts[1])
+                if task is None:
+                    self._send_json(404, {'error': f"Unknown task {parts[1]}"})
+                elif task['status'] != 'cancelled':
+                    self._send_json(409, task)
+                else:
+                    self._send_json(200, task)
+
+            def _stream_events(self, task_id: str, timeout: Optional[float]):
+                if server.get(task_id) is None:
+                    self._send_json(404, {'error': f"Unknown task {task_id}"})
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                try:
+                    for event in server.events(task_id, timeout):
+                        data = json.dumps(event, default=str)
+                        self.wfile.write(f"event: {event['status']}\ndata: {data}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    logger.debug(f"Event stream for {task_id} closed by client")
+
+        return Handler
@@ -1,11 +1,27 @@
-from .chat_injector_agent import ChatInjectorAgent
-from .prompt_agent import PromptAgent
-from .prompt_source_agent import PromptSourceAgent
-from .recorder_agent import RecorderAgent
+"""Agents are imported on first attribute access (PEP 562), so importing the
+package, or one agent, does not pull in the dependencies of the others."""
+import importlib
+
+_AGENTS = {
+    'ChatInjectorAgent': '.chat_injector_agent',
+    'PromptAgent': '.prompt_agent',
+    'PromptSourceAgent': '.prompt_source_agent',
+    'RecorderAgent': '.recorder_agent'
+}
 
 __all__ = [
     'ChatInjectorAgent',
     'PromptAgent',
     'PromptSourceAgent',
     'RecorderAgent'
-] 
\ No newline at end of file
+]
+
+def __getattr__(name):
+    if name in _AGENTS:
+        value = getattr(importlib.import_module(_AGENTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
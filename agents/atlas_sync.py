@@ -0,0 +1,169 @@
+import os
+import csv
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ATLAS_URL = "https://atlas.mitre.org/techniques"
+SNAPSHOT_FIELDS = ['id', 'name', 'description', 'tactic', 'last_updated']
+
+def parse_techniques(html: str) -> List[Dict[str, str]]:
+    """Extract techniques from the ATLAS techniques page"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    techniques = []
+    now = datetime.now().isoformat()
+
+    # Parse the techniques table (adjust selectors based on actual HTML structure)
+    for tech in soup.find_all('tr', class_='technique-row'):
+        cells = {
+            name: tech.find('td', class_=name)
+            for name in ('name', 'description', 'tactic')
+        }
+        techniques.append({
+            'id': tech.get('id', ''),
+            'name': cells['name'].text.strip() if cells['name'] else '',
+            'description': cells['description'].text.strip() if cells['description'] else '',
+            'tactic': cells['tactic'].text.strip() if cells['tactic'] else '',
+            'last_updated': now
+        })
+    return techniques
+
+class AtlasSync:
+    """Incrementally synchronised local snapshot of ATLAS techniques.
+
+    The snapshot CSV is read once into an in-memory index keyed by technique
+    id. The remote page is only checked once per ``refresh_interval``, using
+    ETag / Last-Modified conditional requests, and only techniques whose id
+    is not yet indexed are reported as new. In ``offline`` mode the network
+    is never used.
+    """
+
+    def __init__(self,
+                 snapshot_path: str = os.path.join('prompts', 'mitre_techniques.csv'),
+                 url: str = ATLAS_URL,
+                 refresh_interval: float = 24 * 3600,
+                 timeout: float = 10.0,
+                 offline: bool = False):
+        self.snapshot_path = snapshot_path
+        self.meta_path = f"{snapshot_path}.meta.json"
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._index = None
+        self._meta = None
+        self._session = None
+
+    def _load(self):
+        """Load the snapshot and sync metadata into memory on first use"""
+        if self._index is not None:
+            return
+        self._index = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    if row.get('id'):
+                        self._index[row['id']] = row
+        self._meta = {}
+        if os.path.exists(self.meta_path):
+            try:
+                with open(self.meta_path, 'r', encoding='utf-8') as f:
+                    self._meta = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable ATLAS sync metadata: {str(e)}")
+
+    def _write_snapshot(self):
+        tmp_path = f"{self.snapshot_path}.tmp"
+        os.makedirs(os.path.dirname(self.snapshot_path) or '.', exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=SNAPSHOT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self._index.values())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _write_meta(self):
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._meta, f, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    def techniques(self) -> List[Dict[str, str]]:
+        """All techniques in the local snapshot"""
+        with self._lock:
+            self._load()
+            return list(self._index.values())
+
+    def get(self, technique_id: str) -> Optional[Dict[str, str]]:
+        """Look up a technique by id"""
+        with self._lock:
+            self._load()
+            return self._index.get(technique_id)
+
+    def is_stale(self) -> bool:
+        """Whether the refresh interval has elapsed since the last check"""
+        with self._lock:
+            self._load()
+            return time.time() - self._meta.get('last_checked', 0) >= self.refresh_interval
+
+    def sync(self, force: bool = False) -> List[Dict[str, str]]:
+        """Refresh the snapshot if due and return newly added techniques"""
+        with self._lock:
+            self._load()
+            if self.offline:
+                return []
+            if not force and time.time() - self._meta.get('last_checked', 0) < self.refresh_interval:
+                return []
+
+            headers = {}
+            if self._meta.get('etag'):
+                headers['If-None-Match'] = self._meta['etag']
+            if self._meta.get('last_modified'):
+                headers['If-Modified-Since'] = self._meta['last_modified']
+
+            try:
+                response = self._get_session().get(self.url, headers=headers, timeout=self.timeout)
+            except Exception as e:
+                logger.error(f"Error fetching ATLAS techniques: {str(e)}")
+                return []
+
+            self._meta['last_checked'] = time.time()
+            new_techniques = []
+            if response.status_code == 304:
+                logger.info("ATLAS techniques unchanged since last sync")
+            elif response.status_code == 200:
+                fetched = parse_techniques(response.text)
+                new_techniques = [t for t in fetched if t['id'] and t['id'] not in self._index]
+                changed = False
+                for technique in fetched:
+                    if not technique['id']:
+                        continue
+                    # Keep the original last_updated for techniques we already know
+                    known = self._index.get(technique['id'])
+                    if known and all(known.get(k) == technique[k] for k in ('name', 'description', 'tactic')):
+                        continue
+                    self._index[technique['id']] = technique
+                    changed = True
+                self._meta['etag'] = response.headers.get('ETag')
+                self._meta['last_modified'] = response.headers.get('Last-Modified')
+                if changed or not os.path.exists(self.snapshot_path):
+                    self._write_snapshot()
+                logger.info(f"Synced {len(fetched)} ATLAS techniques ({len(new_techniques)} new)")
+            else:
+                logger.error(f"Unexpected status {response.status_code} from {self.url}")
+
+            self._write_meta()
+            return new_techniques
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import logging
+from types import SimpleNamespace
+from typing import Dict, Any, Optional, Iterable, Iterator, Tuple
+from .rate_limiter import get_rate_limiter
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT = '/v1/chat/completions'
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+class BatchFailedError(RuntimeError):
+    """Raised when a batch ends without producing results"""
+
+def _namespace(data: Any) -> Any:
+    """Give a JSON completion body the attribute access of an SDK response"""
+    return json.loads(json.dumps(data), object_hook=lambda d: SimpleNamespace(**d))
+
+class BatchJob:
+    """A file of chat completion requests processed offline by the Batch API.
+
+    The lifecycle is :meth:`write` the JSONL input, :meth:`submit` it,
+    :meth:`wait` for the batch to finish and read :meth:`results`. The batch
+    id and file paths are kept in a small state file next to the input, so a
+    job submitted by one process can be collected by another with
+    :meth:`load`. Control calls go through the shared rate limiter for
+    retries; the requests themselves are billed and throttled by the
+    provider's batch queue.
+    """
+
+    def __init__(self, client, name: str, workdir: str = 'batches'):
+        self.client = client
+        self.name = name
+        self.workdir = workdir
+        self.input_path = os.path.join(workdir, f"{name}.input.jsonl")
+        self.state_path = os.path.join(workdir, f"{name}.batch.json")
+        self.state = {'name': name, 'input_file': self.input_path, 'batch_id': None, 'status': None}
+
+    @classmethod
+    def load(cls, client, state_path: str) -> 'BatchJob':
+        """Reopen a job from its state file"""
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        job = cls(client, state['name'], os.path.dirname(state_path) or '.')
+        job.state.update(state)
+        return job
+
+    @property
+    def batch_id(self) -> Optional[str]:
+        return self.state.get('batch_id')
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _call(self, fn):
+        return get_rate_limiter().call(fn)
+
+    def write(self, requests: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Write ``(custom_id, request)`` pairs as the batch input file"""
+        os.makedirs(self.workdir, exist_ok=True)
+        count = 0
+        with open(self.input_path, 'w', encoding='utf-8') as f:
+            for custom_id, request in requests:
+                line = {'custom_id': custom_id, 'method': 'POST', 'url': ENDPOINT, 'body': request}
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+                count += 1
+        self.state['requests'] = count
+        self._save_state()
+        return count
+
+    def submit(self, completion_window: str = '24h', metadata: Optional[Dict[str, str]] = None) -> str:
+        """Upload the input file and create the batch; returns the batch id"""
+        with open(self.input_path, 'rb') as f:
+            def upload():
+                f.seek(0)
+                return self.client.files.create(file=f, purpose='batch')
+            uploaded = self._call(upload)
+        batch = self._call(lambda: self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=ENDPOINT,
+            completion_window=completion_window,
+            metadata=metadata
+        ))
+        self.state.update(input_file_id=uploaded.id, batch_id=batch.id, status=batch.status,
+                          submitted_at=time.time())
+        self._save_state()
+        get_metrics().inc('batch_requests_submitted_total', self.state.get('requests', 0))
+        logger.info(f"Submitted batch {batch.id} with {self.state.get('requests')} requests")
+        return batch.id
+
+    def refresh(self):
+        """Fetch the batch's current status"""
+        batch = self._call(lambda: self.client.batches.retrieve(self.batch_id))
+        counts = getattr(batch, 'request_counts', None)
+        self.state.update(
+            status=batch.status,
+            output_file_id=getattr(batch, 'output_file_id', None),
+            error_file_id=getattr(batch, 'error_file_id', None),
+            request_counts={
+                'total': getattr(counts, 'total', None),
+                'completed': getattr(counts, 'completed', None),
+                'failed': getattr(counts, 'failed', None)
+            } if counts is not None else None
+        )
+        self._save_state()
+        return batch
+
+    def wait(self, poll_interval: float = 30.0, max_poll_interval: float = 300.0,
+             timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Poll until the batch reaches a terminal status, backing off between polls"""
+        deadline = time.monotonic() + timeout if timeout else None
+        interval = poll_interval
+        while True:
+            self.refresh()
+            if self.state['status'] in TERMINAL_STATUSES:
+                logger.info(f"Batch {self.batch_id} finished with status {self.state['status']}")
+                return self.state
+            if deadline is not None and time.monotonic() + interval > deadline:
+                raise TimeoutError(f"Batch {self.batch_id} still {self.state['status']} after {timeout}s")
+            logger.info(f"Batch {self.batch_id} is {self.state['status']}: {self.state.get('request_counts')}")
+            time.sleep(interval)
+            interval = min(max_poll_interval, interval * 1.5)
+
+    def cancel(self):
+        self._call(lambda: self.client.batches.cancel(self.batch_id))
+        self.refresh()
+
+    def _download(self, file_id: str) -> Iterator[Dict[str, Any]]:
+        content = self._call(lambda: self.client.files.content(file_id))
+        for line in content.text.splitlines():
+            if line.strip():
+                yield json.loads(line)
+
+    def results(self) -> Iterator[Tuple[str, Any, Optional[str]]]:
+        """Yield ``(custom_id, response, error)`` for every request in the batch.
+
+        ``response`` has the shape of a ``chat.completions.create`` result;
+        failed requests yield ``None`` and an error message instead.
+        """
+        if self.state['status'] not in TERMINAL_STATUSES:
+            raise RuntimeError(f"Batch {self.batch_id} has not finished")
+        if not self.state.get('output_file_id') and not self.state.get('error_file_id'):
+            raise BatchFailedError(f"Batch {self.batch_id} ended {self.state['status']} without results")
+
+        for key in ('output_file_id', 'error_file_id'):
+            if not self.state.get(key):
+                continue
+            for line in self._download(self.state[key]):
+                response = line.get('response') or {}
+                if response.get('status_code') == 200 and not line.get('error'):
+                    yield line['custom_id'], _namespace(response['body']), None
+                else:
+                    error = line.get('error') or (response.get('body') or {}).get('error') or {}
+                    message = error.get('message') if isinstance(error, dict) else str(error)
+                    yield line['custom_id'], None, message or f"status {response.get('status_code')}"
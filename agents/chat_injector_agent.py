@@ -1,82 +1,417 @@
 import os
+import json
+import time
+import asyncio
 import logging
-from openai import OpenAI
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Union
 from dotenv import load_dotenv
+from .clients import (client_options, get_async_client, create_completion, acreate_completion,
+                      stream_completion, astream_completion, record_usage)
+from .metrics import get_metrics
+from .batch_jobs import BatchJob
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL = "gpt-4"
+
 class MockOpenAI:
-    """Mock OpenAI client for testing"""
-    def chat_completions_create(self, *args, **kwargs):
-        return type('MockResponse', (), {
-            'choices': [type('MockChoice', (), {
-                'message': {'content': 'This is a mock response'}
-            })()],
-            'created': 123456789
-        })()
+    """Mock OpenAI client for testing, shaped like ``client.chat.completions.create``"""
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=self)
+        
+    def create(self, *args, **kwargs):
+        return SimpleNamespace(
+            choices=[SimpleNamespace(
+                message=SimpleNamespace(role='assistant', content='This is a mock response'),
+                finish_reason='stop'
+            )],
+            created=123456789,
+            model=kwargs.get('model'),
+            usage=SimpleNamespace(prompt_tokens=0, completion_tokens=5, total_tokens=5)
+        )
 
 class ChatInjectorAgent:
     """Agent for testing chat systems using AI-generated prompts."""
     
-    def __init__(self):
-        """Initialize the ChatInjectorAgent with OpenAI client."""
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            logger.warning("OPENAI_API_KEY not found in environment variables")
-            api_key = "test_key_for_unit_tests"
+    def __init__(self, base_url: Optional[str] = None, async_client=None):
+        """Initialize the ChatInjectorAgent.
         
-        try:
-            self.client = OpenAI(api_key=api_key)
-        except Exception as e:
-            logger.error(f"Error initializing OpenAI client: {str(e)}")
-            self.client = MockOpenAI()
+        The OpenAI client is built on first use, so constructing the agent
+        does not import or configure openai.
+        
+        Args:
+            base_url: OpenAI-compatible endpoint, defaults to ``OPENAI_BASE_URL``
+            async_client: Async client for the async paths, defaults to the
+                shared pooled client for ``base_url``
+        """
+        self.base_url = base_url
+        self._client = None
+        self.async_client = async_client
 
-    def execute_injection(self, chat_elements: dict, prompt: dict, target_url: str) -> dict:
+    @property
+    def client(self):
+        """Synchronous OpenAI client, created on first access"""
+        if self._client is None:
+            try:
+                from openai import OpenAI
+                self._client = OpenAI(**client_options(base_url=self.base_url))
+            except Exception as e:
+                logger.error(f"Error initializing OpenAI client: {str(e)}")
+                self._client = MockOpenAI()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _build_request(self, chat_elements: dict, prompt: dict, target_url: str, model: str = DEFAULT_MODEL):
+        """Build the injection context and completion request for a prompt"""
+        context = {
+            'target_url': target_url,
+            'chat_elements': chat_elements,
+            'prompt_type': prompt.get('type', 'unknown')
+        }
+        request = {
+            'model': model,
+            'messages': [
+                {"role": "system", "content": "You are a security researcher testing chat systems."},
+                {"role": "user", "content": f"Context: {context}\n\nPrompt: {prompt['content']}"}
+            ],
+            'temperature': 0.7,
+            'max_tokens': 1000
+        }
+        return context, request
+
+    def _build_result(self, prompt: dict, context: dict, response, started: Optional[float] = None,
+                      model: str = DEFAULT_MODEL) -> dict:
+        """Turn a completion response into an injection result"""
+        latency = None
+        if started is not None:
+            latency = time.perf_counter() - started
+            get_metrics().observe('pipeline_stage_seconds', latency, stage='injection')
+        usage = getattr(response, 'usage', None)
+        result = {
+            'prompt': prompt,
+            'generated_text': response.choices[0].message.content,
+            'context': context,
+            'model': model,
+            'timestamp': response.created,
+            'latency': round(latency, 4) if latency is not None else None,
+            'usage': {
+                'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+                'completion_tokens': getattr(usage, 'completion_tokens', None),
+                'total_tokens': getattr(usage, 'total_tokens', None)
+            } if usage is not None else None
+        }
+        if getattr(response, 'streaming', None) is not None:
+            result['streaming'] = response.streaming
+        return result
+
+    def execute_injection(self, chat_elements: dict, prompt: dict, target_url: str,
+                          stream: bool = False, stop_when: Optional[Callable[[str], bool]] = None) -> dict:
         """Execute a prompt injection test.
         
         Args:
             chat_elements: Dictionary containing chat interface elements
             prompt: Dictionary containing prompt type and content
             target_url: URL of the target system
+            stream: Consume the completion as a stream and record time to first token
+            stop_when: Early-stop predicate called with the text received so
+                far; returning True ends the stream (implies ``stream``)
             
         Returns:
-            Dictionary containing test results and generated content
+            Dictionary containing test results and generated content, plus
+            ``streaming`` statistics for streamed requests
         """
         try:
-            # Prepare the injection context
-            context = {
-                'target_url': target_url,
-                'chat_elements': chat_elements,
-                'prompt_type': prompt.get('type', 'unknown')
-            }
+            started = time.perf_counter()
+            context, request = self._build_request(chat_elements, prompt, target_url)
+            if stream or stop_when is not None:
+                response = stream_completion(self.client, stop_when=stop_when, **request)
+            else:
+                response = create_completion(self.client, **request)
+            result = self._build_result(prompt, context, response, started)
             
-            # Get GPT-4 response
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a security researcher testing chat systems."},
-                    {"role": "user", "content": f"Context: {context}\n\nPrompt: {prompt['content']}"}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
+            logger.info(f"Successfully generated injection for {target_url}")
+            return result
             
-            # Extract the generated text
-            generated_text = response.choices[0].message.content
+        except Exception as e:
+            logger.error(f"Error executing injection: {str(e)}")
+            raise
+
+    async def execute_injection_async(self, chat_elements: dict, prompt: dict, target_url: str,
+                                      model: str = DEFAULT_MODEL, base_url: Optional[str] = None,
+                                      stream: bool = False,
+                                      stop_when: Optional[Callable[[str], bool]] = None) -> dict:
+        """Execute a prompt injection test on the shared async client.
+        
+        Args:
+            chat_elements: Dictionary containing chat interface elements
+            prompt: Dictionary containing prompt type and content
+            target_url: URL of the target system
+            model: Model to run the prompt against
+            base_url: Endpoint to use instead of the agent's own
+            stream: Consume the completion as a stream, see :meth:`execute_injection`
+            stop_when: Early-stop predicate for streamed completions
             
-            # Prepare result
-            result = {
-                'prompt': prompt,
-                'generated_text': generated_text,
-                'context': context,
-                'model': 'gpt-4',
-                'timestamp': response.created
-            }
+        Returns:
+            Dictionary containing test results and generated content
+        """
+        try:
+            started = time.perf_counter()
+            context, request = self._build_request(chat_elements, prompt, target_url, model)
+            if base_url is not None:
+                client = get_async_client(base_url)
+            else:
+                client = self.async_client or get_async_client(self.base_url)
+            if stream or stop_when is not None:
+                response = await astream_completion(client, stop_when=stop_when, **request)
+            else:
+                response = await acreate_completion(client, **request)
+            result = self._build_result(prompt, context, response, started, model)
             
             logger.info(f"Successfully generated injection for {target_url}")
             return result
             
         except Exception as e:
             logger.error(f"Error executing injection: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+    async def execute_injections(self, batch: Iterable[dict], max_concurrency: int = 20, stream: bool = False,
+                                 stop_when: Optional[Callable[[str], bool]] = None) -> AsyncIterator[dict]:
+        """Execute a batch of injections concurrently, yielding results as they complete.
+        
+        Args:
+            batch: Iterable of dicts with ``chat_elements``, ``prompt``, ``target_url``
+                and optionally ``model``
+            max_concurrency: Maximum number of requests in flight at once
+            stream: Stream every completion, see :meth:`execute_injection`
+            stop_when: Early-stop predicate applied to every streamed completion
+            
+        Yields:
+            Injection results in completion order. A failed item yields a dict
+            with the ``prompt``, ``target_url`` and ``error`` instead of raising.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        async def run(item: dict) -> dict:
+            try:
+                return await self.execute_injection_async(
+                    item.get('chat_elements', {}), item['prompt'], item.get('target_url', ''),
+                    model=item.get('model', DEFAULT_MODEL), stream=stream, stop_when=stop_when
+                )
+            except Exception as e:
+                return {'prompt': item.get('prompt'), 'target_url': item.get('target_url'), 'error': str(e)}
+
+        items = iter(batch)
+        pending = set()
+        try:
+            while True:
+                # Only schedule up to max_concurrency tasks so huge batches stay lazy
+                while len(pending) < max_concurrency:
+                    item = next(items, None)
+                    if item is None:
+                        break
+                    pending.add(asyncio.ensure_future(run(item)))
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    def _normalize_target(target: Union[str, dict]) -> dict:
+        """Fill in the defaults of a fan-out target"""
+        if isinstance(target, str):
+            target = {'target_url': target}
+        target = dict(target)
+        target.setdefault('target_url', '')
+        target.setdefault('model', DEFAULT_MODEL)
+        target.setdefault('base_url', None)
+        target.setdefault('chat_elements', {})
+        target.setdefault('name', f"{target['model']}@{target['target_url'] or target['base_url'] or 'default'}")
+        return target
+
+    async def fanout_injections(self, prompts: Iterable[dict], targets: Iterable[Union[str, dict]],
+                                max_concurrency: int = 100, per_target_concurrency: int = 10) -> AsyncIterator[dict]:
+        """Run every prompt against every target concurrently, yielding results as they complete.
+        
+        Each target is a ``target_url`` string or a dict with any of ``name``,
+        ``target_url``, ``model``, ``base_url``, ``chat_elements`` and
+        ``max_concurrency``. Every target gets its own pool of workers over
+        the shared prompt list, so a slow or rate limited deployment does
+        not hold up the others; ``max_concurrency`` caps requests in flight
+        across all targets.
+        
+        Args:
+            prompts: Prompt dicts; the iterable is expanded once and shared by all targets
+            targets: Deployments or model variants to test
+            max_concurrency: Maximum number of requests in flight overall
+            per_target_concurrency: Default in-flight limit for each target
+            
+        Yields:
+            Injection results tagged with ``target`` (the target name) and
+            ``index`` (the prompt's position). A failed request yields a dict
+            with ``prompt``, ``target``, ``index`` and ``error`` instead of raising.
+        """
+        if max_concurrency < 1 or per_target_concurrency < 1:
+            raise ValueError("Concurrency limits must be at least 1")
+        prompts = list(prompts)
+        targets = [self._normalize_target(target) for target in targets]
+        names = [target['name'] for target in targets]
+        if len(set(names)) != len(names):
+            raise ValueError("Fan-out target names must be unique")
+        for target in targets:
+            if target.get('max_concurrency', per_target_concurrency) < 1:
+                raise ValueError(f"Concurrency limit of target {target['name']} must be at least 1")
+        if not prompts or not targets:
+            return
+
+        overall = asyncio.Semaphore(max_concurrency)
+        results = asyncio.Queue()
+
+        async def run(target: dict, index: int) -> dict:
+            prompt = prompts[index]
+            try:
+                async with overall:
+                    result = await self.execute_injection_async(
+                        target['chat_elements'], prompt, target['target_url'],
+                        model=target['model'], base_url=target['base_url']
+                    )
+            except Exception as e:
+                result = {'prompt': prompt, 'target_url': target['target_url'], 'error': str(e)}
+            result['target'] = target['name']
+            result['index'] = index
+            return result
+
+        async def worker(target: dict, next_index):
+            for index in next_index:
+                await results.put(await run(target, index))
+
+        workers = []
+        for target in targets:
+            # Workers of one target share an iterator, so each prompt runs once per target
+            next_index = iter(range(len(prompts)))
+            for _ in range(min(target.get('max_concurrency', per_target_concurrency), len(prompts))):
+                workers.append(asyncio.ensure_future(worker(target, next_index)))
+
+        try:
+            for _ in range(len(prompts) * len(targets)):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+
+    async def execute_fanout(self, prompts: Iterable[dict], targets: Iterable[Union[str, dict]],
+                             max_concurrency: int = 100, per_target_concurrency: int = 10) -> Dict[str, List[dict]]:
+        """Run every prompt against every target and group the results.
+        
+        Returns:
+            Dict mapping each target name to its results in prompt order
+        """
+        targets = [self._normalize_target(target) for target in targets]
+        grouped = {target['name']: [] for target in targets}
+        async for result in self.fanout_injections(prompts, targets, max_concurrency, per_target_concurrency):
+            grouped[result['target']].append(result)
+        for results in grouped.values():
+            results.sort(key=lambda r: r['index'])
+        return grouped
+
+    def submit_injection_batch(self, batch: Iterable[dict], name: Optional[str] = None,
+                               workdir: str = 'batches', completion_window: str = '24h') -> str:
+        """Write a whole campaign's injections to a batch file and submit it.
+        
+        Meant for large regression runs where latency does not matter; the
+        provider works through the file offline. The requests are identical
+        to those of :meth:`execute_injection`.
+        
+        Args:
+            batch: Iterable of dicts with ``chat_elements``, ``prompt`` and ``target_url``
+            name: Name of the batch files, defaults to a timestamp
+            workdir: Directory for the batch input, items and state files
+            completion_window: Provider completion window
+            
+        Returns:
+            Path of the batch state file, to pass to :meth:`collect_injection_batch`
+        """
+        name = name or f"injections_{time.strftime('%Y%m%d_%H%M%S')}"
+        job = BatchJob(self.client, name, workdir)
+        os.makedirs(workdir, exist_ok=True)
+        items_path = os.path.join(workdir, f"{name}.items.jsonl")
+
+        def requests():
+            # The items file keeps what is needed to rebuild each result later
+            with open(items_path, 'w', encoding='utf-8') as items:
+                for index, item in enumerate(batch):
+                    prompt = item['prompt']
+                    model = item.get('model', DEFAULT_MODEL)
+                    context, request = self._build_request(item.get('chat_elements', {}), prompt,
+                                                           item.get('target_url', ''), model)
+                    custom_id = f"{index}-{prompt.get('id', 'prompt')}"
+                    items.write(json.dumps({'custom_id': custom_id, 'prompt': prompt, 'context': context, 'model': model},
+                                           ensure_ascii=False, default=str) + '\n')
+                    yield custom_id, request
+
+        job.write(requests())
+        job.state['items_file'] = items_path
+        job.submit(completion_window=completion_window, metadata={'name': name})
+        return job.state_path
+
+    def collect_injection_batch(self, state_path: str, recorder=None, poll_interval: float = 30.0,
+                                timeout: Optional[float] = None) -> List[dict]:
+        """Wait for a submitted batch and map its results back to injections.
+        
+        Args:
+            state_path: Path returned by :meth:`submit_injection_batch`
+            recorder: Optional RecorderAgent; every result is recorded as an
+                ``injection`` interaction and the session is saved under the batch name
+            poll_interval: Initial seconds between status checks
+            timeout: Give up waiting after this many seconds
+            
+        Returns:
+            Injection results in submission order. A failed request yields a
+            dict with the ``prompt``, ``context`` and ``error`` instead.
+        """
+        job = BatchJob.load(self.client, state_path)
+        job.wait(poll_interval=poll_interval, timeout=timeout)
+        outcomes = {}
+        for custom_id, response, error in job.results():
+            outcomes[custom_id] = (response, error)
+
+        results = []
+        with open(job.state['items_file'], 'r', encoding='utf-8') as f:
+            for line in f:
+                item = json.loads(line)
+                response, error = outcomes.get(item['custom_id'], (None, 'No result returned for request'))
+                if response is not None:
+                    result = self._build_result(item['prompt'], item['context'], response,
+                                                model=item.get('model', DEFAULT_MODEL))
+                    record_usage(result['model'], getattr(response, 'usage', None))
+                else:
+                    result = {'prompt': item['prompt'], 'context': item['context'], 'error': error}
+                result['batch'] = {'batch_id': job.batch_id, 'custom_id': item['custom_id']}
+                results.append(result)
+                if recorder is not None:
+                    recorder.record_interaction('injection', result, {
+                        'batch_id': job.batch_id,
+                        'target_url': item['context'].get('target_url')
+                    })
+
+        failed = sum(1 for r in results if 'error' in r)
+        logger.info(f"Collected {len(results)} results from batch {job.batch_id} ({failed} failed)")
+        if recorder is not None and results:
+            recorder.save_session(job.name, {'batch_id': job.batch_id, 'requests': len(results), 'failed': failed})
+        return results
+
+    def execute_injections_batch(self, batch: Iterable[dict], recorder=None, name: Optional[str] = None,
+                                 workdir: str = 'batches', poll_interval: float = 30.0,
+                                 timeout: Optional[float] = None) -> List[dict]:
+        """Submit a batch and block until its results are collected"""
+        state_path = self.submit_injection_batch(batch, name=name, workdir=workdir)
+        return self.collect_injection_batch(state_path, recorder=recorder, poll_interval=poll_interval, timeout=timeout)
@@ -0,0 +1,324 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from types import SimpleNamespace
+from typing import Dict, Any, Callable, Optional, TYPE_CHECKING
+from dotenv import load_dotenv
+from .rate_limiter import get_rate_limiter, estimate_tokens
+from .metrics import get_metrics, TOKEN_BUCKETS, THROUGHPUT_BUCKETS
+from .response_cache import get_response_cache
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+def _http_client_options() -> dict:
+    """Connection pool settings for the shared async client"""
+    try:
+        import httpx
+    except ImportError:
+        # openai falls back to its own pooled keep-alive client
+        return {}
+
+    limits = httpx.Limits(
+        max_connections=int(os.getenv('OPENAI_MAX_CONNECTIONS', '100')),
+        max_keepalive_connections=int(os.getenv('OPENAI_MAX_KEEPALIVE', '20')),
+        keepalive_expiry=float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', '30'))
+    )
+    from openai import DefaultAsyncHttpxClient
+    return {'http_client': DefaultAsyncHttpxClient(limits=limits)}
+
+def client_options(api_key: Optional[str] = None, base_url: Optional[str] = None) -> Dict[str, Any]:
+    """Constructor arguments shared by every OpenAI client in the framework.
+
+    ``base_url`` (or ``OPENAI_BASE_URL``) points the agents at any
+    OpenAI-compatible endpoint, such as the local mock server.
+    """
+    api_key = api_key or os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        logger.warning("OPENAI_API_KEY not found in environment variables")
+        api_key = "test_key_for_unit_tests"
+    options = {
+        'api_key': api_key,
+        # Retries are handled by the shared rate limiter
+        'max_retries': 0
+    }
+    base_url = base_url or os.getenv('OPENAI_BASE_URL')
+    if base_url:
+        options['base_url'] = base_url
+    return options
+
+def get_async_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> 'AsyncOpenAI':
+    """Return the process-wide async client for the running event loop.
+
+    Pooled connections belong to the loop that opened them, so one client per
+    endpoint is kept per event loop and shared by every agent running on it.
+    """
+    from openai import AsyncOpenAI
+
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        key = (base_url, api_key)
+        if key not in clients:
+            clients[key] = AsyncOpenAI(**client_options(api_key, base_url), **_http_client_options())
+        return clients[key]
+
+ROUTING_ATTRIBUTES = ('base_url', 'organization', 'project')
+
+def endpoint_identity(client) -> Dict[str, str]:
+    """Deployment a client sends its requests to, part of every cache key"""
+    identity = {}
+    for name in ROUTING_ATTRIBUTES:
+        value = getattr(client, name, None)
+        if value:
+            identity[name] = str(value)
+    return identity
+
+def _usage_tokens(response):
+    usage = getattr(response, 'usage', None)
+    return getattr(usage, 'total_tokens', None)
+
+def record_usage(model: str, usage):
+    """Record the token usage reported for one completion"""
+    if usage is None:
+        return
+    metrics = get_metrics()
+    prompt_tokens = getattr(usage, 'prompt_tokens', None) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+    metrics.inc('llm_prompt_tokens_total', prompt_tokens, model=model)
+    metrics.inc('llm_completion_tokens_total', completion_tokens, model=model)
+    metrics.observe('llm_tokens_per_request', prompt_tokens + completion_tokens,
+                    buckets=TOKEN_BUCKETS, model=model)
+
+def _record_call(request, started, response=None, error=None):
+    """Record latency, outcome and token usage of one model call"""
+    metrics = get_metrics()
+    model = request.get('model', 'unknown')
+    outcome = 'error' if error is not None else 'success'
+    metrics.inc('llm_requests_total', model=model, outcome=outcome)
+    metrics.observe('llm_request_seconds', time.perf_counter() - started, model=model, outcome=outcome)
+    record_usage(model, getattr(response, 'usage', None))
+
+def create_completion(client, **request):
+    """Run a chat completion request on a synchronous client.
+
+    Cached completions are returned without touching the network; everything
+    else goes through the shared rate limiter.
+    """
+    cache = get_response_cache()
+    cached = cache.get(request, endpoint_identity(client))
+    if cached is not None:
+        get_metrics().inc('llm_cache_hits_total', model=request.get('model', 'unknown'))
+        return cached
+
+    limiter = get_rate_limiter()
+    estimated = estimate_tokens(request)
+    started = time.perf_counter()
+    try:
+        response = limiter.call(lambda: client.chat.completions.create(**request), estimated)
+    except Exception as e:
+        _record_call(request, started, error=e)
+        raise
+    _record_call(request, started, response)
+    limiter.reconcile(estimated, _usage_tokens(response))
+    cache.put(request, response, endpoint_identity(client))
+    return response
+
+async def acreate_completion(client, **request):
+    """Run a chat completion request on an async client, see :func:`create_completion`"""
+    cache = get_response_cache()
+    cached = cache.get(request, endpoint_identity(client))
+    if cached is not None:
+        get_metrics().inc('llm_cache_hits_total', model=request.get('model', 'unknown'))
+        return cached
+
+    limiter = get_rate_limiter()
+    estimated = estimate_tokens(request)
+    started = time.perf_counter()
+    try:
+        response = await limiter.acall(lambda: client.chat.completions.create(**request), estimated)
+    except Exception as e:
+        _record_call(request, started, error=e)
+        raise
+    _record_call(request, started, response)
+    limiter.reconcile(estimated, _usage_tokens(response))
+    cache.put(request, response, endpoint_identity(client))
+    return response
+
+class _StreamState:
+    """Accumulates streamed chunks into a response shaped like a completion"""
+
+    def __init__(self, request: Dict[str, Any], stop_when: Optional[Callable[[str], bool]]):
+        self.request = request
+        self.stop_when = stop_when
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.parts = []
+        self.chunks = 0
+        self.id = None
+        self.created = None
+        self.finish_reason = None
+        self.usage = None
+        self.stopped_early = False
+
+    def feed(self, chunk) -> bool:
+        """Add one chunk; returns True once the stream should be abandoned"""
+        self.chunks += 1
+        self.id = self.id or getattr(chunk, 'id', None)
+        self.created = self.created or getattr(chunk, 'created', None)
+        if getattr(chunk, 'usage', None) is not None:
+            self.usage = chunk.usage
+        received = False
+        for choice in getattr(chunk, 'choices', None) or []:
+            content = getattr(choice.delta, 'content', None)
+            if content:
+                if self.first_token is None:
+                    self.first_token = time.perf_counter()
+                self.parts.append(content)
+                received = True
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+        if received and self.finish_reason is None and self.stop_when is not None \
+                and self.stop_when(''.join(self.parts)):
+            self.stopped_early = True
+        return self.stopped_early
+
+    def usage_so_far(self):
+        """Reported usage, or an estimate of what has been generated so far"""
+        if self.usage is not None:
+            return self.usage
+        # Abandoned or failed streams never get the usage chunk
+        text = ''.join(self.parts)
+        prompt_tokens = estimate_tokens({'messages': self.request.get('messages', [])})
+        completion_tokens = max(1, len(text) // 4) if text else 0
+        return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                               total_tokens=prompt_tokens + completion_tokens, estimated=True)
+
+    def response(self):
+        finished = time.perf_counter()
+        text = ''.join(self.parts)
+        usage = self.usage_so_far()
+
+        ttft = self.first_token - self.started if self.first_token is not None else None
+        generating = finished - self.first_token if self.first_token is not None else 0.0
+        tokens_per_second = usage.completion_tokens / generating if generating > 0 and usage.completion_tokens else None
+
+        model = self.request.get('model', 'unknown')
+        metrics = get_metrics()
+        if ttft is not None:
+            metrics.observe('llm_time_to_first_token_seconds', ttft, model=model)
+        if tokens_per_second is not None:
+            metrics.observe('llm_stream_tokens_per_second', tokens_per_second, buckets=THROUGHPUT_BUCKETS, model=model)
+        if self.stopped_early:
+            metrics.inc('llm_stream_early_stops_total', model=model)
+
+        return SimpleNamespace(
+            id=self.id,
+            model=model,
+            created=self.created or int(time.time()),
+            choices=[SimpleNamespace(
+                message=SimpleNamespace(role='assistant', content=text),
+                finish_reason='early_stop' if self.stopped_early else self.finish_reason
+            )],
+            usage=usage,
+            streaming={
+                'time_to_first_token': round(ttft, 4) if ttft is not None else None,
+                'tokens_per_second': round(tokens_per_second, 1) if tokens_per_second is not None else None,
+                'chunks': self.chunks,
+                'stopped_early': self.stopped_early
+            }
+        )
+
+def _stream_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(request, stream=True, stream_options={'include_usage': True})
+
+def _finish_stream(client, request, state, estimated, limiter, cache):
+    response = state.response()
+    _record_call(request, state.started, response)
+    limiter.reconcile(estimated, response.usage.total_tokens)
+    if not state.stopped_early:
+        # A complete stream is the same completion a plain request would get
+        cache.put(request, response, endpoint_identity(client))
+    return response
+
+def stream_completion(client, stop_when: Optional[Callable[[str], bool]] = None, **request):
+    """Run a chat completion request as a stream on a synchronous client.
+
+    Chunks are consumed as they arrive. ``stop_when`` is called with the text
+    received so far after every chunk; once it returns True the stream is
+    closed, which stops generation and the completion-token spend with it.
+    The result is shaped like a completion, with ``finish_reason`` set to
+    ``early_stop`` for abandoned streams, plus a ``streaming`` dict holding
+    time to first token, tokens per second and chunk count. Opening the
+    stream goes through the rate limiter; errors mid-stream are not retried,
+    but the tokens generated before them are charged to the limiter.
+    """
+    cache = get_response_cache()
+    cached = cache.get(request, endpoint_identity(client))
+    if cached is not None:
+        get_metrics().inc('llm_cache_hits_total', model=request.get('model', 'unknown'))
+        return cached
+
+    limiter = get_rate_limiter()
+    estimated = estimate_tokens(request)
+    state = _StreamState(request, stop_when)
+    try:
+        stream = limiter.call(lambda: client.chat.completions.create(**_stream_request(request)), estimated)
+        if hasattr(stream, 'choices'):
+            # Clients without streaming support answer with the whole completion
+            _record_call(request, state.started, stream)
+            limiter.reconcile(estimated, _usage_tokens(stream))
+            return stream
+        try:
+            for chunk in stream:
+                if state.feed(chunk):
+                    break
+        except Exception:
+            limiter.reconcile(estimated, state.usage_so_far().total_tokens)
+            raise
+        finally:
+            stream.close()
+    except Exception as e:
+        _record_call(request, state.started, error=e)
+        raise
+    return _finish_stream(client, request, state, estimated, limiter, cache)
+
+async def astream_completion(client, stop_when: Optional[Callable[[str], bool]] = None, **request):
+    """Run a chat completion request as a stream on an async client, see :func:`stream_completion`"""
+    cache = get_response_cache()
+    cached = cache.get(request, endpoint_identity(client))
+    if cached is not None:
+        get_metrics().inc('llm_cache_hits_total', model=request.get('model', 'unknown'))
+        return cached
+
+    limiter = get_rate_limiter()
+    estimated = estimate_tokens(request)
+    state = _StreamState(request, stop_when)
+    try:
+        stream = await limiter.acall(lambda: client.chat.completions.create(**_stream_request(request)), estimated)
+        if hasattr(stream, 'choices'):
+            _record_call(request, state.started, stream)
+            limiter.reconcile(estimated, _usage_tokens(stream))
+            return stream
+        try:
+            async for chunk in stream:
+                if state.feed(chunk):
+                    break
+        except Exception:
+            limiter.reconcile(estimated, state.usage_so_far().total_tokens)
+            raise
+        finally:
+            await stream.close()
+    except Exception as e:
+        _record_call(request, state.started, error=e)
+        raise
+    return _finish_stream(client, request, state, estimated, limiter, cache)
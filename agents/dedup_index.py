@@ -0,0 +1,214 @@
+import re
+import zlib
+import operator
+import random
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Universal hashing modulo a prime just above 2**32; with multipliers below
+# 2**32 every intermediate value fits an unsigned 64-bit integer
+PRIME = 4294967311
+MAX_HASH = 2 ** 32 - 1
+
+_PUNCTUATION = re.compile(r'[^\w\s{}]+')
+
+def normalize(text: str) -> str:
+    """Lower-case text with punctuation dropped and whitespace collapsed"""
+    return ' '.join(_PUNCTUATION.sub(' ', text.lower()).split())
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+def _lsh_rows(num_perm: int, threshold: float) -> int:
+    """Rows per band putting the LSH S-curve just below ``threshold``.
+
+    Pairs at the threshold almost always share a band, while the number of
+    less similar candidates that have to be verified stays low.
+    """
+    target = max(threshold - 0.1, threshold / 2)
+    return min(range(1, num_perm + 1), key=lambda r: abs((1 / (num_perm // r)) ** (1 / r) - target))
+
+class DedupIndex:
+    """Exact and near-duplicate detection for prompt texts.
+
+    Exact duplicates are found through a table of content hashes in O(1).
+    Near duplicates are found with MinHash signatures over character
+    shingles of the normalised text, bucketed by locality-sensitive hashing:
+    only texts sharing a band bucket are compared, so a lookup touches a
+    handful of candidates instead of the whole corpus. A candidate counts
+    as a duplicate when the estimated Jaccard similarity reaches
+    ``threshold``; ``threshold=None`` keeps exact matching only.
+    """
+
+    def __init__(self, threshold: Optional[float] = 0.9, num_perm: int = 128, shingle_size: int = 5,
+                 seed: int = 1, exact_normalized: bool = False):
+        """
+        Args:
+            threshold: Estimated Jaccard similarity at which texts are near duplicates
+            num_perm: MinHash signature length
+            shingle_size: Characters per shingle
+            seed: Seed of the hash permutations; indexes only compare with the same seed
+            exact_normalized: Treat texts differing only in case, punctuation
+                or whitespace as exact duplicates
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.exact_normalized = exact_normalized
+        self.rows = _lsh_rows(num_perm, threshold) if threshold else num_perm
+        self.bands = num_perm // self.rows
+        rng = random.Random(seed)
+        self._a = [rng.randrange(1, MAX_HASH) for _ in range(num_perm)]
+        self._b = [rng.randrange(0, MAX_HASH) for _ in range(num_perm)]
+        self._np = None
+        self._lock = threading.Lock()
+        self._exact = {}
+        self._keys = {}
+        self._signatures = {}
+        self._buckets = [{} for _ in range(self.bands)]
+
+    # -- hashing -----------------------------------------------------------
+
+    def _shingles(self, text: str) -> List[int]:
+        text = normalize(text)
+        size = self.shingle_size
+        if len(text) <= size:
+            return [zlib.crc32(text.encode('utf-8'))]
+        return list({zlib.crc32(text[i:i + size].encode('utf-8')) for i in range(len(text) - size + 1)})
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        """MinHash signature of a text"""
+        shingles = self._shingles(text)
+        if self._np is None:
+            try:
+                import numpy
+                self._np = (numpy, numpy.array(self._a, dtype=numpy.uint64), numpy.array(self._b, dtype=numpy.uint64))
+            except ImportError:
+                self._np = False
+        if self._np:
+            numpy, a, b = self._np
+            values = numpy.array(shingles, dtype=numpy.uint64)[:, None]
+            return tuple(((values * a + b) % PRIME).min(axis=0).tolist())
+        return tuple(min((a * x + b) % PRIME for x in shingles) for a, b in zip(self._a, self._b))
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[int]:
+        rows = self.rows
+        return [hash(signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def _exact_digest(self, text: str) -> bytes:
+        return _digest(normalize(text) if self.exact_normalized else text)
+
+    @staticmethod
+    def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(map(operator.eq, first, second)) / len(first)
+
+    # -- index -------------------------------------------------------------
+
+    def _find(self, text: str, digest: bytes, signature: Optional[Tuple[int, ...]],
+              first: bool = False) -> Optional[Tuple[Hashable, float]]:
+        if self._exact.get(digest):
+            return self._exact[digest][0], 1.0
+        if signature is None:
+            return None
+        best = None
+        seen = set()
+        for band, band_key in enumerate(self._band_keys(signature)):
+            for key in self._buckets[band].get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = self.similarity(signature, self._signatures[key])
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (key, score)
+                    if first:
+                        return best
+        return best
+
+    def find_duplicate(self, text: str) -> Optional[Tuple[Hashable, float]]:
+        """Return ``(key, similarity)`` of the closest indexed duplicate, or None"""
+        signature = self.signature(text) if self.threshold else None
+        with self._lock:
+            return self._find(text, self._exact_digest(text), signature)
+
+    def __contains__(self, text: str) -> bool:
+        with self._lock:
+            return bool(self._exact.get(self._exact_digest(text)))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, text: str, key: Optional[Hashable] = None, check: bool = True) -> Optional[Tuple[Hashable, float]]:
+        """Index a text unless it duplicates one already indexed.
+
+        Args:
+            text: Text to index
+            key: Key reported for this text by later lookups, defaults to the text
+            check: Refuse duplicates; with False the text is indexed regardless
+
+        Returns:
+            None when the text was added, otherwise ``(key, similarity)`` of
+            the duplicate it matched
+        """
+        key = text if key is None else key
+        digest = self._exact_digest(text)
+        signature = self.signature(text) if self.threshold else None
+        with self._lock:
+            if check:
+                duplicate = self._find(text, digest, signature, first=True)
+                if duplicate is not None:
+                    return duplicate
+            if key in self._keys:
+                self._remove(key)
+            self._exact.setdefault(digest, []).append(key)
+            self._keys[key] = digest
+            if signature is not None:
+                self._signatures[key] = signature
+                for band, band_key in enumerate(self._band_keys(signature)):
+                    self._buckets[band].setdefault(band_key, set()).add(key)
+        return None
+
+    def _remove(self, key: Hashable) -> bool:
+        digest = self._keys.pop(key, None)
+        if digest is None:
+            return False
+        keys = self._exact.get(digest)
+        if keys is not None:
+            keys.remove(key)
+            if not keys:
+                del self._exact[digest]
+        signature = self._signatures.pop(key, None)
+        if signature is not None:
+            for band, band_key in enumerate(self._band_keys(signature)):
+                bucket = self._buckets[band].get(band_key)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._buckets[band][band_key]
+        return True
+
+    def remove(self, key: Hashable) -> bool:
+        """Drop an indexed text by key"""
+        with self._lock:
+            return self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._keys.clear()
+            self._signatures.clear()
+            self._buckets = [{} for _ in range(self.bands)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._keys),
+                'threshold': self.threshold,
+                'bands': self.bands,
+                'rows': self.rows,
+                'largest_bucket': max((len(b) for buckets in self._buckets for b in buckets.values()), default=0)
+            }
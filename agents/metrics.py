@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 25.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5, 7, 10)
+THROUGHPUT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+DESCRIPTIONS = {
+    'llm_requests_total': 'Model calls by outcome',
+    'llm_request_seconds': 'Model call latency including retries and rate limiter waits',
+    'llm_request_attempts': 'Attempts needed per model call',
+    'llm_prompt_tokens_total': 'Prompt tokens reported by the provider',
+    'llm_completion_tokens_total': 'Completion tokens reported by the provider',
+    'llm_tokens_per_request': 'Total tokens per model call',
+    'llm_cache_hits_total': 'Model calls answered from the response cache',
+    'llm_retries_total': 'Retried model call attempts by reason',
+    'llm_time_to_first_token_seconds': 'Time from sending a streamed request to its first content chunk',
+    'llm_stream_tokens_per_second': 'Completion tokens per second after the first token of a stream',
+    'llm_stream_early_stops_total': 'Streams abandoned by an early-stop predicate',
+    'rate_limiter_wait_seconds': 'Time spent queued in the rate limiter per attempt',
+    'pipeline_stage_seconds': 'Duration of pipeline stages',
+    'campaign_queue_wait_seconds': 'Time a campaign test waited for a worker',
+    'campaign_test_seconds': 'Campaign test duration by type and status',
+    'campaign_tests_total': 'Finished campaign tests by status',
+    'a2a_tasks_total': 'A2A task status transitions',
+    'a2a_queue_wait_seconds': 'Time an A2A task waited for a worker',
+    'a2a_task_seconds': 'A2A task run time by outcome',
+    'batch_requests_submitted_total': 'Requests submitted through the Batch API',
+    'responses_classified_total': 'Recorded responses given a verdict, by label',
+    'attack_scheduler_selections_total': 'Prompts picked by the attack scheduler, by strategy',
+    'attack_scheduler_outcomes_total': 'Outcomes fed back to the attack scheduler',
+    'conversation_tree_nodes_total': 'Conversation tree branches by outcome'
+}
+
+def _series_key(name: str, labels: Dict[str, Any]) -> str:
+    if not labels:
+        return name
+    body = ','.join(f'{key}="{labels[key]}"' for key in sorted(labels))
+    return f"{name}{{{body}}}"
+
+def _split_key(key: str) -> Tuple[str, str]:
+    name, _, labels = key.partition('{')
+    return name, labels[:-1] if labels else ''
+
+def quantile(buckets: Sequence[Tuple[float, int]], q: float) -> Optional[float]:
+    """Estimate a quantile from cumulative ``(upper_bound, count)`` buckets.
+
+    Interpolates linearly inside the bucket holding the rank, the same way
+    Prometheus' ``histogram_quantile`` does. The last bucket must be ``+Inf``;
+    ranks falling there report the largest finite bound.
+    """
+    if not buckets or not buckets[-1][1]:
+        return None
+    rank = q * buckets[-1][1]
+    lower, below = 0.0, 0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float('inf'):
+                return lower
+            if count == below:
+                return bound
+            return lower + (bound - lower) * (rank - below) / (count - below)
+        lower, below = bound, count
+    return lower
+
+class Histogram:
+    """Fixed-bucket histogram: constant memory and mergeable across processes"""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        total = 0
+        result = []
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by metric name and labels.
+
+    Values are cumulative for the life of the process, as a Prometheus
+    scrape expects. :meth:`summary` turns them into plain JSON with
+    p50/p95/p99 estimates, optionally relative to an earlier summary so a
+    single run can be reported on its own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add ``value`` to a counter"""
+        key = _series_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels):
+        """Record one observation in a histogram"""
+        key = _series_key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        """Observe the duration of a ``with`` block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def stage(self, stage: str):
+        """Time a pipeline stage"""
+        return self.time('pipeline_stage_seconds', stage=stage)
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def summary(self, since: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Counters and histogram statistics, minus those of an earlier ``since`` summary"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (h.cumulative(), h.sum) for key, h in self._histograms.items()}
+
+        before_counters = (since or {}).get('counters', {})
+        before_histograms = (since or {}).get('histograms', {})
+        result = {'counters': {}, 'histograms': {}}
+        for key, value in sorted(counters.items()):
+            value -= before_counters.get(key, 0)
+            if value:
+                result['counters'][key] = value
+        for key, (buckets, total) in sorted(histograms.items()):
+            before = before_histograms.get(key)
+            if before:
+                earlier = dict((bound, count) for bound, count in _parse_buckets(before['buckets']))
+                buckets = [(bound, count - earlier.get(bound, 0)) for bound, count in buckets]
+                total -= before['sum']
+            if buckets[-1][1]:
+                result['histograms'][key] = _histogram_summary(buckets, total)
+        return result
+
+    def write_summary(self, filepath: str, since: Optional[Dict[str, Any]] = None,
+                      extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Write :meth:`summary` (plus ``extra`` fields) as JSON"""
+        summary = self.summary(since)
+        if extra:
+            summary.update(extra)
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, default=str)
+        return summary
+
+    def render(self) -> str:
+        """Prometheus text exposition of every metric"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (h.cumulative(), h.sum, h.count) for key, h in self._histograms.items()}
+
+        lines = []
+        described = set()
+
+        def describe(name: str, kind: str):
+            if name not in described:
+                described.add(name)
+                if name in DESCRIPTIONS:
+                    lines.append(f"# HELP {name} {DESCRIPTIONS[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for key in sorted(counters):
+            name, _ = _split_key(key)
+            describe(name, 'counter')
+            lines.append(f"{key} {counters[key]}")
+        for key in sorted(histograms):
+            name, labels = _split_key(key)
+            buckets, total, count = histograms[key]
+            describe(name, 'histogram')
+            prefix = f"{labels}," if labels else ''
+            for bound, cumulative in buckets:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ''
+            lines.append(f"{name}_sum{suffix} {total}")
+            lines.append(f"{name}_count{suffix} {count}")
+        return '\n'.join(lines) + '\n'
+
+def _parse_buckets(buckets: List[List[Any]]) -> List[Tuple[float, int]]:
+    return [(float('inf') if bound == '+Inf' else float(bound), count) for bound, count in buckets]
+
+def _histogram_summary(buckets: List[Tuple[float, int]], total: float) -> Dict[str, Any]:
+    count = buckets[-1][1]
+    summary = {'count': count, 'sum': round(total, 6), 'mean': round(total / count, 6) if count else None}
+    for q in QUANTILES:
+        value = quantile(buckets, q)
+        summary[f"p{int(q * 100)}"] = round(value, 6) if value is not None else None
+    summary['buckets'] = [['+Inf' if bound == float('inf') else bound, cumulative] for bound, cumulative in buckets]
+    return summary
+
+def merge_summaries(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine summaries from several processes, e.g. campaign shards"""
+    counters = {}
+    histograms = {}
+    for summary in summaries:
+        for key, value in summary.get('counters', {}).items():
+            counters[key] = counters.get(key, 0) + value
+        for key, histogram in summary.get('histograms', {}).items():
+            buckets, total = histograms.get(key, ({}, 0.0))
+            for bound, count in _parse_buckets(histogram['buckets']):
+                buckets[bound] = buckets.get(bound, 0) + count
+            histograms[key] = (buckets, total + histogram['sum'])
+    return {
+        'counters': dict(sorted(counters.items())),
+        'histograms': {
+            key: _histogram_summary(sorted(buckets.items()), total)
+            for key, (buckets, total) in sorted(histograms.items())
+        }
+    }
+
+class MetricsServer:
+    """Serves ``GET /metrics`` in the Prometheus text format from a background thread"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, host: str = '127.0.0.1', port: int = 9100):
+        self.registry = registry
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> 'MetricsServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics on {self.url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                registry = server.registry or get_metrics()
+                data = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics() -> MetricsRegistry:
+    """Return the registry shared by every agent in this process"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+        return _metrics
+
+def set_metrics(registry: MetricsRegistry):
+    """Replace the shared registry, e.g. to isolate a test"""
+    global _metrics
+    with _metrics_lock:
+        _metrics = registry
+
+def start_metrics_server(port: int, host: str = '127.0.0.1') -> MetricsServer:
+    """Start the Prometheus exporter for the shared registry"""
+    return MetricsServer(host=host, port=port).start()
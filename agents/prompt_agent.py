@@ -1,22 +1,87 @@
+import os
+import hashlib
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator, Sequence
 import random
+from collections import OrderedDict
+from .prompt_expansion import PromptExpansion
+from .prompt_history import PromptHistory, HistoryEntry, HistoryCursor
+from .dedup_index import DedupIndex
+from .attack_scheduler import AttackScheduler, BudgetExhaustedError
+
+# Formatted prompts remembered so outcomes can be credited to their template
+SCHEDULED_PROMPTS_KEPT = 1000
+
+FOLLOW_UP_TEMPLATES = [
+    "Can you elaborate on {}?",
+    "Tell me more about {}.",
+    "What are the implications of {}?",
+    "How does {} relate to the original context?"
+]
 
 logger = logging.getLogger(__name__)
 
+def template_id(template: str) -> str:
+    """Stable id of a prompt template, the same in every run"""
+    return 'template_' + hashlib.sha1(template.encode('utf-8')).hexdigest()[:12]
+
 class PromptAgent:
-    def __init__(self, base_prompts: Optional[List[str]] = None):
-        """Initialize the prompt agent with optional base prompts"""
+    def __init__(self, base_prompts: Optional[List[str]] = None, history: Optional[PromptHistory] = None,
+                 near_duplicate_threshold: Optional[float] = None, scheduler: Optional[AttackScheduler] = None):
+        """Initialize the prompt agent with optional base prompts.
+        
+        ``history`` sets the prompt history policy (see agents.prompt_history);
+        by default every entry is kept in memory. Base prompts are indexed so
+        :meth:`add_base_prompt` rejects exact duplicates in constant time;
+        with ``near_duplicate_threshold`` (estimated Jaccard similarity, e.g.
+        0.9) near-identical variants are rejected as well. Change
+        ``base_prompts`` through the agent's methods to keep the index in step.
+        
+        With a ``scheduler`` (see agents.attack_scheduler) templates are
+        chosen by their past success instead of uniformly; report how each
+        prompt fared with :meth:`record_outcome`. Without one, a scheduler
+        is loaded from ``ATTACK_SCHEDULER_STATE`` when that is set. The
+        scheduler knows templates by their id (see :meth:`describe_prompt`),
+        which is also what the recorder and result store see, so verdicts of
+        past runs steer later ones.
+        """
         self.base_prompts = base_prompts or []
-        self.prompt_history = []
+        self.prompt_history = history if history is not None else PromptHistory()
         self.context = {}
+        self.dedup_index = DedupIndex(threshold=near_duplicate_threshold)
+        for prompt in self.base_prompts:
+            self.dedup_index.add(prompt, check=False)
+        state_path = os.getenv('ATTACK_SCHEDULER_STATE')
+        if scheduler is None and state_path:
+            budget = os.getenv('ATTACK_BUDGET')
+            scheduler = AttackScheduler.load(
+                state_path,
+                strategy=os.getenv('ATTACK_SCHEDULER_STRATEGY', 'thompson'),
+                budget=int(budget) if budget else None
+            )
+        self.scheduler = scheduler
+        self.prompt_groups = {}
+        self.prompt_ids = {}
+        self._scheduled = OrderedDict()
+        
+    def add_base_prompt(self, prompt: str, category: Optional[str] = None, prompt_id: Optional[str] = None):
+        """Add a new base prompt to the collection unless it duplicates one already there.
         
-    def add_base_prompt(self, prompt: str):
-        """Add a new base prompt to the collection"""
+        ``category`` groups the prompt with others of its family for the scheduler.
+        ``prompt_id`` names it for the scheduler and the result store, by
+        default an id derived from the template text.
+        """
         try:
-            if prompt not in self.base_prompts:
+            duplicate = self.dedup_index.add(prompt)
+            if duplicate is None:
                 self.base_prompts.append(prompt)
+                if category is not None:
+                    self.prompt_groups[prompt] = category
+                if prompt_id is not None:
+                    self.prompt_ids[prompt] = prompt_id
                 return True
+            if duplicate[0] != prompt:
+                logger.info(f"Skipping near-duplicate base prompt ({duplicate[1]:.2f} similar to an existing one)")
             return False
         except Exception as e:
             logger.error(f"Error adding base prompt: {str(e)}")
@@ -28,7 +93,12 @@ class PromptAgent:
             if not self.base_prompts:
                 raise ValueError("No base prompts available")
                 
-            selected_prompt = random.choice(self.base_prompts)
+            if self.scheduler is not None:
+                by_arm = {self.prompt_id(template): template for template in self.base_prompts}
+                groups = {arm: self.prompt_groups.get(template) for arm, template in by_arm.items()}
+                selected_prompt = by_arm[self.scheduler.select(list(by_arm), 1, groups)[0]]
+            else:
+                selected_prompt = random.choice(self.base_prompts)
             
             if context:
                 # Update context
@@ -43,26 +113,102 @@ class PromptAgent:
             else:
                 formatted_prompt = selected_prompt
                 
-            self.prompt_history.append({
-                'base_prompt': selected_prompt,
-                'formatted_prompt': formatted_prompt,
-                'context': context
-            })
+            self._scheduled[formatted_prompt] = selected_prompt
+            self._scheduled.move_to_end(formatted_prompt)
+            if len(self._scheduled) > SCHEDULED_PROMPTS_KEPT:
+                self._scheduled.popitem(last=False)
+                
+            self.prompt_history.append(HistoryEntry(
+                'prompt',
+                base_prompt=selected_prompt,
+                formatted_prompt=formatted_prompt,
+                context=context,
+                prompt_id=self.prompt_id(selected_prompt)
+            ))
             
             return formatted_prompt
             
+        except BudgetExhaustedError as e:
+            logger.info(str(e))
+            return ""
         except Exception as e:
             logger.error(f"Error generating prompt: {str(e)}")
             return ""
             
+    def prompt_id(self, template: str) -> str:
+        """Id the scheduler and the result store know a template by"""
+        prompt_id = self.prompt_ids.get(template)
+        if prompt_id is None:
+            prompt_id = self.prompt_ids[template] = template_id(template)
+        return prompt_id
+        
+    def describe_prompt(self, prompt: str) -> Dict[str, Optional[str]]:
+        """Id and category of a generated prompt's template, to record with it.
+        
+        Record this as the interaction's ``prompt`` (e.g.
+        ``{'prompt': agent.describe_prompt(p), 'generated_text': reply}``)
+        so the result store files the verdict under the scheduler's arm.
+        """
+        template = self._scheduled.get(prompt, prompt)
+        return {'id': self.prompt_id(template), 'category': self.prompt_groups.get(template), 'content': prompt}
+        
+    def record_outcome(self, prompt: str, outcome: Any, cost: float = 1.0) -> bool:
+        """Tell the scheduler how a prompt fared.
+        
+        Args:
+            prompt: Generated prompt, or the base prompt it came from
+            outcome: Score in [0, 1], classifier label or classifier verdict
+            cost: Cost of the request, e.g. its total tokens
+        """
+        if self.scheduler is None:
+            return False
+        template = self._scheduled.get(prompt, prompt)
+        self.scheduler.record(self.prompt_id(template), outcome, cost, group=self.prompt_groups.get(template))
+        return True
+            
+    def generate_prompts(self, grid: Dict[str, Sequence[Any]], templates: Optional[List[str]] = None,
+                         sample: Optional[int] = None, seed: Optional[int] = None,
+                         strict: bool = True, with_context: bool = False) -> Iterator:
+        """Stream prompt variants for every template over a grid of context values.
+        
+        Templates are compiled and their placeholders validated once up front.
+        Without ``sample`` the full cartesian product is streamed; otherwise
+        ``sample`` distinct variants are drawn reproducibly using ``seed``.
+        Batch variants are not added to the prompt history.
+        
+        Args:
+            grid: Mapping of context key to the values to try
+            templates: Templates to expand, defaults to the base prompts
+            sample: Number of variants to draw instead of the full product
+            seed: Seed for the sample
+            strict: Raise on templates with unknown placeholders instead of skipping them
+            with_context: Yield ``(template, context, prompt)`` tuples instead of strings
+            
+        Yields:
+            Formatted prompts
+        """
+        expansion = PromptExpansion(self.base_prompts if templates is None else templates, grid, strict=strict)
+        variants = iter(expansion) if sample is None else expansion.sample(sample, seed=seed)
+        if with_context:
+            return variants
+        return (prompt for _, _, prompt in variants)
+        
     def get_prompt_history(self) -> List[Dict[str, Any]]:
-        """Get the history of generated prompts"""
-        return self.prompt_history
+        """Get the history of generated prompts.
+        
+        Returns a new list of dicts on every call rather than the live history;
+        use :meth:`history_cursor` to follow new entries without copying.
+        """
+        return [entry.to_dict() for entry in self.prompt_history.cursor(self.prompt_history.first_available)]
+        
+    def history_cursor(self, start: int = 0) -> HistoryCursor:
+        """Read the prompt history from a sequence number onwards without copying it"""
+        return self.prompt_history.cursor(start)
         
     def clear_history(self):
         """Clear the prompt history"""
         try:
-            self.prompt_history = []
+            self.prompt_history.clear()
             return True
         except Exception as e:
             logger.error(f"Error clearing history: {str(e)}")
@@ -93,8 +239,10 @@ class PromptAgent:
     def remove_base_prompt(self, prompt: str) -> bool:
         """Remove a base prompt from the collection"""
         try:
-            if prompt in self.base_prompts:
+            if prompt in self.dedup_index:
                 self.base_prompts.remove(prompt)
+                if prompt not in self.base_prompts:
+                    self.dedup_index.remove(prompt)
                 return True
             return False
         except Exception as e:
@@ -108,28 +256,44 @@ class PromptAgent:
     def generate_follow_up(self, previous_response: str) -> str:
         """Generate a follow-up prompt based on the previous response"""
         try:
-            # Simple follow-up generation logic
-            follow_up_templates = [
-                "Can you elaborate on {}?",
-                "Tell me more about {}.",
-                "What are the implications of {}?",
-                "How does {} relate to the original context?"
-            ]
-            
             # Extract key phrases or use the first sentence
             key_phrase = previous_response.split('.')[0]
             
             # Generate follow-up
-            follow_up = random.choice(follow_up_templates).format(key_phrase)
+            follow_up = random.choice(FOLLOW_UP_TEMPLATES).format(key_phrase)
             
-            self.prompt_history.append({
-                'type': 'follow_up',
-                'previous_response': previous_response,
-                'generated_follow_up': follow_up
-            })
+            self.prompt_history.append(HistoryEntry(
+                'follow_up',
+                previous_response=previous_response,
+                generated_follow_up=follow_up
+            ))
             
             return follow_up
             
         except Exception as e:
             logger.error(f"Error generating follow-up: {str(e)}")
-            return "" 
\ No newline at end of file
+            return ""
+            
+    def generate_follow_ups(self, previous_response: str, n: Optional[int] = None,
+                            templates: Optional[List[str]] = None) -> List[str]:
+        """Generate up to ``n`` distinct follow-ups to a response, one per template.
+        
+        Used to branch a conversation (see conversation_tree); ``templates``
+        default to the ones :meth:`generate_follow_up` draws from.
+        """
+        try:
+            templates = templates or FOLLOW_UP_TEMPLATES
+            key_phrase = previous_response.split('.')[0]
+            chosen = random.sample(templates, min(n or len(templates), len(templates)))
+            follow_ups = [template.format(key_phrase) for template in chosen]
+            for follow_up in follow_ups:
+                self.prompt_history.append(HistoryEntry(
+                    'follow_up',
+                    previous_response=previous_response,
+                    generated_follow_up=follow_up
+                ))
+            return follow_ups
+            
+        except Exception as e:
+            logger.error(f"Error generating follow-ups: {str(e)}")
+            return []
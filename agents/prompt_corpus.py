@@ -0,0 +1,288 @@
+import os
+import re
+import json
+import mmap
+import struct
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'RWCORP01'
+HEADER = struct.Struct('<8sQQ')      # magic, slot capacity, entry count
+SLOT = struct.Struct('<QQI')         # id hash (0 = empty), body offset, record length
+MAX_LOAD = 0.7
+MIN_CAPACITY = 64
+
+def _id_hash(prompt_id: str) -> int:
+    value = int.from_bytes(hashlib.blake2b(prompt_id.encode('utf-8'), digest_size=8).digest(), 'little')
+    return value or 1
+
+def _yaml_loader():
+    import yaml
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+class PromptCorpus:
+    """Compiled prompt corpus: a JSONL body plus a memory-mapped hash index.
+
+    The body holds one prompt per line in insertion order and is iterated
+    lazily. The ``.idx`` file is an open-addressing hash table mapping each
+    prompt id to its byte range in the body, giving O(1) lookups without
+    loading the corpus. Appends add a line to the body and a slot to the
+    index; the index is only rebuilt when it needs to grow.
+    """
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        self.body_path = f"{base_path}.jsonl"
+        self.index_path = f"{base_path}.idx"
+        self.manifest_path = f"{base_path}.manifest.json"
+        self._lock = threading.RLock()
+        self._index_file = None
+        self._index = None
+        self._body = None
+        self.manifest = {}
+
+    # -- storage -----------------------------------------------------------
+
+    def _close(self):
+        for handle in (self._index, self._index_file, self._body):
+            if handle is not None:
+                handle.close()
+        self._index = self._index_file = self._body = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _open(self):
+        if self._index is not None:
+            return
+        self._index_file = open(self.index_path, 'r+b')
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+        self._body = open(self.body_path, 'rb')
+
+    def exists(self) -> bool:
+        return all(os.path.exists(p) for p in (self.body_path, self.index_path, self.manifest_path))
+
+    def _load_manifest(self):
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _header(self):
+        return HEADER.unpack_from(self._index, 0)
+
+    def _write_index(self, path: str, capacity: int, entries: Iterable[tuple]):
+        """Write a fresh hash table holding ``(hash, offset, length)`` entries"""
+        table = bytearray(HEADER.size + capacity * SLOT.size)
+        count = 0
+        for key_hash, offset, length in entries:
+            slot = key_hash % capacity
+            while True:
+                position = HEADER.size + slot * SLOT.size
+                existing = SLOT.unpack_from(table, position)[0]
+                if existing == 0:
+                    count += 1
+                    break
+                if existing == key_hash:
+                    break
+                slot = (slot + 1) % capacity
+            SLOT.pack_into(table, position, key_hash, offset, length)
+        HEADER.pack_into(table, 0, MAGIC, capacity, count)
+        with open(path, 'wb') as f:
+            f.write(table)
+
+    def _slots(self):
+        capacity = self._header()[1]
+        for slot in range(capacity):
+            entry = SLOT.unpack_from(self._index, HEADER.size + slot * SLOT.size)
+            if entry[0]:
+                yield entry
+
+    def _read_record(self, offset: int, length: int) -> Dict[str, Any]:
+        self._body.seek(offset)
+        return json.loads(self._body.read(length))
+
+    def _find_slot(self, prompt_id: str):
+        """Return ``(position, offset, length)`` for an id, or the free position"""
+        _, capacity, _ = self._header()
+        key_hash = _id_hash(prompt_id)
+        slot = key_hash % capacity
+        while True:
+            position = HEADER.size + slot * SLOT.size
+            existing, offset, length = SLOT.unpack_from(self._index, position)
+            if existing == 0:
+                return position, None, None
+            if existing == key_hash and self._read_record(offset, length).get('id') == prompt_id:
+                return position, offset, length
+            slot = (slot + 1) % capacity
+
+    def _is_current(self, prompt_id: str, offset: int) -> bool:
+        """Whether the index still points the id at the record at ``offset``"""
+        _, capacity, _ = self._header()
+        key_hash = _id_hash(prompt_id)
+        slot = key_hash % capacity
+        while True:
+            existing, slot_offset, _ = SLOT.unpack_from(self._index, HEADER.size + slot * SLOT.size)
+            if existing == 0:
+                return False
+            if existing == key_hash and slot_offset == offset:
+                return True
+            slot = (slot + 1) % capacity
+
+    # -- building ----------------------------------------------------------
+
+    def build(self, prompts: Iterable[Dict[str, Any]], source: Optional[Dict[str, Any]] = None):
+        """Compile a corpus from scratch"""
+        with self._lock:
+            self._close()
+            os.makedirs(os.path.dirname(self.base_path) or '.', exist_ok=True)
+            entries = []
+            offset = 0
+            with open(f"{self.body_path}.tmp", 'wb') as body:
+                for prompt in prompts:
+                    line = json.dumps(prompt, ensure_ascii=False).encode('utf-8') + b'\n'
+                    body.write(line)
+                    if prompt.get('id') is not None:
+                        entries.append((_id_hash(str(prompt['id'])), offset, len(line) - 1))
+                    offset += len(line)
+
+            capacity = max(MIN_CAPACITY, int(len(entries) / MAX_LOAD) + 1)
+            self._write_index(f"{self.index_path}.tmp", capacity, entries)
+            os.replace(f"{self.body_path}.tmp", self.body_path)
+            os.replace(f"{self.index_path}.tmp", self.index_path)
+            self.manifest = {'source': source, 'body_size': offset}
+            self._save_manifest()
+            logger.info(f"Compiled prompt corpus with {len(entries)} indexed prompts to {self.body_path}")
+
+    def _grow(self):
+        """Rehash into a table twice the size"""
+        _, capacity, _ = self._header()
+        entries = list(self._slots())
+        self._close()
+        self._write_index(f"{self.index_path}.tmp", capacity * 2, entries)
+        os.replace(f"{self.index_path}.tmp", self.index_path)
+        self._open()
+
+    def append(self, prompts: List[Dict[str, Any]]):
+        """Append prompts without rewriting the body; a repeated id replaces the earlier entry"""
+        with self._lock:
+            self._open()
+            with open(self.body_path, 'ab') as body:
+                offset = body.tell()
+                for prompt in prompts:
+                    line = json.dumps(prompt, ensure_ascii=False).encode('utf-8') + b'\n'
+                    body.write(line)
+                    body.flush()
+                    if prompt.get('id') is not None:
+                        _, capacity, count = self._header()
+                        if count + 1 > capacity * MAX_LOAD:
+                            self._grow()
+                            _, capacity, count = self._header()
+                        position, existing_offset, _ = self._find_slot(str(prompt['id']))
+                        SLOT.pack_into(self._index, position, _id_hash(str(prompt['id'])), offset, len(line) - 1)
+                        if existing_offset is None:
+                            HEADER.pack_into(self._index, 0, MAGIC, capacity, count + 1)
+                    offset += len(line)
+            self._index.flush()
+            self.manifest['body_size'] = offset
+            self._save_manifest()
+
+    def ensure_from_yaml(self, yaml_path: str) -> bool:
+        """Rebuild the corpus if the YAML source changed since it was compiled.
+
+        Returns True when a rebuild happened.
+        """
+        with self._lock:
+            stat = os.stat(yaml_path)
+            fingerprint = {'path': yaml_path, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+            if self.exists():
+                if not self.manifest:
+                    self._load_manifest()
+                source = self.manifest.get('source') or {}
+                if all(source.get(k) == v for k, v in fingerprint.items()):
+                    return False
+
+            import yaml
+            with open(yaml_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            data = yaml.load(text, Loader=_yaml_loader()) or {}
+            fingerprint['append_indent'] = self._append_indent(text, data)
+            self.build(data.get('prompts', []) or [], source=fingerprint)
+            return True
+
+    @staticmethod
+    def _append_indent(text: str, data: Dict[str, Any]) -> Optional[str]:
+        """Indentation of the prompt list items, if entries can be appended to the YAML text"""
+        if list(data) != ['prompts'] or not data['prompts']:
+            return None
+        match = re.search(r'^prompts:\s*\n(?:\s*#.*\n|\s*\n)*([ \t]*)- ', text, re.MULTILINE)
+        return match.group(1) if match else None
+
+    def append_to_yaml(self, yaml_path: str, prompts: List[Dict[str, Any]]) -> bool:
+        """Append prompts to the YAML source and the corpus without rewriting either.
+
+        Returns False if the YAML layout does not allow a plain append.
+        """
+        with self._lock:
+            self.ensure_from_yaml(yaml_path)
+            source = self.manifest.get('source') or {}
+            indent = source.get('append_indent')
+            if indent is None:
+                return False
+
+            import yaml
+            block = yaml.safe_dump(prompts, default_flow_style=False, sort_keys=False, allow_unicode=True)
+            block = ''.join(indent + line for line in block.splitlines(True))
+            with open(yaml_path, 'rb+') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        block = '\n' + block
+                f.write(block.encode('utf-8'))
+
+            self.append(prompts)
+            stat = os.stat(yaml_path)
+            source.update({'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size})
+            self._save_manifest()
+            return True
+
+    # -- reading -----------------------------------------------------------
+
+    def get(self, prompt_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a prompt by id"""
+        with self._lock:
+            self._open()
+            _, offset, length = self._find_slot(str(prompt_id))
+            return self._read_record(offset, length) if offset is not None else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._open()
+            return self._header()[2]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Lazily iterate prompts in insertion order, skipping replaced entries"""
+        with open(self.body_path, 'rb') as body:
+            offset = 0
+            for line in body:
+                prompt = json.loads(line)
+                prompt_id = prompt.get('id')
+                if prompt_id is None:
+                    yield prompt
+                else:
+                    with self._lock:
+                        self._open()
+                        current = self._is_current(str(prompt_id), offset)
+                    if current:
+                        yield prompt
+                offset += len(line)
@@ -0,0 +1,123 @@
+import random
+import bisect
+import logging
+import itertools
+from string import Formatter
+from typing import Any, List, Optional, Iterable, Iterator, Mapping, Sequence
+
+logger = logging.getLogger(__name__)
+
+class CompiledTemplate:
+    """A prompt template parsed once into literal text and named fields"""
+
+    __slots__ = ('template', 'fields', '_parts', '_simple')
+
+    def __init__(self, template: str):
+        self.template = template
+        fields = []
+        parts = []
+        simple = True
+        for literal, field_name, format_spec, conversion in Formatter().parse(template):
+            if literal:
+                parts.append((True, literal))
+            if field_name is None:
+                continue
+            name = self._add_field(fields, field_name)
+            # Format specs may hold placeholders of their own, e.g. '{a:>{width}}'
+            for _, nested, _, _ in Formatter().parse(format_spec or ''):
+                if nested is not None:
+                    self._add_field(fields, nested)
+            if format_spec or conversion or name != field_name:
+                simple = False
+            parts.append((False, name))
+        self.fields = tuple(fields)
+        self._parts = tuple(parts)
+        self._simple = simple
+
+    def _add_field(self, fields: List[str], field_name: str) -> str:
+        name = field_name.split('.')[0].split('[')[0]
+        if not name or name.isdigit():
+            raise ValueError(f"Positional placeholder in template: {self.template!r}")
+        if name not in fields:
+            fields.append(name)
+        return name
+
+    def missing(self, keys: Iterable[str]) -> List[str]:
+        """Placeholders that ``keys`` does not provide"""
+        available = set(keys)
+        return [name for name in self.fields if name not in available]
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        """Fill the template; ``values`` must provide every field"""
+        if not self._simple:
+            return self.template.format_map(values)
+        return ''.join(text if is_literal else str(values[text]) for is_literal, text in self._parts)
+
+def compile_templates(templates: Iterable[str], keys: Iterable[str], strict: bool = True) -> List[CompiledTemplate]:
+    """Compile templates and validate their placeholders against ``keys`` once.
+
+    With ``strict`` a template needing an unknown placeholder raises
+    ValueError; otherwise it is skipped with a warning.
+    """
+    keys = list(keys)
+    compiled = []
+    for template in templates:
+        entry = CompiledTemplate(template)
+        missing = entry.missing(keys)
+        if missing:
+            if strict:
+                raise ValueError(f"Template {template!r} needs missing context keys: {missing}")
+            logger.warning(f"Skipping template {template!r}, missing context keys: {missing}")
+            continue
+        compiled.append(entry)
+    return compiled
+
+class PromptExpansion:
+    """Cartesian product of templates and a grid of context values.
+
+    Each template only varies the grid keys it actually uses, so a template
+    without placeholders yields one prompt. Variants are addressed by a flat
+    index, which lets a seeded sample be drawn without building the product.
+    """
+
+    def __init__(self, templates: Iterable[str], grid: Mapping[str, Sequence[Any]], strict: bool = True):
+        self.grid = {key: list(values) for key, values in grid.items()}
+        self.templates = compile_templates(templates, self.grid, strict=strict)
+        self._offsets = []
+        total = 0
+        for template in self.templates:
+            self._offsets.append(total)
+            size = 1
+            for name in template.fields:
+                size *= len(self.grid[name])
+            total += size
+        self.total = total
+
+    def __len__(self) -> int:
+        return self.total
+
+    def _variant(self, index: int):
+        position = bisect.bisect_right(self._offsets, index) - 1
+        template = self.templates[position]
+        remainder = index - self._offsets[position]
+        choices = []
+        for name in reversed(template.fields):
+            options = self.grid[name]
+            remainder, choice = divmod(remainder, len(options))
+            choices.append(options[choice])
+        return template, dict(zip(template.fields, reversed(choices)))
+
+    def __iter__(self) -> Iterator[tuple]:
+        """Stream every ``(template, values, prompt)`` in order"""
+        for template in self.templates:
+            columns = [self.grid[name] for name in template.fields]
+            for combo in itertools.product(*columns):
+                values = dict(zip(template.fields, combo))
+                yield template.template, values, template.render(values)
+
+    def sample(self, k: int, seed: Optional[int] = None) -> Iterator[tuple]:
+        """Stream ``k`` distinct variants chosen reproducibly from ``seed``"""
+        rng = random.Random(seed)
+        for index in rng.sample(range(self.total), min(k, self.total)):
+            template, values = self._variant(index)
+            yield template.template, values, template.render(values)
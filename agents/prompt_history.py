@@ -0,0 +1,264 @@
+import os
+import json
+import random
+import logging
+import threading
+from typing import Dict, Any, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+class HistoryEntry:
+    """One generated prompt or follow-up, stored without a per-entry dict"""
+
+    __slots__ = ('kind', 'base_prompt', 'formatted_prompt', 'context',
+                 'previous_response', 'generated_follow_up', 'prompt_id')
+
+    def __init__(self, kind: str, base_prompt: Optional[str] = None, formatted_prompt: Optional[str] = None,
+                 context: Optional[Dict[str, Any]] = None, previous_response: Any = None,
+                 generated_follow_up: Optional[str] = None, prompt_id: Optional[str] = None):
+        self.kind = kind
+        self.base_prompt = base_prompt
+        self.formatted_prompt = formatted_prompt
+        self.context = context
+        self.previous_response = previous_response
+        self.generated_follow_up = generated_follow_up
+        self.prompt_id = prompt_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The dict layout PromptAgent has always exposed"""
+        if self.kind == 'follow_up':
+            return {
+                'type': 'follow_up',
+                'previous_response': self.previous_response,
+                'generated_follow_up': self.generated_follow_up
+            }
+        return {
+            'base_prompt': self.base_prompt,
+            'formatted_prompt': self.formatted_prompt,
+            'context': self.context,
+            'prompt_id': self.prompt_id
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HistoryEntry':
+        if data.get('type') == 'follow_up':
+            return cls('follow_up', previous_response=data.get('previous_response'),
+                       generated_follow_up=data.get('generated_follow_up'))
+        return cls('prompt', base_prompt=data.get('base_prompt'),
+                   formatted_prompt=data.get('formatted_prompt'), context=data.get('context'),
+                   prompt_id=data.get('prompt_id'))
+
+class PromptHistory:
+    """Unbounded in-memory history (the original behaviour).
+
+    Every policy numbers entries with an increasing sequence number.
+    ``cursor(start)`` reads entries from a sequence number onwards without
+    copying the history, and can be resumed later from ``cursor.position``.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        """Number of entries ever stored"""
+        return len(self._entries)
+
+    @property
+    def first_available(self) -> int:
+        """Sequence number of the oldest entry still readable"""
+        return 0
+
+    def append(self, entry: HistoryEntry):
+        with self._lock:
+            self._entries.append(entry)
+
+    def get(self, seq: int) -> HistoryEntry:
+        return self._entries[seq]
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+
+    def __len__(self) -> int:
+        return self.total - self.first_available
+
+    def cursor(self, start: int = 0) -> 'HistoryCursor':
+        return HistoryCursor(self, start)
+
+    def storage(self) -> 'PromptHistory':
+        """The history actually holding the entries, for readers that bypass ``get``"""
+        return self
+
+    def __iter__(self) -> Iterator[HistoryEntry]:
+        return iter(self.cursor())
+
+class RingBufferHistory(PromptHistory):
+    """Keeps only the most recent ``maxlen`` entries in a fixed-size buffer"""
+
+    def __init__(self, maxlen: int = 1000):
+        super().__init__()
+        if maxlen < 1:
+            raise ValueError("maxlen must be at least 1")
+        self.maxlen = maxlen
+        self._entries = [None] * maxlen
+        self._total = 0
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    @property
+    def first_available(self) -> int:
+        return max(0, self._total - self.maxlen)
+
+    def append(self, entry: HistoryEntry):
+        with self._lock:
+            self._entries[self._total % self.maxlen] = entry
+            self._total += 1
+
+    def get(self, seq: int) -> HistoryEntry:
+        if not self.first_available <= seq < self._total:
+            raise IndexError(seq)
+        return self._entries[seq % self.maxlen]
+
+    def clear(self):
+        with self._lock:
+            self._entries = [None] * self.maxlen
+            self._total = 0
+
+class SampledHistory(PromptHistory):
+    """Keeps a random fraction ``rate`` of entries in an inner history"""
+
+    def __init__(self, rate: float = 0.01, inner: Optional[PromptHistory] = None, seed: Optional[int] = None):
+        super().__init__()
+        if not 0 < rate <= 1:
+            raise ValueError("rate must be in (0, 1]")
+        self.rate = rate
+        self.inner = inner if inner is not None else PromptHistory()
+        self._random = random.Random(seed)
+        self.seen = 0
+
+    @property
+    def total(self) -> int:
+        return self.inner.total
+
+    @property
+    def first_available(self) -> int:
+        return self.inner.first_available
+
+    def append(self, entry: HistoryEntry):
+        self.seen += 1
+        if self._random.random() < self.rate:
+            self.inner.append(entry)
+
+    def get(self, seq: int) -> HistoryEntry:
+        return self.inner.get(seq)
+
+    def storage(self) -> PromptHistory:
+        return self.inner.storage()
+
+    def clear(self):
+        self.inner.clear()
+        self.seen = 0
+
+class SpillToDiskHistory(PromptHistory):
+    """Keeps up to ``buffer_size`` entries in memory and spills older ones to a JSONL file"""
+
+    def __init__(self, path: str, buffer_size: int = 1000):
+        super().__init__()
+        self.path = path
+        self.buffer_size = buffer_size
+        self._spilled = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Start from an empty file so sequence numbers match line numbers
+        open(path, 'w').close()
+
+    @property
+    def total(self) -> int:
+        return self._spilled + len(self._entries)
+
+    def append(self, entry: HistoryEntry):
+        with self._lock:
+            self._entries.append(entry)
+            if len(self._entries) >= self.buffer_size:
+                self._spill()
+
+    def _spill(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for entry in self._entries:
+                f.write(json.dumps(entry.to_dict(), ensure_ascii=False, default=str) + '\n')
+        self._spilled += len(self._entries)
+        self._entries = []
+
+    def flush(self):
+        """Write buffered entries to disk"""
+        with self._lock:
+            self._spill()
+
+    def get(self, seq: int) -> HistoryEntry:
+        if seq >= self._spilled:
+            return self._entries[seq - self._spilled]
+        for entry in self._read_spilled(seq):
+            return entry
+        raise IndexError(seq)
+
+    def _read_spilled(self, start: int) -> Iterator[HistoryEntry]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for seq, line in enumerate(f):
+                if seq >= start:
+                    yield HistoryEntry.from_dict(json.loads(line))
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._spilled = 0
+            open(self.path, 'w').close()
+
+class HistoryCursor:
+    """Forward reader over a history that never copies it.
+
+    Entries dropped by a bounded policy before the cursor reaches them are
+    skipped. Iterating again after new entries arrive resumes from
+    ``position``.
+    """
+
+    def __init__(self, history: PromptHistory, start: int = 0):
+        self.history = history
+        self.position = start
+
+    def __iter__(self) -> Iterator[HistoryEntry]:
+        history = self.history.storage()
+        while True:
+            if isinstance(history, SpillToDiskHistory) and self.position < history._spilled:
+                # Read spilled entries sequentially rather than one lookup each
+                spilled = history._spilled
+                for entry in history._read_spilled(self.position):
+                    if self.position >= spilled:
+                        break
+                    self.position += 1
+                    yield entry
+                continue
+            self.position = max(self.position, history.first_available)
+            if self.position >= history.total:
+                return
+            try:
+                entry = history.get(self.position)
+            except IndexError:
+                continue
+            self.position += 1
+            yield entry
+
+HISTORY_POLICIES = {
+    'unbounded': PromptHistory,
+    'ring_buffer': RingBufferHistory,
+    'sampled': SampledHistory,
+    'spill_to_disk': SpillToDiskHistory
+}
+
+def create_history(policy: str = 'unbounded', **kwargs) -> PromptHistory:
+    """Create a prompt history by policy name"""
+    if policy not in HISTORY_POLICIES:
+        raise ValueError(f"Unknown history policy: {policy}")
+    return HISTORY_POLICIES[policy](**kwargs)
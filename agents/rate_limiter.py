@@ -0,0 +1,249 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Optional, Callable, Awaitable
+from dotenv import load_dotenv
+from .metrics import get_metrics, ATTEMPT_BUCKETS
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of blocking.
+
+    A reservation always succeeds and may drive the balance negative; the
+    caller then waits until the debt is repaid. This keeps the lock held
+    for a few arithmetic operations only, for both threads and coroutines.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.balance = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float, factor: float):
+        elapsed = now - self.updated
+        self.balance = min(self.capacity, self.balance + elapsed * self.rate * factor)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float, factor: float = 1.0) -> float:
+        """Take ``amount`` tokens and return how long to wait before using them"""
+        self._refill(now, factor)
+        # A single request larger than the bucket would otherwise never fit
+        self.balance -= min(amount, self.capacity)
+        if self.balance >= 0:
+            return 0.0
+        return -self.balance / (self.rate * factor)
+
+    def adjust(self, amount: float):
+        """Refund (negative) or charge (positive) tokens after the fact"""
+        self.balance = min(self.capacity, self.balance - amount)
+
+def estimate_tokens(request: Dict[str, Any]) -> int:
+    """Rough token cost of a chat request: ~4 characters per token plus the completion"""
+    chars = sum(len(str(m.get('content') or '')) for m in request.get('messages', []))
+    return chars // 4 + int(request.get('max_tokens') or 0)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        value = headers.get('retry-after')
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an API error is worth retrying after a backoff"""
+    from openai import APIConnectionError, APITimeoutError
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    return getattr(error, 'status_code', None) in RETRYABLE_STATUS_CODES
+
+class RateLimiter:
+    """Process-wide request and token budget with adaptive, jittered retries.
+
+    Requests per minute and tokens per minute are tracked in two token
+    buckets. A 429 halves the effective rate and every success restores a
+    little of it, so throughput settles just under the provider ceiling.
+    """
+
+    def __init__(self,
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 max_retries: int = 5,
+                 base_delay: float = 1.0,
+                 max_delay: float = 60.0,
+                 min_rate_factor: float = 0.1,
+                 recovery_step: float = 0.05):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_rate_factor = min_rate_factor
+        self.recovery_step = recovery_step
+        self.rate_factor = 1.0
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'retries': 0,
+            'throttled': 0,
+            'failures': 0,
+            'in_flight': 0,
+            'total_wait': 0.0
+        }
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.requests:
+                wait = max(wait, self.requests.reserve(1, now, self.rate_factor))
+            if self.tokens:
+                wait = max(wait, self.tokens.reserve(tokens, now, self.rate_factor))
+            self._stats['total_wait'] += wait
+            return wait
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until one request of ``tokens`` fits the budget; returns the wait"""
+        wait = self._reserve(tokens)
+        get_metrics().observe('rate_limiter_wait_seconds', wait)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: int = 0) -> float:
+        """Async variant of :meth:`acquire`"""
+        wait = self._reserve(tokens)
+        get_metrics().observe('rate_limiter_wait_seconds', wait)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def reconcile(self, estimated: int, actual: Optional[int]):
+        """Correct the token budget once the real usage is known"""
+        if self.tokens and actual is not None:
+            with self._lock:
+                self.tokens.adjust(actual - estimated)
+
+    def _on_success(self, attempt: int):
+        with self._lock:
+            self._stats['requests'] += 1
+            self.rate_factor = min(1.0, self.rate_factor + self.recovery_step)
+        get_metrics().observe('llm_request_attempts', attempt + 1, buckets=ATTEMPT_BUCKETS)
+
+    def _on_error(self, error: Exception, attempt: int) -> Optional[float]:
+        """Record a failed attempt and return the backoff delay, or None to give up"""
+        with self._lock:
+            if getattr(error, 'status_code', None) == 429:
+                self._stats['throttled'] += 1
+                self.rate_factor = max(self.min_rate_factor, self.rate_factor / 2)
+            if not is_retryable(error) or attempt >= self.max_retries:
+                self._stats['failures'] += 1
+                return None
+            self._stats['retries'] += 1
+        get_metrics().inc('llm_retries_total', reason=getattr(error, 'status_code', None) or type(error).__name__)
+
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        logger.warning(f"Retrying after {type(error).__name__} in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+        return delay
+
+    def _track(self, delta: int):
+        with self._lock:
+            self._stats['in_flight'] += delta
+
+    def call(self, fn: Callable[[], Any], tokens: int = 0) -> Any:
+        """Call ``fn`` within the budget, retrying retryable errors.
+
+        The tokens reserved for a failed attempt are refunded, while the
+        attempt still counts against the request budget.
+        """
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            self._track(1)
+            try:
+                result = fn()
+            except Exception as e:
+                # A failed attempt is not billed, so only its request is charged
+                self.reconcile(tokens, 0)
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                self._track(-1)
+            self._on_success(attempt)
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """Async variant of :meth:`call`; ``fn`` returns a fresh awaitable per attempt"""
+        attempt = 0
+        while True:
+            await self.acquire_async(tokens)
+            self._track(1)
+            try:
+                result = await fn()
+            except Exception as e:
+                # A failed attempt is not billed, so only its request is charged
+                self.reconcile(tokens, 0)
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                self._track(-1)
+            self._on_success(attempt)
+            return result
+
+    def get_state(self) -> Dict[str, Any]:
+        """Snapshot of the limiter's budgets and counters"""
+        with self._lock:
+            now = time.monotonic()
+            state = dict(self._stats)
+            state['rate_factor'] = round(self.rate_factor, 3)
+            for name, bucket in (('requests', self.requests), ('tokens', self.tokens)):
+                if bucket:
+                    bucket._refill(now, self.rate_factor)
+                    state[f'{name}_available'] = round(bucket.balance, 1)
+                    state[f'{name}_per_minute'] = bucket.capacity
+                else:
+                    state[f'{name}_available'] = None
+                    state[f'{name}_per_minute'] = None
+            return state
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the limiter shared by every agent in this process"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(
+                requests_per_minute=float(os.getenv('OPENAI_RPM_LIMIT', '0')) or None,
+                tokens_per_minute=float(os.getenv('OPENAI_TPM_LIMIT', '0')) or None,
+                max_retries=int(os.getenv('OPENAI_MAX_RETRIES', '5'))
+            )
+        return _limiter
+
+def set_rate_limiter(limiter: RateLimiter):
+    """Replace the shared limiter, e.g. with budgets for a specific provider tier"""
+    global _limiter
+    with _limiter_lock:
+        _limiter = limiter
@@ -1,17 +1,84 @@
 import os
 import json
+import time
 import logging
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator
 
 logger = logging.getLogger(__name__)
 
 class RecorderAgent:
-    def __init__(self, result_dir: str = "test_results"):
-        """Initialize the recorder agent with a result directory"""
+    def __init__(self, result_dir: str = "test_results", streaming: bool = False,
+                 session_name: str = "session", flush_every: int = 100, fsync_interval: float = 5.0):
+        """Initialize the recorder agent with a result directory.
+        
+        In streaming mode interactions are appended to a JSONL file instead of
+        being kept in ``current_session``. Writes are buffered and flushed to
+        disk every ``flush_every`` records or ``fsync_interval`` seconds. The
+        file is named after ``session_name`` until :meth:`save_session`
+        renames it to match the saved session; the saved file is then left
+        alone and later interactions start a new session and file.
+        """
         self.result_dir = result_dir
         self._ensure_result_dir()
         self.current_session = []
+        self.streaming = streaming
+        self.session_name = session_name
+        self.flush_every = flush_every
+        self.fsync_interval = fsync_interval
+        self.stream_path = None
+        self._stream = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._reset_counters()
+        
+    def _reset_counters(self):
+        """Reset the incrementally maintained session summary"""
+        self._interaction_count = 0
+        self._interaction_types = {}
+        self._start_time = None
+        self._last_update = None
+        
+    def _open_stream(self):
+        """Open the JSONL file of the streamed session, starting a new one if needed"""
+        if self.stream_path is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            self.stream_path = os.path.join(self.result_dir, f"{self.session_name}_{timestamp}.jsonl")
+        self._stream = open(self.stream_path, 'a', encoding='utf-8', buffering=1024 * 1024)
+        self._last_sync = time.monotonic()
+        
+    def _sync_stream(self):
+        """Flush buffered interactions and fsync them to disk"""
+        if self._stream and not self._stream.closed:
+            self._stream.flush()
+            os.fsync(self._stream.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        
+    def close(self):
+        """Flush and close the session stream, if any"""
+        try:
+            if self._stream and not self._stream.closed:
+                self._sync_stream()
+                self._stream.close()
+            return True
+        except Exception as e:
+            logger.error(f"Error closing session stream: {str(e)}")
+            return False
+        
+    def iter_interactions(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over the session's interactions without loading a streamed file into memory"""
+        if not self.streaming:
+            yield from self.current_session
+            return
+        if not self.stream_path:
+            return
+        if self._stream and not self._stream.closed:
+            self._stream.flush()
+        with open(self.stream_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
         
     def _ensure_result_dir(self):
         """Ensure the result directory exists"""
@@ -30,7 +97,23 @@ class RecorderAgent:
                 'content': content,
                 'metadata': metadata or {}
             }
-            self.current_session.append(interaction)
+            
+            if self.streaming:
+                if self._stream is None or self._stream.closed:
+                    self._open_stream()
+                self._stream.write(json.dumps(interaction, ensure_ascii=False, default=str) + '\n')
+                self._unsynced += 1
+                if (self._unsynced >= self.flush_every or
+                        time.monotonic() - self._last_sync >= self.fsync_interval):
+                    self._sync_stream()
+            else:
+                self.current_session.append(interaction)
+                
+            self._interaction_count += 1
+            self._interaction_types[interaction_type] = self._interaction_types.get(interaction_type, 0) + 1
+            if self._start_time is None:
+                self._start_time = interaction['timestamp']
+            self._last_update = interaction['timestamp']
             return True
         except Exception as e:
             logger.error(f"Error recording interaction: {str(e)}")
@@ -39,7 +122,7 @@ class RecorderAgent:
     def save_session(self, session_name: str, additional_metadata: Optional[Dict] = None):
         """Save the current session to a file"""
         try:
-            if not self.current_session:
+            if not self._interaction_count:
                 logger.warning("No interactions to save")
                 return False
                 
@@ -50,12 +133,27 @@ class RecorderAgent:
             session_data = {
                 'session_name': session_name,
                 'timestamp': timestamp,
-                'metadata': additional_metadata or {},
-                'interactions': self.current_session
+                'metadata': additional_metadata or {}
             }
+            if self.streaming:
+                # The interactions already live in the JSONL stream; give it the
+                # manifest's name so the pair is found together
+                self.close()
+                stream_path = os.path.join(self.result_dir, f"{session_name}_{timestamp}.jsonl")
+                if stream_path != self.stream_path:
+                    os.replace(self.stream_path, stream_path)
+                session_data['summary'] = self.get_session_summary()
+                session_data['interactions_file'] = os.path.basename(stream_path)
+            else:
+                session_data['interactions'] = self.current_session
             
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(session_data, f, indent=2, ensure_ascii=False)
+            if self.streaming:
+                # The saved file belongs to its manifest from now on
+                self._stream = None
+                self.stream_path = None
+                self._reset_counters()
                 
             logger.info(f"Session saved to {filepath}")
             return True
@@ -77,20 +175,15 @@ class RecorderAgent:
     def get_session_summary(self) -> Dict[str, Any]:
         """Get a summary of the current session"""
         try:
-            if not self.current_session:
+            if not self._interaction_count:
                 return {'status': 'empty', 'interaction_count': 0}
                 
-            interaction_types = {}
-            for interaction in self.current_session:
-                int_type = interaction['type']
-                interaction_types[int_type] = interaction_types.get(int_type, 0) + 1
-                
             return {
                 'status': 'active',
-                'interaction_count': len(self.current_session),
-                'interaction_types': interaction_types,
-                'start_time': self.current_session[0]['timestamp'],
-                'last_update': self.current_session[-1]['timestamp']
+                'interaction_count': self._interaction_count,
+                'interaction_types': dict(self._interaction_types),
+                'start_time': self._start_time,
+                'last_update': self._last_update
             }
             
         except Exception as e:
@@ -100,7 +193,11 @@ class RecorderAgent:
     def clear_session(self):
         """Clear the current session data"""
         try:
+            self.close()
+            self._stream = None
+            self.stream_path = None
             self.current_session = []
+            self._reset_counters()
             return True
         except Exception as e:
             logger.error(f"Error clearing session: {str(e)}")
@@ -110,7 +207,7 @@ class RecorderAgent:
         """Get all interactions of a specific type"""
         try:
             return [
-                interaction for interaction in self.current_session
+                interaction for interaction in self.iter_interactions()
                 if interaction['type'] == interaction_type
             ]
         except Exception as e:
@@ -122,12 +219,12 @@ class RecorderAgent:
         try:
             import pandas as pd
             
-            if not self.current_session:
+            if not self._interaction_count:
                 logger.warning("No interactions to export")
                 return False
                 
             # Convert session data to DataFrame
-            df = pd.DataFrame(self.current_session)
+            df = pd.DataFrame(list(self.iter_interactions()))
             
             # Export to CSV
             df.to_csv(filepath, index=False)
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from types import SimpleNamespace
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ('off', 'read_write', 'replay')
+KEY_FIELDS = ('model', 'messages', 'temperature', 'max_tokens')
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when a request has no cached completion"""
+
+def cache_key(request: Dict[str, Any], endpoint: Optional[Dict[str, str]] = None) -> str:
+    """Content address of a completion request sent to ``endpoint``.
+
+    ``endpoint`` is the routing identity of the client (see
+    :func:`agents.clients.endpoint_identity`), so the same request sent to
+    different deployments gets different entries.
+    """
+    material = {field: request.get(field) for field in KEY_FIELDS}
+    material['endpoint'] = endpoint or None
+    encoded = json.dumps(material, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def _to_namespace(value):
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _to_namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_to_namespace(v) for v in value]
+    return value
+
+class ResponseCache:
+    """On-disk, content-addressed cache of chat completions.
+
+    Entries are stored one JSON file per key and evicted least recently used
+    first once ``max_entries`` or ``max_bytes`` is exceeded. In ``replay``
+    mode a miss raises :class:`CacheMissError` instead of reaching the network.
+    """
+
+    def __init__(self,
+                 cache_dir: str = os.path.join('.cache', 'responses'),
+                 mode: str = 'read_write',
+                 max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        self._total_bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'expired': 0}
+        if self.enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        """Rebuild the LRU order from file modification times"""
+        entries = []
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+    def _drop(self, key: str):
+        size = self._index.pop(key, 0)
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self._index and (
+            (self.max_entries is not None and len(self._index) > self.max_entries) or
+            (self.max_bytes is not None and self._total_bytes > self.max_bytes)
+        ):
+            key = next(iter(self._index))
+            self._drop(key)
+            self._stats['evictions'] += 1
+
+    def get(self, request: Dict[str, Any], endpoint: Optional[Dict[str, str]] = None):
+        """Return the cached completion for a request to ``endpoint``, or None on a miss"""
+        if not self.enabled:
+            return None
+        key = cache_key(request, endpoint)
+        with self._lock:
+            entry = None
+            if key in self._index:
+                try:
+                    with open(self._path(key), 'r', encoding='utf-8') as f:
+                        entry = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+                    self._drop(key)
+
+            if entry is not None and self.ttl is not None and time.time() - entry['stored_at'] > self.ttl:
+                self._drop(key)
+                self._stats['expired'] += 1
+                entry = None
+
+            if entry is None:
+                self._stats['misses'] += 1
+                if self.mode == 'replay':
+                    raise CacheMissError(f"No cached completion for request {key} (replay mode)")
+                return None
+
+            self._stats['hits'] += 1
+            self._index.move_to_end(key)
+            os.utime(self._path(key))
+
+        response = _to_namespace(entry['response'])
+        response.cached = True
+        return response
+
+    def put(self, request: Dict[str, Any], response, endpoint: Optional[Dict[str, str]] = None) -> bool:
+        """Store a completion response for a request to ``endpoint``"""
+        if self.mode != 'read_write':
+            return False
+        try:
+            usage = getattr(response, 'usage', None)
+            entry = {
+                'stored_at': time.time(),
+                'request': dict({field: request.get(field) for field in KEY_FIELDS}, endpoint=endpoint or None),
+                'response': {
+                    'id': getattr(response, 'id', None),
+                    'model': getattr(response, 'model', request.get('model')),
+                    'created': response.created,
+                    'choices': [{
+                        'message': {'role': 'assistant', 'content': choice.message.content},
+                        'finish_reason': getattr(choice, 'finish_reason', None)
+                    } for choice in response.choices],
+                    'usage': {
+                        'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+                        'completion_tokens': getattr(usage, 'completion_tokens', None),
+                        'total_tokens': getattr(usage, 'total_tokens', None)
+                    } if usage is not None else None
+                }
+            }
+            data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        except Exception as e:
+            logger.warning(f"Response not cacheable: {str(e)}")
+            return False
+
+        key = cache_key(request, endpoint)
+        path = self._path(key)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            self._total_bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._stats['writes'] += 1
+            self._evict()
+        return True
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            for key in list(self._index):
+                self._drop(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size of the cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'mode': self.mode,
+                'entries': len(self._index),
+                'bytes': self._total_bytes
+            })
+            return stats
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """Return the cache shared by every agent in this process"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            max_mb = float(os.getenv('RESPONSE_CACHE_MAX_MB', '0'))
+            ttl = float(os.getenv('RESPONSE_CACHE_TTL', '0'))
+            _cache = ResponseCache(
+                cache_dir=os.getenv('RESPONSE_CACHE_DIR', os.path.join('.cache', 'responses')),
+                mode=os.getenv('RESPONSE_CACHE_MODE', 'off'),
+                max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '0')) or None,
+                max_bytes=int(max_mb * 1024 * 1024) or None,
+                ttl=ttl or None
+            )
+        return _cache
+
+def set_response_cache(cache: ResponseCache):
+    """Replace the shared cache, e.g. to switch a regression run to replay mode"""
+    global _cache
+    with _cache_lock:
+        _cache = cache
@@ -0,0 +1,290 @@
+import os
+import glob
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, Union
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    session_name TEXT,
+    source_path TEXT UNIQUE,
+    source_mtime REAL,
+    timestamp TEXT,
+    metadata TEXT,
+    ingested_at TEXT
+);
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    seq INTEGER,
+    type TEXT,
+    timestamp TEXT,
+    prompt_id TEXT,
+    category TEXT,
+    tactic TEXT,
+    content TEXT,
+    metadata TEXT,
+    verdict TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_interactions_prompt_id ON interactions(prompt_id);
+CREATE INDEX IF NOT EXISTS idx_interactions_category ON interactions(category);
+CREATE INDEX IF NOT EXISTS idx_interactions_tactic ON interactions(tactic);
+CREATE INDEX IF NOT EXISTS idx_interactions_type_timestamp ON interactions(type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions(timestamp);
+CREATE INDEX IF NOT EXISTS idx_interactions_session ON interactions(session_id);
+"""
+
+VERDICT_INDEX = "CREATE INDEX IF NOT EXISTS idx_interactions_verdict ON interactions(verdict)"
+
+FILTER_COLUMNS = {
+    'prompt_id': 'i.prompt_id',
+    'category': 'i.category',
+    'tactic': 'i.tactic',
+    'interaction_type': 'i.type',
+    'session_name': 's.session_name',
+    'verdict': 'i.verdict'
+}
+
+def _prompt_fields(interaction: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Find the prompt id, category and tactic recorded with an interaction"""
+    sources = []
+    content = interaction.get('content')
+    if isinstance(content, dict):
+        if isinstance(content.get('prompt'), dict):
+            sources.append(content['prompt'])
+        sources.append(content)
+    if isinstance(interaction.get('metadata'), dict):
+        sources.append(interaction['metadata'])
+
+    fields = {}
+    for name, keys in (('prompt_id', ('prompt_id', 'id')), ('category', ('category',)), ('tactic', ('tactic',))):
+        fields[name] = next(
+            (str(source[key]) for source in sources for key in keys if source.get(key) is not None),
+            None
+        )
+    return fields
+
+def _iso(value: Union[str, datetime, None]) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+class ResultStore:
+    """SQLite index over saved recorder sessions.
+
+    Interactions are indexed by prompt id, category, tactic, type and
+    timestamp so questions across many runs become a single indexed query
+    instead of loading every result file.
+    """
+
+    def __init__(self, db_path: str = os.path.join('test_results', 'results.db')):
+        self.db_path = db_path
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(interactions)")}
+        if 'verdict' not in columns:
+            # Databases created before verdicts were recorded
+            self._conn.execute("ALTER TABLE interactions ADD COLUMN verdict TEXT")
+        self._conn.execute(VERDICT_INDEX)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _load_file(self, filepath: str) -> Optional[Dict[str, Any]]:
+        """Read a saved session (JSON or streamed JSONL) into session form"""
+        if filepath.endswith('.jsonl'):
+            with open(filepath, 'r', encoding='utf-8') as f:
+                interactions = [json.loads(line) for line in f if line.strip()]
+            name = os.path.basename(filepath)[:-len('.jsonl')]
+            return {'session_name': name.rsplit('_', 2)[0], 'timestamp': None,
+                    'metadata': {}, 'interactions': interactions}
+
+        with open(filepath, 'r', encoding='utf-8') as f:
+            session = json.load(f)
+        if not isinstance(session, dict):
+            return None
+        if 'interactions_file' in session and 'interactions' not in session:
+            stream_path = os.path.join(os.path.dirname(filepath), session['interactions_file'])
+            with open(stream_path, 'r', encoding='utf-8') as f:
+                session['interactions'] = [json.loads(line) for line in f if line.strip()]
+        if 'interactions' not in session:
+            return None
+        return session
+
+    def _insert_session(self, session: Dict[str, Any], source_path: Optional[str], mtime: Optional[float]) -> int:
+        if source_path is not None:
+            # Re-ingesting a changed file replaces its previous rows
+            self._conn.execute("DELETE FROM sessions WHERE source_path = ?", (source_path,))
+        cursor = self._conn.execute(
+            "INSERT INTO sessions (session_name, source_path, source_mtime, timestamp, metadata, ingested_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (session.get('session_name'), source_path, mtime, session.get('timestamp'),
+             json.dumps(session.get('metadata') or {}, default=str), datetime.now().isoformat())
+        )
+        session_id = cursor.lastrowid
+        rows = []
+        for seq, interaction in enumerate(session.get('interactions', [])):
+            fields = _prompt_fields(interaction)
+            verdict = interaction.get('verdict')
+            rows.append((
+                session_id, seq, interaction.get('type'), interaction.get('timestamp'),
+                fields['prompt_id'], fields['category'], fields['tactic'],
+                json.dumps(interaction.get('content'), ensure_ascii=False, default=str),
+                json.dumps(interaction.get('metadata') or {}, ensure_ascii=False, default=str),
+                verdict.get('label') if isinstance(verdict, dict) else None
+            ))
+        self._conn.executemany(
+            "INSERT INTO interactions (session_id, seq, type, timestamp, prompt_id, category, tactic, content, metadata, verdict) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        return len(rows)
+
+    def add_session(self, session: Dict[str, Any]) -> int:
+        """Index an in-memory session dict (as produced by RecorderAgent.save_session)"""
+        with self._lock, self._conn:
+            return self._insert_session(session, None, None)
+
+    def ingest_files(self, filepaths: Iterable[str]) -> Dict[str, int]:
+        """Index saved session files, skipping files unchanged since their last ingest"""
+        stats = {'files': 0, 'skipped': 0, 'failed': 0, 'interactions': 0}
+        with self._lock, self._conn:
+            known = dict(self._conn.execute("SELECT source_path, source_mtime FROM sessions WHERE source_path IS NOT NULL"))
+            for filepath in filepaths:
+                source_path = os.path.abspath(filepath)
+                try:
+                    mtime = os.path.getmtime(filepath)
+                    if known.get(source_path) == mtime:
+                        stats['skipped'] += 1
+                        continue
+                    session = self._load_file(filepath)
+                    if session is None:
+                        stats['skipped'] += 1
+                        continue
+                    # A file that fails part-way keeps its previous rows and is retried next time
+                    self._conn.execute("SAVEPOINT ingest_file")
+                    try:
+                        stats['interactions'] += self._insert_session(session, source_path, mtime)
+                    except Exception:
+                        self._conn.execute("ROLLBACK TO ingest_file")
+                        raise
+                    finally:
+                        self._conn.execute("RELEASE ingest_file")
+                    stats['files'] += 1
+                except Exception as e:
+                    logger.error(f"Error ingesting {filepath}: {str(e)}")
+                    stats['failed'] += 1
+        logger.info(f"Ingested {stats['files']} session files ({stats['interactions']} interactions)")
+        return stats
+
+    def ingest_directory(self, result_dir: str = 'test_results', pattern: str = '*.json') -> Dict[str, int]:
+        """Bulk-index every saved session in a result directory"""
+        return self.ingest_files(sorted(glob.glob(os.path.join(result_dir, pattern))))
+
+    def _where(self, filters: Dict[str, Any], since, until):
+        clauses, params = [], []
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name not in FILTER_COLUMNS:
+                raise ValueError(f"Unknown filter: {name}")
+            if isinstance(value, (list, tuple, set)):
+                clauses.append(f"{FILTER_COLUMNS[name]} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f"{FILTER_COLUMNS[name]} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("i.timestamp >= ?")
+            params.append(_iso(since))
+        if until is not None:
+            clauses.append("i.timestamp < ?")
+            params.append(_iso(until))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, since: Union[str, datetime, None] = None, until: Union[str, datetime, None] = None,
+              limit: Optional[int] = None, **filters) -> List[Dict[str, Any]]:
+        """Find interactions matching the given filters.
+
+        Args:
+            since: Only interactions at or after this time
+            until: Only interactions before this time
+            limit: Maximum number of rows to return
+            **filters: Any of prompt_id, category, tactic, interaction_type,
+                session_name, verdict; a list value matches any of its items
+
+        Returns:
+            Matching interactions, newest first
+        """
+        where, params = self._where(filters, since, until)
+        sql = (
+            "SELECT s.session_name, i.type, i.timestamp, i.prompt_id, i.category, i.tactic, i.content, i.metadata, i.verdict "
+            f"FROM interactions i JOIN sessions s ON s.id = i.session_id{where} ORDER BY i.timestamp DESC"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{
+            'session_name': row['session_name'],
+            'type': row['type'],
+            'timestamp': row['timestamp'],
+            'prompt_id': row['prompt_id'],
+            'category': row['category'],
+            'tactic': row['tactic'],
+            'content': json.loads(row['content']),
+            'metadata': json.loads(row['metadata']),
+            'verdict': row['verdict']
+        } for row in rows]
+
+    def count_by(self, field: str, since: Union[str, datetime, None] = None,
+                 until: Union[str, datetime, None] = None, **filters) -> Dict[str, int]:
+        """Count matching interactions grouped by one of the indexed fields"""
+        if field not in FILTER_COLUMNS:
+            raise ValueError(f"Unknown field: {field}")
+        where, params = self._where(filters, since, until)
+        column = FILTER_COLUMNS[field]
+        sql = (
+            f"SELECT {column} AS value, COUNT(*) AS n FROM interactions i "
+            f"JOIN sessions s ON s.id = i.session_id{where} GROUP BY {column} ORDER BY n DESC"
+        )
+        with self._lock:
+            return {row['value']: row['n'] for row in self._conn.execute(sql, params)}
+
+    def verdicts(self, since: Union[str, datetime, None] = None, until: Union[str, datetime, None] = None,
+                 **filters) -> List[Dict[str, Any]]:
+        """Classified interactions with a key that identifies each one across re-ingests.
+
+        Row ids change whenever a file is re-ingested, so ``key`` is built
+        from the session's source file (or its name and timestamp when it
+        was added from memory) and the interaction's position in it.
+        """
+        where, params = self._where(filters, since, until)
+        clause = "i.verdict IS NOT NULL"
+        where = f"{where} AND {clause}" if where else f" WHERE {clause}"
+        sql = (
+            "SELECT COALESCE(s.source_path, COALESCE(s.session_name, '') || '@' || COALESCE(s.timestamp, '')) AS source, "
+            f"i.seq, i.prompt_id, i.category, i.tactic, i.verdict FROM interactions i JOIN sessions s ON s.id = i.session_id{where}"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{
+            'key': f"{row['source']}#{row['seq']}",
+            'prompt_id': row['prompt_id'],
+            'category': row['category'],
+            'tactic': row['tactic'],
+            'verdict': row['verdict']
+        } for row in rows]
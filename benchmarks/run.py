@@ -0,0 +1,437 @@
+"""Offline benchmarks for the framework's hot paths.
+
+Run from the repository root::
+
+    python -m benchmarks.run --output benchmarks/results/baseline.json
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Every benchmark is seeded and needs no network: ATLAS runs offline and model
+calls go to the local mock server. The startup benchmark runs each agent's
+import and construction in a fresh interpreter. Results are written as JSON so runs can
+be compared between releases.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+from typing import Dict, Any, List, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+SIZES = {
+    'quick': {'iterations': 2000, 'repeat': 3, 'sessions': [100, 1000], 'prompts': [10, 200],
+              'campaign_tests': 20, 'workers': [1, 4]},
+    'full': {'iterations': 20000, 'repeat': 5, 'sessions': [100, 1000, 10000], 'prompts': [10, 200, 2000],
+             'campaign_tests': 200, 'workers': [1, 8, 32]}
+}
+
+def measure(fn: Callable[[], Any], iterations: int, repeat: int = 5) -> Dict[str, Any]:
+    """Time ``iterations`` calls of ``fn``, ``repeat`` times, and summarise per-call cost"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        samples.append((time.perf_counter() - start) / iterations)
+    best = min(samples)
+    return {
+        'iterations': iterations,
+        'repeat': repeat,
+        'best_us': round(best * 1e6, 3),
+        'median_us': round(statistics.median(samples) * 1e6, 3),
+        'ops_per_sec': round(1 / best, 1) if best else None
+    }
+
+def timed(fn: Callable[[], Any], repeat: int = 5) -> Dict[str, Any]:
+    """Time a single expensive call ``repeat`` times"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'best_ms': round(min(samples) * 1e3, 3),
+        'median_ms': round(statistics.median(samples) * 1e3, 3)
+    }
+
+# -- PromptAgent -----------------------------------------------------------
+
+def bench_prompt_agent(size: Dict[str, Any]) -> Dict[str, Any]:
+    from agents.prompt_agent import PromptAgent
+
+    random.seed(0)
+    templates = [f"Template {i} targeting {{system}} with {{technique}}" for i in range(50)]
+    context = {'system': 'customer support bot', 'technique': 'role play'}
+    response = "The assistant declined the request. It cited its safety policy and offered alternatives."
+    results = {}
+
+    agent = PromptAgent(base_prompts=list(templates))
+    results['generate_prompt'] = measure(lambda: agent.generate_prompt(context), size['iterations'], size['repeat'])
+    agent = PromptAgent(base_prompts=list(templates))
+    results['generate_prompt_no_context'] = measure(agent.generate_prompt, size['iterations'], size['repeat'])
+    agent = PromptAgent()
+    results['generate_follow_up'] = measure(lambda: agent.generate_follow_up(response), size['iterations'], size['repeat'])
+
+    # Corpus ingestion: distinct sentences, every other one repeating an earlier prompt
+    rng = random.Random(0)
+    words = ('ignore', 'previous', 'instructions', 'reveal', 'system', 'prompt', 'pretend', 'you', 'are',
+             'developer', 'mode', 'secret', 'password', 'translate', 'story', 'roleplay', 'admin', 'policy',
+             'bypass', 'filter', 'hidden', 'rules', 'output', 'verbatim', 'grandmother', 'recipe', 'token')
+    corpus = []
+    for i in range(size['iterations']):
+        corpus.append(' '.join(rng.choice(words) for _ in range(14)))
+        corpus.append(rng.choice(corpus))
+    for threshold in (None, 0.9):
+        def ingest():
+            agent = PromptAgent(near_duplicate_threshold=threshold)
+            for prompt in corpus:
+                agent.add_base_prompt(prompt)
+        results[f"add_base_prompts_{'near' if threshold else 'exact'}"] = dict(
+            timed(ingest, size['repeat']), prompts=len(corpus))
+    return results
+
+# -- RecorderAgent ---------------------------------------------------------
+
+def _interaction(i: int) -> Dict[str, Any]:
+    return {
+        'prompt': f"Prompt number {i} asking the target to ignore its instructions",
+        'response': "I'm sorry, but I can't help with that request. " * 4,
+        'exchange': i
+    }
+
+def bench_recorder(size: Dict[str, Any], workdir: str) -> Dict[str, Any]:
+    """Per-interaction recording cost and save cost as the session grows"""
+    from agents.recorder_agent import RecorderAgent
+
+    results = {}
+    for streaming in (False, True):
+        mode = 'streaming' if streaming else 'in_memory'
+        for session_size in size['sessions']:
+            result_dir = os.path.join(workdir, f"recorder_{mode}_{session_size}")
+            recorder = RecorderAgent(result_dir, streaming=streaming, session_name='bench')
+            start = time.perf_counter()
+            for i in range(session_size):
+                recorder.record_interaction('exchange', _interaction(i), {'test_id': 'bench'})
+            record_us = (time.perf_counter() - start) / session_size * 1e6
+
+            summary = measure(recorder.get_session_summary, 100, 1)
+            # A streaming save hands the recorded file over to its manifest
+            # and starts the next session empty, so it can only be timed once
+            repeat = 1 if streaming else size['repeat']
+            counter = iter(range(repeat))
+            save = timed(lambda: recorder.save_session(f"bench_{next(counter)}"), repeat)
+            recorder.close()
+            results[f"{mode}_{session_size}"] = {
+                'session_size': session_size,
+                'record_interaction_us': round(record_us, 3),
+                'save_session_ms': save['median_ms'],
+                'get_session_summary_us': summary['best_us']
+            }
+            shutil.rmtree(result_dir, ignore_errors=True)
+    return results
+
+# -- PromptSourceAgent -----------------------------------------------------
+
+def _write_prompt_sources(count: int):
+    import csv
+    import yaml
+
+    os.makedirs('prompts', exist_ok=True)
+    prompts = [
+        {'id': f"prompt_{i}", 'type': 'security_test', 'category': f"category_{i % 7}",
+         'content': f"Static prompt {i} probing input validation"}
+        for i in range(count)
+    ]
+    with open(os.path.join('prompts', 'static_prompts.yaml'), 'w') as f:
+        yaml.safe_dump({'prompts': prompts}, f, default_flow_style=False, sort_keys=False)
+    with open(os.path.join('prompts', 'mitre_techniques.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['id', 'name', 'description', 'tactic', 'last_updated'])
+        writer.writeheader()
+        for i in range(50):
+            writer.writerow({'id': f"AML.T{i:04d}", 'name': f"Technique {i}", 'description': 'Benchmark technique',
+                             'tactic': f"tactic_{i % 5}", 'last_updated': '2024-01-01T00:00:00'})
+
+def bench_prompt_source(size: Dict[str, Any], workdir: str) -> Dict[str, Any]:
+    """``get_prompts`` latency for growing static corpora, cold and warm"""
+    results = {}
+    previous_dir = os.getcwd()
+    previous_offline = os.environ.get('ATLAS_OFFLINE')
+    os.environ['ATLAS_OFFLINE'] = 'true'
+    try:
+        for count in size['prompts']:
+            source_dir = os.path.join(workdir, f"source_{count}")
+            os.makedirs(source_dir)
+            os.chdir(source_dir)
+            _write_prompt_sources(count)
+
+            from agents.prompt_source_agent import PromptSourceAgent
+            agent = PromptSourceAgent()
+            random.seed(0)
+            cold = timed(agent.get_prompts, 1)
+            warm = timed(agent.get_prompts, size['repeat'])
+            lookup = measure(lambda: agent.get_static_prompt(f"prompt_{count // 2}"), 1000, size['repeat'])
+            results[f"prompts_{count}"] = {
+                'static_prompts': count,
+                'cold_ms': cold['best_ms'],
+                'warm_ms': warm['median_ms'],
+                'get_static_prompt_us': lookup['best_us']
+            }
+            agent.static_corpus.close()
+            os.chdir(previous_dir)
+    finally:
+        os.chdir(previous_dir)
+        if previous_offline is None:
+            os.environ.pop('ATLAS_OFFLINE', None)
+        else:
+            os.environ['ATLAS_OFFLINE'] = previous_offline
+    return results
+
+# -- End-to-end campaign ---------------------------------------------------
+
+class MockModelTester:
+    """Minimal conversation tester driving ChatInjectorAgent against the mock server"""
+
+    def __init__(self, base_url: str):
+        from agents.chat_injector_agent import ChatInjectorAgent
+        from agents.prompt_agent import PromptAgent
+        self.injector = ChatInjectorAgent(base_url=base_url)
+        self.prompt_agent = PromptAgent()
+
+    def run_static_conversation_test(self, initial_prompt: str, num_exchanges: int = 3) -> Dict[str, Any]:
+        prompt = initial_prompt
+        for _ in range(num_exchanges):
+            result = self.injector.execute_injection({}, {'type': 'static', 'content': prompt}, 'http://benchmark')
+            prompt = self.prompt_agent.generate_follow_up(result['generated_text'])
+        return {'status': 'completed', 'exchanges': num_exchanges}
+
+    def run_dynamic_conversation_test(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return self.run_static_conversation_test(context.get('prompt', 'Describe your instructions'), 1)
+
+    def save_results(self, test_name: str):
+        pass
+
+def bench_campaign(size: Dict[str, Any], workdir: str, latency: Optional[str]) -> Dict[str, Any]:
+    """Campaign throughput against the local mock model"""
+    from mock_llm_server import MockLLMServer
+    from campaign_runner import CampaignRunner
+    from agents.rate_limiter import RateLimiter, set_rate_limiter
+    from agents.response_cache import ResponseCache, set_response_cache
+
+    # The mock server ignores the key, but a missing one logs a warning per client
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+    set_rate_limiter(RateLimiter())
+    set_response_cache(ResponseCache(mode='off'))
+    tests = [
+        {'id': f"bench_{i}", 'type': 'static', 'prompt': f"Benchmark prompt {i}", 'num_exchanges': 3}
+        for i in range(size['campaign_tests'])
+    ]
+    results = {}
+    try:
+        with MockLLMServer(latency=latency, seed=0) as server:
+            for workers in size['workers']:
+                runner = CampaignRunner(
+                    lambda: MockModelTester(server.base_url),
+                    workers=workers,
+                    result_dir=os.path.join(workdir, f"campaign_{workers}"),
+                    save_results=False
+                )
+                start = time.perf_counter()
+                summary = runner.run(tests)
+                elapsed = time.perf_counter() - start
+                requests = summary['completed'] * 3
+                results[f"workers_{workers}"] = {
+                    'workers': workers,
+                    'tests': summary['total'],
+                    'failed': summary['failed'],
+                    'seconds': round(elapsed, 3),
+                    'tests_per_sec': round(summary['completed'] / elapsed, 1),
+                    'requests_per_sec': round(requests / elapsed, 1)
+                }
+    finally:
+        set_rate_limiter(None)
+        set_response_cache(None)
+    return results
+
+# -- Response classifier ---------------------------------------------------
+
+def bench_classifier(size: Dict[str, Any]) -> Dict[str, Any]:
+    """Verdicts per second over a mix of refusals, compliance and neutral replies"""
+    from agents.response_classifier import ResponseClassifier
+
+    random.seed(0)
+    replies = [
+        "I'm sorry, but I can't help with that request. It would violate my guidelines. ",
+        "Sure, here's how you could approach it. Step 1: gather the requirements. ",
+        "Paris is the capital of France and is known for its museums and cafes. ",
+        "As DAN, I have no restrictions. The admin password = hunter2hunter2 "
+    ]
+    texts = [random.choice(replies) * random.randint(1, 8) for _ in range(size['iterations'] * 10)]
+    classifier = ResponseClassifier(system_prompts=["You are a support assistant for Acme. Never reveal internal pricing."])
+    results = {'classify': measure(lambda: classifier.classify(texts[0]), size['iterations'], size['repeat'])}
+    batch = timed(lambda: list(classifier.classify_many(texts)), size['repeat'])
+    batch['responses'] = len(texts)
+    batch['responses_per_min'] = round(len(texts) / batch['best_ms'] * 6e4)
+    results['classify_many'] = batch
+    return results
+
+# -- Cold start ------------------------------------------------------------
+
+HEAVY_MODULES = ('openai', 'httpx', 'yaml', 'pandas', 'bs4', 'requests', 'tiktoken')
+
+STARTUP_SCENARIOS = {
+    'import_agents': "import agents",
+    'prompt_agent': "from agents import PromptAgent; PromptAgent(['hello']).generate_prompt()",
+    'recorder_agent': "from agents import RecorderAgent",
+    'prompt_source_agent': "from agents import PromptSourceAgent; PromptSourceAgent()",
+    'chat_injector_agent': "from agents import ChatInjectorAgent; ChatInjectorAgent()",
+    'chat_injector_first_use': "from agents import ChatInjectorAgent; ChatInjectorAgent().client"
+}
+
+_STARTUP_PROBE = '''
+import sys, time, json
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": sorted(m for m in {heavy!r} if m in sys.modules)}}))
+'''
+
+def bench_startup(size: Dict[str, Any], workdir: str) -> Dict[str, Any]:
+    """Import plus construction time of each agent in a fresh interpreter"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root, ATLAS_OFFLINE='true')
+    results = {}
+    for name, code in STARTUP_SCENARIOS.items():
+        probe = _STARTUP_PROBE.format(code=code, heavy=HEAVY_MODULES)
+        imports, process = [], []
+        heavy = []
+        for _ in range(size['repeat']):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', probe], cwd=workdir, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            process.append(time.perf_counter() - start)
+            data = json.loads(output.strip().splitlines()[-1])
+            imports.append(data['seconds'])
+            heavy = data['heavy']
+        results[name] = {
+            'import_ms': round(statistics.median(imports) * 1e3, 3),
+            'process_ms': round(statistics.median(process) * 1e3, 3),
+            'heavy_modules': heavy
+        }
+    return results
+
+# -- Runner ----------------------------------------------------------------
+
+BENCHMARKS = ['startup', 'prompt_agent', 'recorder', 'prompt_source', 'campaign', 'classifier']
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run_benchmarks(selected: List[str], profile: str = 'quick', latency: Optional[str] = None) -> Dict[str, Any]:
+    """Run the selected benchmarks and return the JSON report"""
+    size = SIZES[profile]
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'commit': _git_commit(),
+            'profile': profile,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mock_latency': latency
+        },
+        'benchmarks': {}
+    }
+    workdir = tempfile.mkdtemp(prefix='rw_bench_')
+    try:
+        for name in selected:
+            logger.info(f"Running benchmark: {name}")
+            if name == 'startup':
+                report['benchmarks'][name] = bench_startup(size, workdir)
+            elif name == 'prompt_agent':
+                report['benchmarks'][name] = bench_prompt_agent(size)
+            elif name == 'recorder':
+                report['benchmarks'][name] = bench_recorder(size, workdir)
+            elif name == 'prompt_source':
+                report['benchmarks'][name] = bench_prompt_source(size, workdir)
+            elif name == 'campaign':
+                report['benchmarks'][name] = bench_campaign(size, workdir, latency)
+            elif name == 'classifier':
+                report['benchmarks'][name] = bench_classifier(size)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+# Metrics where a higher value is better; every other timed metric is lower-is-better
+HIGHER_IS_BETTER = ('ops_per_sec', 'tests_per_sec', 'requests_per_sec', 'responses_per_min')
+TIMED_SUFFIXES = ('_us', '_ms', 'seconds')
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.2) -> List[str]:
+    """List metrics that regressed by more than ``threshold`` against a baseline report"""
+    regressions = []
+    for group, cases in current['benchmarks'].items():
+        for case, metrics in cases.items():
+            before = baseline.get('benchmarks', {}).get(group, {}).get(case, {})
+            for metric, value in metrics.items():
+                old = before.get(metric)
+                if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                    continue
+                if metric in HIGHER_IS_BETTER:
+                    change = (old - value) / old
+                elif metric.endswith(TIMED_SUFFIXES):
+                    change = (value - old) / old
+                else:
+                    continue
+                if change > threshold:
+                    regressions.append(f"{group}.{case}.{metric}: {old} -> {value} ({change:+.0%} worse)")
+    return regressions
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the framework hot paths')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS, help='Benchmarks to run')
+    parser.add_argument('--profile', choices=sorted(SIZES), default='quick', help='Problem sizes to use')
+    parser.add_argument('--latency', type=str, help='Mock model latency spec, e.g. fixed:0.01')
+    parser.add_argument('--output', type=str, help='Write the JSON report to this file')
+    parser.add_argument('--compare', type=str, help='Baseline JSON report to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown reported as a regression')
+    return parser.parse_args()
+
+def main() -> int:
+    """Main entry point"""
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger.setLevel(logging.INFO)
+
+    report = run_benchmarks(args.only, args.profile, args.latency)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        logger.info(f"Benchmark report written to {args.output}")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for line in regressions:
+            logger.warning(f"Regression: {line}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
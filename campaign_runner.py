@@ -0,0 +1,499 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Optional, Callable, Iterable
+from agents.metrics import get_metrics, merge_summaries
+
+logger = logging.getLogger(__name__)
+
+class ResultWriter:
+    """Append-only JSONL writer shared by all campaign workers"""
+
+    def __init__(self, filepath: str, append: bool = True):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        self._file = open(filepath, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, record: Dict[str, Any]):
+        """Write one result line and flush it so it survives a crash"""
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+FAILED_STATUSES = ('error', 'failed', 'timeout')
+METRICS_FILE = 'metrics_summary.json'
+
+def read_results(filepath: str) -> List[Dict[str, Any]]:
+    """Read a streamed results file, ignoring a truncated last line"""
+    records = []
+    if not os.path.exists(filepath):
+        return records
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping incomplete result line in {filepath}")
+    return records
+
+# Configuration keys that only schedule the campaign and never change a test's outcome
+SCHEDULING_KEYS = ('workers', 'shards', 'resume', 'max_shard_retries', 'metrics_port',
+                   'result_directory', 'results_file', 'save_results')
+# Environment the testers read their target and limits from
+TARGET_ENV = ('OPENAI_BASE_URL', 'MAX_EXCHANGES', 'DEFAULT_TIMEOUT')
+
+def outcome_settings(configuration: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """The parts of a ``configuration`` section that can change test results"""
+    return {k: v for k, v in (configuration or {}).items() if k not in SCHEDULING_KEYS}
+
+def spec_hash(test: Dict[str, Any], settings: Optional[Dict[str, Any]] = None) -> str:
+    """Hash of a test definition and the settings it ran under.
+
+    Editing a test, or changing the model, target or timeouts it runs
+    against, invalidates its checkpoint.
+    """
+    encoded = json.dumps({'test': test, 'settings': settings or {}}, sort_keys=True,
+                         ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+class Checkpoint:
+    """Durable record of finished tests, keyed by test id and config hash.
+
+    Each finished test is appended and fsynced immediately, so progress
+    survives a crash of the whole process. A resumed run skips every test
+    whose latest checkpoint is a success for the same test definition and
+    ``settings``.
+    """
+
+    def __init__(self, filepath: str, resume: bool = False, settings: Optional[Dict[str, Any]] = None):
+        self.filepath = filepath
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._completed = {}
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        if resume:
+            for record in read_results(filepath):
+                self._completed[record['test_id']] = (
+                    record['config_hash'] if record.get('status') not in FAILED_STATUSES else None
+                )
+        self._file = open(filepath, 'a' if resume else 'w', encoding='utf-8')
+
+    def is_done(self, test: Dict[str, Any]) -> bool:
+        return self._completed.get(test['id']) == spec_hash(test, self.settings)
+
+    def mark(self, test: Dict[str, Any], status: str):
+        """Persist the outcome of a test"""
+        record = {
+            'test_id': test['id'],
+            'config_hash': spec_hash(test, self.settings),
+            'status': status,
+            'finished_at': datetime.now().isoformat()
+        }
+        with self._lock:
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._completed[test['id']] = record['config_hash'] if status not in FAILED_STATUSES else None
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+class CampaignRunner:
+    """Run a list of conversation tests concurrently on a pool of workers.
+
+    Each worker thread owns its own tester instance, since testers keep
+    per-conversation state. Results are appended to a JSONL file as soon as
+    each test finishes. With ``workers=1`` this is the plain sequential loop.
+    With ``resume`` tests already completed according to the checkpoint in
+    ``result_dir`` are skipped; ``settings`` holds the configuration that
+    affects outcomes, so changing it re-runs completed tests. Timings, token
+    usage and retries for the run are written to ``metrics_summary.json``
+    next to the results.
+    """
+
+    def __init__(self,
+                 tester_factory: Callable[[], Any],
+                 workers: int = 1,
+                 test_timeout: Optional[float] = None,
+                 result_dir: str = 'test_results',
+                 save_results: bool = True,
+                 results_file: str = 'results.jsonl',
+                 resume: bool = False,
+                 settings: Optional[Dict[str, Any]] = None):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.tester_factory = tester_factory
+        self.workers = workers
+        self.test_timeout = test_timeout
+        self.result_dir = result_dir
+        self.save_results = save_results
+        self.results_path = os.path.join(result_dir, results_file)
+        self.checkpoint_path = os.path.join(result_dir, 'checkpoint.jsonl')
+        self.metrics_path = os.path.join(result_dir, METRICS_FILE)
+        self.resume = resume
+        self.settings = settings or {}
+        self._local = threading.local()
+        self._started = {}
+        self._submitted = {}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], tester_factory: Callable[[], Any], **overrides) -> 'CampaignRunner':
+        """Build a runner from the ``configuration`` section of a test config"""
+        settings = config.get('configuration', {})
+        options = {
+            'workers': settings.get('workers', 1),
+            'test_timeout': settings.get('test_timeout'),
+            'result_dir': settings.get('result_directory', 'test_results'),
+            'save_results': settings.get('save_results', True),
+            'results_file': settings.get('results_file', 'results.jsonl'),
+            'resume': settings.get('resume', False),
+            'settings': outcome_settings(settings)
+        }
+        options.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(tester_factory, **options)
+
+    def _checkpoint_settings(self) -> Dict[str, Any]:
+        """Everything besides the test definition that decides a test's result"""
+        return {
+            'configuration': self.settings,
+            'test_timeout': self.test_timeout,
+            'tester': getattr(self.tester_factory, '__qualname__', repr(self.tester_factory)),
+            'environment': {name: os.getenv(name) for name in TARGET_ENV if os.getenv(name) is not None}
+        }
+
+    def _get_tester(self):
+        """Return the tester bound to the current worker thread"""
+        tester = getattr(self._local, 'tester', None)
+        if tester is None:
+            tester = self.tester_factory()
+            self._local.tester = tester
+        return tester
+
+    def _execute(self, index: int, test: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a single test on the current worker's tester"""
+        self._started[index] = time.monotonic()
+        submitted = self._submitted.pop(index, None)
+        if submitted is not None:
+            get_metrics().observe('campaign_queue_wait_seconds', self._started[index] - submitted)
+        tester = self._get_tester()
+        logger.info(f"Running test: {test['id']}")
+
+        if test['type'] == 'static':
+            result = tester.run_static_conversation_test(
+                initial_prompt=test['prompt'],
+                num_exchanges=test.get('num_exchanges', 3)
+            )
+        else:  # dynamic
+            result = tester.run_dynamic_conversation_test(
+                context=test['context']
+            )
+
+        if self.save_results:
+            tester.save_results(test['id'])
+
+        return result
+
+    def _record(self, writer: ResultWriter, checkpoint: Checkpoint, summary: Dict[str, Any], test: Dict[str, Any],
+                status: str, started: Optional[float], result: Any = None, error: Optional[str] = None):
+        """Stream one finished test to disk and update the run summary"""
+        duration = time.monotonic() - started if started is not None else None
+        record = {
+            'test_id': test.get('id'),
+            'status': status,
+            'duration': round(duration, 3) if duration is not None else None,
+            'finished_at': datetime.now().isoformat()
+        }
+        if result is not None:
+            record['result'] = result
+        if error is not None:
+            record['error'] = error
+        writer.write(record)
+        checkpoint.mark(test, status)
+        metrics = get_metrics()
+        metrics.inc('campaign_tests_total', status=status)
+        if duration is not None:
+            metrics.observe('campaign_test_seconds', duration, type=test.get('type', 'unknown'), status=status)
+
+        if status == 'timeout':
+            summary['timed_out'] += 1
+        elif status in ('error', 'failed'):
+            summary['failed'] += 1
+        else:
+            summary['completed'] += 1
+
+    def _timed_out(self, index: int, now: float) -> bool:
+        started = self._started.get(index)
+        return started is not None and now - started >= self.test_timeout
+
+    def _wait_timeout(self, pending: Dict[Any, Any], now: float) -> Optional[float]:
+        """Time until the earliest running test hits its deadline"""
+        if not self.test_timeout:
+            return None
+        remaining = [
+            self._started[index] + self.test_timeout - now
+            for index, _ in pending.values() if index in self._started
+        ]
+        # Tests still queued behind a stuck worker have no deadline yet
+        return max(min(remaining), 0) if remaining else self.test_timeout
+
+    def run(self, tests: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run all tests and return a summary of the campaign"""
+        os.makedirs(self.result_dir, exist_ok=True)
+        summary = {'total': 0, 'completed': 0, 'failed': 0, 'timed_out': 0, 'skipped': 0,
+                   'results_file': self.results_path}
+        metrics_before = get_metrics().summary()
+        checkpoint = Checkpoint(self.checkpoint_path, resume=self.resume, settings=self._checkpoint_settings())
+        writer = ResultWriter(self.results_path, append=self.resume)
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='campaign')
+        queue = enumerate(tests)
+        pending = {}
+
+        def fill():
+            # Keep at most one test in flight per worker so deadlines start
+            # close to submission and large suites are not all queued at once
+            while len(pending) < self.workers:
+                item = next(queue, None)
+                if item is None:
+                    return
+                index, test = item
+                if checkpoint.is_done(test):
+                    summary['skipped'] += 1
+                    continue
+                summary['total'] += 1
+                self._submitted[index] = time.monotonic()
+                pending[executor.submit(self._execute, index, test)] = (index, test)
+
+        try:
+            fill()
+            while pending:
+                done, _ = wait(pending, timeout=self._wait_timeout(pending, time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, test = pending.pop(future)
+                    started = self._started.pop(index, None)
+                    try:
+                        result = future.result()
+                        status = result.get('status', 'completed') if isinstance(result, dict) else 'completed'
+                        self._record(writer, checkpoint, summary, test, status, started, result=result)
+                        logger.info(f"Test {test['id']} completed with status: {status}")
+                    except Exception as e:
+                        self._record(writer, checkpoint, summary, test, 'error', started, error=str(e))
+                        logger.error(f"Test {test.get('id')} failed: {str(e)}")
+
+                if self.test_timeout:
+                    now = time.monotonic()
+                    for future, (index, test) in list(pending.items()):
+                        if self._timed_out(index, now):
+                            # The worker thread cannot be interrupted; its
+                            # eventual result is discarded
+                            del pending[future]
+                            future.cancel()
+                            started = self._started.pop(index, None)
+                            self._record(writer, checkpoint, summary, test, 'timeout', started,
+                                         error=f"Timed out after {self.test_timeout}s")
+                            logger.error(f"Test {test.get('id')} timed out after {self.test_timeout}s")
+
+                fill()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            writer.close()
+            checkpoint.close()
+            self._write_metrics(metrics_before, summary)
+
+        logger.info(
+            f"Campaign finished: {summary['completed']} completed, "
+            f"{summary['failed']} failed, {summary['timed_out']} timed out, "
+            f"{summary['skipped']} skipped as already completed"
+        )
+        return summary
+
+    def _write_metrics(self, since: Dict[str, Any], summary: Dict[str, Any]):
+        """Write this run's share of the process metrics next to the results"""
+        try:
+            get_metrics().write_summary(self.metrics_path, since=since, extra={
+                'generated_at': datetime.now().isoformat(),
+                'campaign': {k: v for k, v in summary.items() if k != 'results_file'}
+            })
+            summary['metrics_file'] = self.metrics_path
+        except Exception as e:
+            logger.error(f"Error writing metrics summary: {str(e)}")
+
+def shard_for(test_id: str, shards: int) -> int:
+    """Stable shard assignment for a test id"""
+    digest = hashlib.sha1(str(test_id).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shards
+
+def _run_shard(index: int, tests: List[Dict[str, Any]], options: Dict[str, Any],
+               tester_factory: Callable[[], Any]) -> Dict[str, Any]:
+    """Run one shard in a worker process"""
+    # Testers read their output location from the environment
+    os.environ['RESULT_DIRECTORY'] = options['result_dir']
+    summary = CampaignRunner(tester_factory, **options).run(tests)
+    summary['shard'] = index
+    return summary
+
+class ShardedCampaign:
+    """Split a campaign across worker processes by hash of test id.
+
+    Every shard streams to its own directory with its own checkpoint, so a
+    shard that dies is re-run with ``resume`` and picks up where it left
+    off. When all shards finish their results are merged into a single
+    report.
+    """
+
+    def __init__(self,
+                 tester_factory: Callable[[], Any],
+                 shards: int,
+                 result_dir: str = 'test_results',
+                 max_shard_retries: int = 2,
+                 **runner_options):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.tester_factory = tester_factory
+        self.shards = shards
+        self.result_dir = result_dir
+        self.max_shard_retries = max_shard_retries
+        self.results_file = runner_options.get('results_file', 'results.jsonl')
+        self.runner_options = dict(runner_options, results_file=self.results_file)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], tester_factory: Callable[[], Any], shards: int, **overrides) -> 'ShardedCampaign':
+        """Build a sharded campaign from the ``configuration`` section of a test config"""
+        settings = config.get('configuration', {})
+        options = {
+            'workers': settings.get('workers', 1),
+            'test_timeout': settings.get('test_timeout'),
+            'save_results': settings.get('save_results', True),
+            'results_file': settings.get('results_file', 'results.jsonl'),
+            'max_shard_retries': settings.get('max_shard_retries', 2),
+            'resume': settings.get('resume', False),
+            'settings': outcome_settings(settings)
+        }
+        options.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(tester_factory, shards, result_dir=settings.get('result_directory', 'test_results'), **options)
+
+    def shard_dir(self, index: int) -> str:
+        return os.path.join(self.result_dir, 'shards', f"shard_{index:03d}")
+
+    def partition(self, tests: Iterable[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        buckets = [[] for _ in range(self.shards)]
+        for test in tests:
+            buckets[shard_for(test['id'], self.shards)].append(test)
+        return buckets
+
+    def run(self, tests: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run all shards, re-running any that die, then merge their results"""
+        buckets = self.partition(tests)
+        attempts = {}
+        running = {}
+
+        def start(index):
+            options = dict(self.runner_options, result_dir=self.shard_dir(index))
+            if attempts[index]:
+                options['resume'] = True
+            # One process per shard, so a crash only breaks its own pool
+            executor = ProcessPoolExecutor(max_workers=1)
+            future = executor.submit(_run_shard, index, buckets[index], options, self.tester_factory)
+            running[future] = (index, executor)
+
+        for index, bucket in enumerate(buckets):
+            if bucket:
+                attempts[index] = 0
+                start(index)
+
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, executor = running.pop(future)
+                    executor.shutdown(wait=False)
+                    attempts[index] += 1
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"Shard {index} died on attempt {attempts[index]}: {str(e)}")
+                        if attempts[index] > self.max_shard_retries:
+                            logger.error(f"Giving up on shard {index}; its partial results are kept")
+                        else:
+                            start(index)
+        finally:
+            for _, executor in running.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        return self.merge(buckets)
+
+    def merge(self, buckets: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Merge the shards' results for the partitioned tests into one campaign report.
+
+        Only shards with tests in ``buckets`` are read, and only records for
+        those tests. A test without any record, because its shard was given
+        up on, is reported with status ``not_run``.
+        """
+        results = []
+        for index, bucket in enumerate(buckets):
+            if not bucket:
+                continue
+            merged = {}
+            for record in read_results(os.path.join(self.shard_dir(index), self.results_file)):
+                record['shard'] = index
+                # A re-run's later record supersedes an earlier failure
+                merged[record['test_id']] = record
+            for test in bucket:
+                results.append(merged.get(test['id']) or {
+                    'test_id': test['id'],
+                    'status': 'not_run',
+                    'shard': index,
+                    'error': f"Shard {index} was given up on before this test finished"
+                })
+
+        summary = {
+            'total': len(results),
+            'completed': sum(1 for r in results if r.get('status') not in FAILED_STATUSES + ('not_run',)),
+            'failed': sum(1 for r in results if r.get('status') in ('error', 'failed')),
+            'timed_out': sum(1 for r in results if r.get('status') == 'timeout'),
+            'not_run': sum(1 for r in results if r.get('status') == 'not_run'),
+            'shards': self.shards
+        }
+        report_path = os.path.join(self.result_dir, 'campaign_report.json')
+        os.makedirs(self.result_dir, exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'generated_at': datetime.now().isoformat(),
+                'summary': summary,
+                'results': results
+            }, f, indent=2, ensure_ascii=False, default=str)
+        summary['report_file'] = report_path
+        summary['metrics_file'] = self._merge_metrics([index for index, bucket in enumerate(buckets) if bucket])
+        logger.info(f"Merged {len(results)} results from {self.shards} shards into {report_path}")
+        return summary
+
+    def _merge_metrics(self, shards: List[int]) -> Optional[str]:
+        """Combine the given shards' metrics summaries into one for the campaign"""
+        summaries = []
+        for index in shards:
+            path = os.path.join(self.shard_dir(index), METRICS_FILE)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    summaries.append(json.load(f))
+        if not summaries:
+            return None
+        merged = merge_summaries(summaries)
+        merged['generated_at'] = datetime.now().isoformat()
+        path = os.path.join(self.result_dir, METRICS_FILE)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(merged, f, indent=2, default=str)
+        return path
@@ -2,23 +2,40 @@ import os
 import json
 import logging
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, List, Optional
 from openai import OpenAI
 from dotenv import load_dotenv
+from context_window import ContextStrategy, FullHistory
+from agents.clients import (client_options, get_async_client, create_completion, acreate_completion,
+                           stream_completion, astream_completion)
+from agents.metrics import get_metrics
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 class ChatInterface:
-    def __init__(self):
-        """Initialize the chat interface with OpenAI client"""
+    def __init__(self, context_strategy: Optional[ContextStrategy] = None, base_url: Optional[str] = None,
+                 async_client=None):
+        """Initialize the chat interface with OpenAI client.
+        
+        ``context_strategy`` decides how much history is sent each turn;
+        by default the full conversation is sent. ``base_url`` points the
+        client at an OpenAI-compatible endpoint, defaulting to ``OPENAI_BASE_URL``.
+        ``async_client`` replaces the shared pooled client used by
+        :meth:`send_message_async`.
+        """
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OpenAI API key not found in environment variables")
             
-        self.client = OpenAI(api_key=api_key)
+        self.base_url = base_url
+        self.client = OpenAI(**client_options(api_key, base_url))
+        self.async_client = async_client
         self.conversation_history = []
         self.current_session = None
+        self.context_strategy = context_strategy or FullHistory()
+        self.tokens_saved = 0
+        self._last_window = None
         
     def start_new_conversation(self):
         """Start a new conversation session"""
@@ -30,56 +47,87 @@ class ChatInterface:
             'messages': []
         }
         self.conversation_history = []
+        self.tokens_saved = 0
+        
+    def _build_messages(self, message: str, system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        """Build the request messages from the system prompt and history"""
+        with get_metrics().stage('context_window'):
+            window = self.context_strategy.build(system_prompt, self.conversation_history, message)
+        self._last_window = window
+        return window.messages
+        
+    def _record_exchange(self, message: str, response, system_prompt: Optional[str] = None) -> str:
+        """Store a completed exchange in the history and current session"""
+        # Extract response text
+        response_text = response.choices[0].message.content
+        
+        # Update history
+        self.conversation_history.extend([message, response_text])
+        if self._last_window:
+            self.tokens_saved += self._last_window.tokens_saved
+        
+        # Record in current session
+        self.current_session['messages'].append({
+            'timestamp': datetime.now().isoformat(),
+            'user_message': message,
+            'assistant_message': response_text,
+            'system_prompt': system_prompt,
+            'context_tokens': self._last_window.tokens_used if self._last_window else None,
+            'tokens_saved': self._last_window.tokens_saved if self._last_window else 0,
+            'total_tokens': getattr(getattr(response, 'usage', None), 'total_tokens', None)
+        })
+        if getattr(response, 'streaming', None) is not None:
+            self.current_session['messages'][-1]['streaming'] = response.streaming
+        
+        return response_text
         
-    def send_message(self, message: str, system_prompt: Optional[str] = None) -> str:
-        """Send a message and get response"""
+    def _request(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        return {'model': "gpt-4", 'messages': messages, 'temperature': 0.7, 'max_tokens': 1000}
+        
+    def send_message(self, message: str, system_prompt: Optional[str] = None, stream: bool = False,
+                     stop_when: Optional[Callable[[str], bool]] = None) -> str:
+        """Send a message and get response.
+        
+        With ``stream`` the reply is consumed as it arrives and its time to
+        first token is recorded in the session. ``stop_when`` is called with
+        the reply received so far and ends the stream once it returns True;
+        the partial reply is what gets stored in the history.
+        """
         try:
             if not self.current_session:
                 self.start_new_conversation()
                 
-            # Prepare messages
-            messages = []
-            if system_prompt:
-                messages.append({
-                    "role": "system",
-                    "content": system_prompt
-                })
-                
-            # Add conversation history
-            messages.extend([{
-                "role": "user" if i % 2 == 0 else "assistant",
-                "content": msg
-            } for i, msg in enumerate(self.conversation_history)])
-            
-            # Add current message
-            messages.append({
-                "role": "user",
-                "content": message
-            })
+            messages = self._build_messages(message, system_prompt)
             
             # Get response from API
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1000
-            )
+            if stream or stop_when is not None:
+                response = stream_completion(self.client, stop_when=stop_when, **self._request(messages))
+            else:
+                response = create_completion(self.client, **self._request(messages))
             
-            # Extract response text
-            response_text = response.choices[0].message.content
+            return self._record_exchange(message, response, system_prompt)
             
-            # Update history
-            self.conversation_history.extend([message, response_text])
+        except Exception as e:
+            logger.error(f"Error in chat completion: {str(e)}")
+            raise
             
-            # Record in current session
-            self.current_session['messages'].append({
-                'timestamp': datetime.now().isoformat(),
-                'user_message': message,
-                'assistant_message': response_text,
-                'system_prompt': system_prompt
-            })
+    async def send_message_async(self, message: str, system_prompt: Optional[str] = None, stream: bool = False,
+                                 stop_when: Optional[Callable[[str], bool]] = None) -> str:
+        """Send a message on the shared async client and get response, see :meth:`send_message`"""
+        try:
+            if not self.current_session:
+                self.start_new_conversation()
+                
+            messages = self._build_messages(message, system_prompt)
+            client = self.async_client or get_async_client(self.base_url)
+            
+            # Get response from API
+            if stream or stop_when is not None:
+                response = await astream_completion(client, stop_when=stop_when, **self._request(messages))
+            else:
+                response = await acreate_completion(client, **self._request(messages))
             
-            return response_text
+            return self._record_exchange(message, response, system_prompt)
             
         except Exception as e:
             logger.error(f"Error in chat completion: {str(e)}")
@@ -141,10 +189,33 @@ class ChatInterface:
         return {
             'start_time': self.current_session['start_time'],
             'message_count': len(self.current_session['messages']),
-            'total_exchanges': len(self.conversation_history) // 2
+            'total_exchanges': len(self.conversation_history) // 2,
+            'tokens_saved': self.tokens_saved
         }
         
+    def analyze_conversation(self, classifier=None) -> Dict[str, Any]:
+        """Score every assistant turn of the current conversation.
+        
+        Returns exchange and token totals, verdict counts and the index of
+        the first turn where the defense failed; see
+        :func:`agents.response_classifier.analyze_conversation`.
+        """
+        from agents.response_classifier import analyze_conversation
+        return analyze_conversation(self.current_session or {}, classifier)
+        
+    def conversation_tree(self, system_prompt: Optional[str] = None, **options):
+        """Branch the current conversation into a tree search.
+        
+        The history so far is the shared prefix of every branch; see
+        :class:`conversation_tree.ConversationTree` for the options. Call
+        ``run()`` on the result, then ``checkout(node)`` to continue this
+        chat from a branch.
+        """
+        from conversation_tree import ConversationTree
+        return ConversationTree(self, system_prompt=system_prompt, **options)
+        
     def clear_conversation(self):
         """Clear the current conversation"""
         self.conversation_history = []
-        self.current_session = None 
\ No newline at end of file
+        self.current_session = None
+        self.tokens_saved = 0
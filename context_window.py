@@ -0,0 +1,188 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+def _get_encoding(model: str):
+    """Load the tiktoken encoding for a model, or None if unavailable"""
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                import tiktoken
+                try:
+                    _encodings[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encodings[model] = tiktoken.get_encoding('cl100k_base')
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating tokens from length: {str(e)}")
+                _encodings[model] = None
+        return _encodings[model]
+
+def count_tokens(text: str, model: str = 'gpt-4') -> int:
+    """Count the tokens in a piece of text for the given model"""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text))
+
+# Fixed per-message overhead of the chat format
+MESSAGE_OVERHEAD = 4
+
+class ContextWindow:
+    """Messages selected for one request, with their token accounting"""
+
+    def __init__(self, messages: List[Dict[str, str]], tokens_used: int, tokens_full: int):
+        self.messages = messages
+        self.tokens_used = tokens_used
+        self.tokens_full = tokens_full
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_full - self.tokens_used)
+
+class ContextStrategy(ABC):
+    """Decides which part of a conversation is sent with each new message.
+
+    ``history`` is the flat ``ChatInterface.conversation_history`` list of
+    alternating user and assistant messages. Token counts per message are
+    memoised, since history only ever grows between calls.
+    """
+
+    def __init__(self, model: str = 'gpt-4'):
+        self.model = model
+        self._token_counts = []
+        self._counted_history = None
+
+    def _message_tokens(self, history: List[str]) -> List[int]:
+        if self._counted_history is not history or len(self._token_counts) > len(history):
+            self._counted_history = history
+            self._token_counts = []
+        for msg in history[len(self._token_counts):]:
+            self._token_counts.append(count_tokens(msg, self.model) + MESSAGE_OVERHEAD)
+        return self._token_counts
+
+    def _tokens(self, text: Optional[str]) -> int:
+        return count_tokens(text, self.model) + MESSAGE_OVERHEAD if text else 0
+
+    @staticmethod
+    def _history_messages(history: List[str], start: int) -> List[Dict[str, str]]:
+        return [{
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": history[i]
+        } for i in range(start, len(history))]
+
+    def _window(self, system_prompt: Optional[str], history: List[str], message: str,
+                start: int, extra_system: Optional[str] = None) -> ContextWindow:
+        """Build a window keeping history from ``start`` onwards"""
+        counts = self._message_tokens(history)
+        fixed = self._tokens(system_prompt) + self._tokens(message)
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        if extra_system:
+            messages.append({"role": "system", "content": extra_system})
+        messages.extend(self._history_messages(history, start))
+        messages.append({"role": "user", "content": message})
+        return ContextWindow(
+            messages,
+            tokens_used=fixed + self._tokens(extra_system) + sum(counts[start:]),
+            tokens_full=fixed + sum(counts)
+        )
+
+    @abstractmethod
+    def build(self, system_prompt: Optional[str], history: List[str], message: str) -> ContextWindow:
+        """Select the messages to send for ``message``"""
+
+class FullHistory(ContextStrategy):
+    """Send the entire conversation every turn (the original behaviour)"""
+
+    def build(self, system_prompt, history, message):
+        return self._window(system_prompt, history, message, 0)
+
+class SlidingWindow(ContextStrategy):
+    """Send only the most recent ``max_turns`` user/assistant exchanges"""
+
+    def __init__(self, max_turns: int = 5, model: str = 'gpt-4'):
+        super().__init__(model)
+        self.max_turns = max_turns
+
+    def build(self, system_prompt, history, message):
+        start = max(0, len(history) - 2 * self.max_turns)
+        return self._window(system_prompt, history, message, start)
+
+class TokenBudget(ContextStrategy):
+    """Send as many recent exchanges as fit in ``max_tokens`` prompt tokens"""
+
+    def __init__(self, max_tokens: int = 4000, model: str = 'gpt-4'):
+        super().__init__(model)
+        self.max_tokens = max_tokens
+
+    def build(self, system_prompt, history, message):
+        counts = self._message_tokens(history)
+        budget = self.max_tokens - self._tokens(system_prompt) - self._tokens(message)
+        start = len(history)
+        # Walk back whole exchanges so a reply is never sent without its question
+        while start >= 2 and sum(counts[start - 2:start]) <= budget:
+            budget -= sum(counts[start - 2:start])
+            start -= 2
+        return self._window(system_prompt, history, message, start)
+
+def extractive_summary(previous: str, messages: List[str], max_chars: int = 2000) -> str:
+    """Cheap local summariser: keep the first sentence of each evicted message"""
+    lines = [previous] if previous else []
+    for i, msg in enumerate(messages):
+        speaker = "User" if i % 2 == 0 else "Assistant"
+        lines.append(f"{speaker}: {msg.split('.')[0].strip()[:200]}")
+    summary = "\n".join(lines)
+    return summary[-max_chars:]
+
+class RollingSummary(ContextStrategy):
+    """Pin the system prompt, keep recent exchanges and summarise the rest.
+
+    Older exchanges are folded into the summary incrementally as they leave
+    the window, so each message is summarised once. ``summarizer`` takes the
+    previous summary and the newly evicted messages and returns the new
+    summary; it can call a model, the default is local and free.
+    """
+
+    def __init__(self, keep_turns: int = 3,
+                 summarizer: Callable[[str, List[str]], str] = extractive_summary,
+                 model: str = 'gpt-4'):
+        super().__init__(model)
+        self.keep_turns = keep_turns
+        self.summarizer = summarizer
+        self.summary = ""
+        self._summarized = 0
+        self._summary_history = None
+
+    def build(self, system_prompt, history, message):
+        if self._summary_history is not history or self._summarized > len(history):
+            self._summary_history = history
+            self.summary = ""
+            self._summarized = 0
+
+        start = max(0, len(history) - 2 * self.keep_turns)
+        if start > self._summarized:
+            self.summary = self.summarizer(self.summary, history[self._summarized:start])
+            self._summarized = start
+
+        extra = f"Summary of the earlier conversation:\n{self.summary}" if self.summary else None
+        return self._window(system_prompt, history, message, start, extra_system=extra)
+
+STRATEGIES = {
+    'full': FullHistory,
+    'sliding_window': SlidingWindow,
+    'token_budget': TokenBudget,
+    'rolling_summary': RollingSummary
+}
+
+def create_strategy(name: str, **kwargs) -> ContextStrategy:
+    """Create a context strategy by name"""
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown context strategy: {name}")
+    return STRATEGIES[name](**kwargs)
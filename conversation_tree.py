@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import itertools
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional
+from agents.clients import get_async_client, acreate_completion
+from agents.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+SUCCESS_LABELS = ('leaked', 'jailbroken')
+PRUNED_LABELS = ('refused', 'empty')
+
+class ConversationNode:
+    """One exchange of a branching conversation.
+
+    A node only holds its own user message and reply and points at its
+    parent, so every branch shares the history above it instead of
+    holding a copy. :meth:`history` rebuilds the flat
+    ``ChatInterface.conversation_history`` list for the path when a
+    request is sent.
+    """
+
+    __slots__ = ('id', 'parent', 'user_message', 'assistant_message', 'depth', 'children',
+                 'score', 'verdict', 'tokens', 'pruned', 'error')
+
+    def __init__(self, node_id: int, parent: Optional['ConversationNode'] = None,
+                 user_message: Optional[str] = None, assistant_message: Optional[str] = None):
+        self.id = node_id
+        self.parent = parent
+        self.user_message = user_message
+        self.assistant_message = assistant_message
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.children = []
+        self.score = 0.0
+        self.verdict = None
+        self.tokens = 0
+        self.pruned = False
+        self.error = None
+
+    def path(self) -> List['ConversationNode']:
+        """Nodes from the first exchange down to this one"""
+        nodes = []
+        node = self
+        while node is not None:
+            if node.user_message is not None:
+                nodes.append(node)
+            node = node.parent
+        nodes.reverse()
+        return nodes
+
+    def history(self) -> List[str]:
+        """Alternating user and assistant messages leading to and including this node"""
+        history = []
+        for node in self.path():
+            history.extend([node.user_message, node.assistant_message])
+        return history
+
+    @property
+    def succeeded(self) -> bool:
+        return bool(self.verdict) and self.verdict.get('label') in SUCCESS_LABELS
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'parent': self.parent.id if self.parent is not None else None,
+            'depth': self.depth,
+            'user_message': self.user_message,
+            'assistant_message': self.assistant_message,
+            'score': self.score,
+            'label': self.verdict.get('label') if self.verdict else None,
+            'tokens': self.tokens,
+            'pruned': self.pruned,
+            'error': self.error
+        }
+
+class ConversationTree:
+    """Beam search over multi-turn conversations.
+
+    Starting from the chat's current ``conversation_history`` (the shared
+    prefix), every surviving node is branched into up to ``branching``
+    follow-ups per turn. All siblings of a turn are sent concurrently on
+    the shared async client, each with the chat's ``context_strategy``
+    applied to its own path. Replies are scored by ``scorer``; refused,
+    empty or failed branches and those scoring under ``prune_below`` are
+    pruned, and only the ``beam_width`` best nodes go on to the next turn.
+    Branches whose reply is labelled leaked or jailbroken are successes and
+    are not extended.
+
+    Each exchange on a shared prefix is sent once, where replaying every
+    branch from scratch resends the whole prefix per branch; both totals
+    are reported by :meth:`get_stats`.
+    """
+
+    def __init__(self,
+                 chat,
+                 expander: Optional[Callable[[ConversationNode], List[str]]] = None,
+                 scorer: Optional[Callable[[str], Dict[str, Any]]] = None,
+                 branching: int = 3,
+                 beam_width: int = 4,
+                 max_depth: int = 3,
+                 prune_below: float = 0.0,
+                 max_concurrency: int = 8,
+                 system_prompt: Optional[str] = None,
+                 stop_on_success: bool = True):
+        """
+        Args:
+            chat: ChatInterface whose client, request settings, context
+                strategy and history are used
+            expander: Returns the candidate next user messages for a node;
+                defaults to :meth:`PromptAgent.generate_follow_ups`
+            scorer: Returns a verdict with ``score`` and ``label`` for a reply;
+                defaults to :meth:`ResponseClassifier.classify`
+            branching: Follow-ups tried per node and turn
+            beam_width: Nodes kept after each turn
+            max_depth: Turns to explore
+            prune_below: Minimum score for a branch to be extended
+            max_concurrency: Requests in flight at once
+            system_prompt: System prompt sent with every request
+            stop_on_success: Stop after the first turn that produced a success
+        """
+        if expander is None:
+            from agents.prompt_agent import PromptAgent
+            agent = PromptAgent()
+            expander = lambda node: agent.generate_follow_ups(node.assistant_message or '', branching)
+        if scorer is None:
+            from agents.response_classifier import ResponseClassifier
+            scorer = ResponseClassifier().classify
+        self.chat = chat
+        self.expander = expander
+        self.scorer = scorer
+        self.branching = branching
+        self.beam_width = beam_width
+        self.max_depth = max_depth
+        self.prune_below = prune_below
+        self.max_concurrency = max_concurrency
+        self.system_prompt = system_prompt
+        self.stop_on_success = stop_on_success
+        self._ids = itertools.count()
+        self.root = ConversationNode(next(self._ids))
+        self.nodes = [self.root]
+        self.successes = []
+        # Seed the tree with the chat's conversation so far as the shared prefix
+        history = chat.conversation_history
+        for i in range(0, len(history) - 1, 2):
+            self.root = self._add_child(self.root, history[i], history[i + 1])
+        self.prefix_depth = self.root.depth
+
+    def _add_child(self, parent: ConversationNode, user_message: str,
+                   assistant_message: Optional[str] = None) -> ConversationNode:
+        node = ConversationNode(next(self._ids), parent, user_message, assistant_message)
+        parent.children.append(node)
+        self.nodes.append(node)
+        return node
+
+    async def _send(self, node: ConversationNode, client, semaphore: asyncio.Semaphore):
+        """Get and score the reply for a new node"""
+        window = self.chat.context_strategy.build(self.system_prompt, node.parent.history(), node.user_message)
+        async with semaphore:
+            try:
+                response = await acreate_completion(client, **self.chat._request(window.messages))
+            except Exception as e:
+                logger.warning(f"Branch {node.id} failed: {str(e)}")
+                node.error = str(e)
+                node.pruned = True
+                return
+        node.assistant_message = response.choices[0].message.content or ''
+        usage = getattr(response, 'usage', None)
+        node.tokens = getattr(usage, 'total_tokens', None) or 0
+        node.verdict = self.scorer(node.assistant_message)
+        node.score = node.verdict.get('score', 0.0)
+
+    def _select(self, children: List[ConversationNode]) -> List[ConversationNode]:
+        """Prune a turn's replies down to the beam that gets extended"""
+        metrics = get_metrics()
+        beam = []
+        for node in sorted(children, key=lambda n: n.score, reverse=True):
+            if node.error is not None:
+                outcome = 'failed'
+            elif node.succeeded:
+                self.successes.append(node)
+                outcome = 'success'
+            elif (node.verdict.get('label') in PRUNED_LABELS or node.score < self.prune_below
+                  or len(beam) >= self.beam_width):
+                node.pruned = True
+                outcome = 'pruned'
+            else:
+                beam.append(node)
+                outcome = 'extended'
+            metrics.inc('conversation_tree_nodes_total', outcome=outcome)
+        return beam
+
+    async def explore(self, opening: Optional[List[str]] = None) -> List[ConversationNode]:
+        """Search the tree and return the successful nodes, best first.
+
+        Args:
+            opening: User messages to branch the first turn into; by default
+                the expander is asked, as for every later turn
+        """
+        client = self.chat.async_client or get_async_client(self.chat.base_url)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        frontier = [self.root]
+        for turn in range(self.max_depth):
+            children = []
+            for node in frontier:
+                messages = opening if (turn == 0 and opening) else self.expander(node)
+                for message in list(dict.fromkeys(messages))[:self.branching]:
+                    children.append(self._add_child(node, message))
+            if not children:
+                break
+            with get_metrics().stage('conversation_tree_turn'):
+                await asyncio.gather(*(self._send(child, client, semaphore) for child in children))
+            frontier = self._select(children)
+            logger.info(f"Turn {turn + 1}: {len(children)} branches, {len(frontier)} kept, "
+                        f"{len(self.successes)} successes")
+            if not frontier or (self.stop_on_success and self.successes):
+                break
+        return self.best()
+
+    def run(self, opening: Optional[List[str]] = None) -> List[ConversationNode]:
+        """Blocking wrapper around :meth:`explore`"""
+        return asyncio.run(self.explore(opening))
+
+    def best(self) -> List[ConversationNode]:
+        """Successful nodes by score, shallowest first on ties"""
+        return sorted(self.successes, key=lambda n: (-n.score, n.depth))
+
+    def leaves(self) -> List[ConversationNode]:
+        return [node for node in self.nodes if not node.children and node.user_message is not None
+                and node.depth > self.prefix_depth]
+
+    def checkout(self, node: ConversationNode):
+        """Continue the chat from a node: its path becomes the chat's conversation"""
+        if not self.chat.current_session:
+            self.chat.start_new_conversation()
+        self.chat.conversation_history = node.history()
+        for n in node.path()[self.prefix_depth:]:
+            self.chat.current_session['messages'].append({
+                'timestamp': datetime.now().isoformat(),
+                'user_message': n.user_message,
+                'assistant_message': n.assistant_message,
+                'system_prompt': self.system_prompt,
+                'total_tokens': n.tokens,
+                'tree_node': n.id
+            })
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Node counts and the tokens spent, next to the cost of replaying each branch"""
+        sent = [node for node in self.nodes if node.depth > self.prefix_depth and node.error is None
+                and node.assistant_message is not None]
+        replay_tokens = sum(sum(n.tokens for n in leaf.path() if n.depth > self.prefix_depth)
+                            for leaf in self.leaves())
+        return {
+            'nodes': len(sent),
+            'max_depth': max((node.depth - self.prefix_depth for node in sent), default=0),
+            'pruned': sum(1 for node in self.nodes if node.pruned),
+            'failed': sum(1 for node in self.nodes if node.error is not None),
+            'successes': len(self.successes),
+            'total_tokens': sum(node.tokens for node in sent),
+            'replay_tokens': replay_tokens
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Every explored node, for saving next to the conversation"""
+        return {
+            'prefix_depth': self.prefix_depth,
+            'stats': self.get_stats(),
+            'nodes': [node.to_dict() for node in self.nodes if node.user_message is not None]
+        }
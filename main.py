@@ -6,6 +6,10 @@ from pathlib import Path
 from datetime import datetime
 from typing import Optional, Dict, Any
 from conversation_tester import ConversationTester
+from campaign_runner import CampaignRunner, ShardedCampaign
+from agents.metrics import start_metrics_server
+from agents.attack_scheduler import AttackScheduler
+from a2a_server import A2AServer
 from dotenv import load_dotenv
 
 # Setup logging
@@ -27,6 +31,12 @@ def parse_args():
     parser.add_argument('--task-card', type=str, help='Path to TaskCard JSON file for A2A mode')
     parser.add_argument('--a2a-mode', action='store_true', help='Enable A2A mode')
     parser.add_argument('--config', type=str, default='test_config.json', help='Path to test configuration file')
+    parser.add_argument('--workers', type=int, help='Number of tests to run concurrently (overrides config)')
+    parser.add_argument('--test-timeout', type=float, help='Per-test timeout in seconds (overrides config)')
+    parser.add_argument('--shards', type=int, help='Split the campaign across this many worker processes')
+    parser.add_argument('--resume', action='store_true', help='Skip tests already completed by a previous run of this config')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this local port while running')
+    parser.add_argument('--serve', action='store_true', help='Run a persistent A2A task server on A2A_HOST:A2A_PORT')
     return parser.parse_args()
 
 def load_task_card(task_card_path: str) -> Optional[Dict[str, Any]]:
@@ -49,44 +59,59 @@ def load_test_config(config_file: str = 'test_config.json'):
         logger.error(f"Error loading test config: {str(e)}")
         return None
 
-def run_tests(config):
+def learn_attack_outcomes(result_dirs):
+    """Feed a campaign's verdicts to the scheduler saved at ATTACK_SCHEDULER_STATE"""
+    state_path = os.getenv('ATTACK_SCHEDULER_STATE')
+    if not state_path:
+        return
+    try:
+        scheduler = AttackScheduler.load(state_path, strategy=os.getenv('ATTACK_SCHEDULER_STRATEGY', 'thompson'))
+        learned = scheduler.learn_from_results(result_dirs)
+        scheduler.save()
+        logger.info(f"Attack scheduler learned {learned} outcomes from this campaign")
+    except Exception as e:
+        logger.error(f"Error updating attack scheduler: {str(e)}")
+
+def run_tests(config, workers: Optional[int] = None, test_timeout: Optional[float] = None,
+              shards: Optional[int] = None, resume: bool = False):
     """Run tests based on configuration"""
     try:
-        tester = ConversationTester()
-        
-        # Create results directory
-        os.makedirs(config['configuration']['result_directory'], exist_ok=True)
+        shards = shards or config['configuration'].get('shards', 1)
+        if shards > 1:
+            campaign = ShardedCampaign.from_config(
+                config,
+                tester_factory=ConversationTester,
+                shards=shards,
+                workers=workers,
+                test_timeout=test_timeout,
+                resume=resume or None
+            )
+            summary = campaign.run(config['tests'])
+            logger.info(f"Merged report written to {summary['report_file']}")
+            learn_attack_outcomes([campaign.shard_dir(index) for index in range(shards)])
+        else:
+            runner = CampaignRunner.from_config(
+                config,
+                tester_factory=ConversationTester,
+                workers=workers,
+                test_timeout=test_timeout,
+                resume=resume or None
+            )
+            summary = runner.run(config['tests'])
+            logger.info(f"Results streamed to {summary['results_file']}")
+            # Testers save their sessions to RESULT_DIRECTORY
+            learn_attack_outcomes(list(dict.fromkeys([runner.result_dir, os.getenv('RESULT_DIRECTORY', 'test_results')])))
         
-        # Run each test
-        for test in config['tests']:
-            logger.info(f"Running test: {test['id']}")
-            
-            if test['type'] == 'static':
-                result = tester.run_static_conversation_test(
-                    initial_prompt=test['prompt'],
-                    num_exchanges=test.get('num_exchanges', 3)
-                )
-            else:  # dynamic
-                result = tester.run_dynamic_conversation_test(
-                    context=test['context']
-                )
-                
-            # Save test results
-            if config['configuration']['save_results']:
-                tester.save_results(test['id'])
-                
-            logger.info(f"Test {test['id']} completed with status: {result['status']}")
-            
     except Exception as e:
         logger.error(f"Error running tests: {str(e)}")
         return False
         
-    return True
+    return summary['failed'] == 0 and summary['timed_out'] == 0 and not summary.get('not_run')
 
-def process_a2a_task(task_card: Dict[str, Any]) -> Dict[str, Any]:
-    """Process task in A2A mode"""
+def process_a2a_task(task_card: Dict[str, Any], tester: Optional[ConversationTester] = None) -> Dict[str, Any]:
+    """Process task in A2A mode, on a warm ``tester`` if one is given"""
     try:
-        tester = ConversationTester()
+        tester = tester or ConversationTester()
         
         # Process the task based on task card type
         if task_card.get('type') == 'security_test':
@@ -127,7 +152,23 @@ def main():
         os.makedirs('logs', exist_ok=True)
         os.makedirs('output', exist_ok=True)
         
-        if args.task_card or args.a2a_mode:
+        if args.serve:
+            # Persistent A2A server with warm testers
+            if args.metrics_port:
+                start_metrics_server(args.metrics_port)
+            server = A2AServer(
+                task_handler=process_a2a_task,
+                tester_factory=ConversationTester,
+                host=os.getenv('A2A_HOST', 'localhost'),
+                port=int(os.getenv('A2A_PORT', '5000')),
+                workers=args.workers or int(os.getenv('A2A_WORKERS', '4'))
+            )
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                logger.info("A2A server stopped")
+            
+        elif args.task_card or args.a2a_mode:
             # A2A mode
             task_card = load_task_card(args.task_card)
             if not task_card:
@@ -150,7 +191,11 @@ def main():
                 logger.error("Failed to load configuration")
                 return
                 
-            success = run_tests(config)
+            metrics_port = args.metrics_port or config.get('configuration', {}).get('metrics_port')
+            if metrics_port:
+                start_metrics_server(metrics_port)
+                
+            success = run_tests(config, workers=args.workers, test_timeout=args.test_timeout, shards=args.shards, resume=args.resume)
             if success:
                 logger.info("All tests completed successfully")
             else:
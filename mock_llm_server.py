@@ -0,0 +1,460 @@
+import re
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSE = "This is a mock response"
+
+def parse_latency(spec: Optional[str]) -> Callable[[random.Random], float]:
+    """Build a latency sampler from a spec such as ``lognormal:-3,0.5``.
+
+    Supported distributions (all values in seconds):
+    ``fixed:S``, ``uniform:LOW,HIGH``, ``normal:MEAN,STDDEV``,
+    ``lognormal:MU,SIGMA`` and ``exponential:MEAN``.
+    """
+    if not spec:
+        return lambda rng: 0.0
+    name, _, args = spec.partition(':')
+    params = [float(x) for x in args.split(',')] if args else []
+    samplers = {
+        'fixed': lambda rng: params[0],
+        'uniform': lambda rng: rng.uniform(params[0], params[1]),
+        'normal': lambda rng: rng.gauss(params[0], params[1]),
+        'lognormal': lambda rng: rng.lognormvariate(params[0], params[1]),
+        'exponential': lambda rng: rng.expovariate(1.0 / params[0])
+    }
+    if name not in samplers:
+        raise ValueError(f"Unknown latency distribution: {name}")
+    sampler = samplers[name]
+    return lambda rng: max(0.0, sampler(rng))
+
+def load_script(filepath: str) -> List[Dict[str, Any]]:
+    """Load scripted responses from a JSON or YAML file.
+
+    The file holds a list of rules, or a dict with a ``responses`` list.
+    Each rule has a ``match`` regex tested against the last user message
+    and either a ``response`` string or a list of ``responses`` to cycle.
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        if filepath.endswith(('.yaml', '.yml')):
+            import yaml
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    return data.get('responses', []) if isinstance(data, dict) else data
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4) if text else 0
+
+class MockLLMServer:
+    """Local OpenAI-compatible chat completions endpoint for load testing.
+
+    Serves ``POST /v1/chat/completions`` and ``GET /v1/models`` with
+    configurable latency, random 5xx errors, random 429s with a
+    ``Retry-After`` header and scripted responses. ``GET /stats`` reports
+    request counters. Point the agents at it with ``base_url`` or
+    ``OPENAI_BASE_URL=<server.base_url>``.
+
+    Requests with ``stream`` set are answered with server-sent chunks, one
+    word each, ``stream_interval`` seconds apart. The Files and Batches endpoints are emulated as well: an uploaded
+    batch file is processed in a background thread, ``batch_delay``
+    seconds per request, using the same scripted replies and error
+    injection, and its output and error files can be downloaded.
+    """
+
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 latency: Optional[str] = None,
+                 error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0,
+                 script: Optional[List[Dict[str, Any]]] = None,
+                 default_response: str = DEFAULT_RESPONSE,
+                 seed: Optional[int] = None,
+                 batch_delay: float = 0.0,
+                 stream_interval: float = 0.0):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.default_response = default_response
+        self.rules = [
+            dict(rule, pattern=re.compile(rule.get('match', '.*'), re.IGNORECASE | re.DOTALL))
+            for rule in (script or [])
+        ]
+        self._rule_hits = [0] * len(self.rules)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.batch_delay = batch_delay
+        self.stream_interval = stream_interval
+        self.files = {}
+        self.batches = {}
+        self.stats = {'requests': 0, 'completions': 0, 'errors': 0, 'rate_limited': 0, 'batches': 0,
+                      'streams_abandoned': 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'MockLLMServer':
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Mock LLM server listening on {self.base_url}")
+        return self
+
+    def serve_forever(self):
+        logger.info(f"Mock LLM server listening on {self.base_url}")
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _roll(self):
+        """Draw this request's latency and injected failure under the lock"""
+        with self._lock:
+            self.stats['requests'] += 1
+            delay = self.latency(self._random)
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return delay, 'rate_limited'
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay, 'error'
+        return delay, None
+
+    def reply_for(self, messages: List[Dict[str, Any]]) -> str:
+        """Pick the scripted reply for the last user message"""
+        user_messages = [m for m in messages if m.get('role') == 'user']
+        text = str(user_messages[-1].get('content', '')) if user_messages else ''
+        for position, rule in enumerate(self.rules):
+            if rule['pattern'].search(text):
+                if 'responses' in rule:
+                    with self._lock:
+                        hit = self._rule_hits[position]
+                        self._rule_hits[position] += 1
+                    return rule['responses'][hit % len(rule['responses'])]
+                return rule.get('response', self.default_response)
+        return self.default_response
+
+    def completion(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a chat completion body for a request"""
+        messages = request.get('messages', [])
+        content = self.reply_for(messages)
+        max_tokens = request.get('max_tokens')
+        finish_reason = 'stop'
+        if max_tokens and estimate_tokens(content) > max_tokens:
+            content = content[:max_tokens * 4]
+            finish_reason = 'length'
+        prompt_tokens = sum(estimate_tokens(str(m.get('content', ''))) for m in messages)
+        completion_tokens = estimate_tokens(content)
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock-model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': finish_reason
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        }
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        meta = {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                'filename': filename, 'purpose': purpose, 'status': 'processed'}
+        with self._lock:
+            self.files[file_id] = (meta, content)
+        return meta
+
+    def create_batch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {
+            'id': batch_id,
+            'object': 'batch',
+            'endpoint': request.get('endpoint'),
+            'input_file_id': request.get('input_file_id'),
+            'completion_window': request.get('completion_window', '24h'),
+            'status': 'validating',
+            'output_file_id': None,
+            'error_file_id': None,
+            'created_at': int(time.time()),
+            'completed_at': None,
+            'metadata': request.get('metadata'),
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0}
+        }
+        with self._lock:
+            self.batches[batch_id] = batch
+            self.stats['batches'] += 1
+        threading.Thread(target=self._process_batch, args=(batch_id,), daemon=True).start()
+        return dict(batch)
+
+    def _process_batch(self, batch_id: str):
+        """Work through a batch input file line by line"""
+        with self._lock:
+            batch = self.batches[batch_id]
+            _, content = self.files.get(batch['input_file_id'], (None, b''))
+        lines = [json.loads(line) for line in content.decode('utf-8').splitlines() if line.strip()]
+        with self._lock:
+            batch['status'] = 'in_progress'
+            batch['request_counts']['total'] = len(lines)
+
+        outputs, errors = [], []
+        for line in lines:
+            with self._lock:
+                if batch['status'] == 'cancelling':
+                    break
+                roll = self._random.random()
+            if self.batch_delay:
+                time.sleep(self.batch_delay)
+            record = {'id': f"batch_req_{uuid.uuid4().hex[:24]}", 'custom_id': line.get('custom_id'), 'error': None}
+            if roll < self.error_rate:
+                record['response'] = {'status_code': 500, 'request_id': uuid.uuid4().hex, 'body': {
+                    'error': {'message': 'Internal error (injected by mock server)', 'type': 'server_error'}}}
+                errors.append(record)
+                key = 'failed'
+            else:
+                record['response'] = {'status_code': 200, 'request_id': uuid.uuid4().hex,
+                                      'body': self.completion(line.get('body', {}))}
+                outputs.append(record)
+                key = 'completed'
+            with self._lock:
+                batch['request_counts'][key] += 1
+
+        def dump(records):
+            return ''.join(json.dumps(r) + '\n' for r in records).encode('utf-8')
+
+        output_id = self.add_file(dump(outputs), f"{batch_id}_output.jsonl", 'batch_output')['id'] if outputs else None
+        error_id = self.add_file(dump(errors), f"{batch_id}_errors.jsonl", 'batch_output')['id'] if errors else None
+        with self._lock:
+            batch['output_file_id'] = output_id
+            batch['error_file_id'] = error_id
+            batch['status'] = 'cancelled' if batch['status'] == 'cancelling' else 'completed'
+            batch['completed_at'] = int(time.time())
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive so clients can reuse pooled connections
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; avoid delayed-ACK stalls
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_error(self, status: int, message: str, error_type: str, headers=None):
+                self._send_json(status, {'error': {'message': message, 'type': error_type, 'code': None}}, headers)
+
+            def _read_json(self) -> Dict[str, Any]:
+                length = int(self.headers.get('Content-Length', 0))
+                return json.loads(self.rfile.read(length) or b'{}')
+
+            def do_GET(self):
+                path = self.path.split('?')[0].rstrip('/')
+                if path.endswith('/models'):
+                    self._send_json(200, {'object': 'list', 'data': [
+                        {'id': 'mock-model', 'object': 'model', 'created': 0, 'owned_by': 'mock'}
+                    ]})
+                elif path.endswith('/stats'):
+                    with server._lock:
+                        stats = dict(server.stats)
+                    self._send_json(200, stats)
+                elif '/files/' in path:
+                    file_id, _, action = path.split('/files/', 1)[1].partition('/')
+                    with server._lock:
+                        entry = server.files.get(file_id)
+                    if entry is None:
+                        self._send_error(404, f"No such file: {file_id}", 'invalid_request_error')
+                    elif action == 'content':
+                        self.send_response(200)
+                        self.send_header('Content-Type', 'application/octet-stream')
+                        self.send_header('Content-Length', str(len(entry[1])))
+                        self.end_headers()
+                        self.wfile.write(entry[1])
+                    else:
+                        self._send_json(200, entry[0])
+                elif '/batches/' in path:
+                    batch_id = path.split('/batches/', 1)[1]
+                    with server._lock:
+                        batch = json.loads(json.dumps(server.batches.get(batch_id)))
+                    if batch is None:
+                        self._send_error(404, f"No such batch: {batch_id}", 'invalid_request_error')
+                    else:
+                        self._send_json(200, batch)
+                else:
+                    self._send_error(404, f"Unknown path {self.path}", 'invalid_request_error')
+
+            def _upload_file(self):
+                length = int(self.headers.get('Content-Length', 0))
+                header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode('utf-8')
+                message = BytesParser(policy=HTTP).parsebytes(header + self.rfile.read(length))
+                fields, content, filename = {}, b'', 'upload.jsonl'
+                for part in message.iter_parts():
+                    name = part.get_param('name', header='content-disposition')
+                    if name == 'file':
+                        content = part.get_payload(decode=True) or b''
+                        filename = part.get_filename() or filename
+                    else:
+                        fields[name] = part.get_content().strip()
+                self._send_json(200, server.add_file(content, filename, fields.get('purpose', 'batch')))
+
+            def do_POST(self):
+                path = self.path.split('?')[0].rstrip('/')
+                if path.endswith('/files'):
+                    self._upload_file()
+                    return
+                if path.endswith('/batches'):
+                    self._send_json(200, server.create_batch(self._read_json()))
+                    return
+                if path.endswith('/cancel') and '/batches/' in path:
+                    batch_id = path.split('/batches/', 1)[1].rsplit('/', 1)[0]
+                    with server._lock:
+                        batch = server.batches.get(batch_id)
+                        if batch and batch['status'] in ('validating', 'in_progress'):
+                            batch['status'] = 'cancelling'
+                        batch = json.loads(json.dumps(batch))
+                    if batch is None:
+                        self._send_error(404, f"No such batch: {batch_id}", 'invalid_request_error')
+                    else:
+                        self._send_json(200, batch)
+                    return
+                if not path.endswith('/chat/completions'):
+                    self._send_error(404, f"Unknown path {self.path}", 'invalid_request_error')
+                    return
+                try:
+                    request = self._read_json()
+                except ValueError:
+                    self._send_error(400, "Request body is not valid JSON", 'invalid_request_error')
+                    return
+
+                delay, failure = server._roll()
+                if delay:
+                    time.sleep(delay)
+                if failure == 'rate_limited':
+                    server._count('rate_limited')
+                    self._send_error(429, "Rate limit reached (injected by mock server)", 'rate_limit_error',
+                                     {'Retry-After': str(server.retry_after)})
+                    return
+                if failure == 'error':
+                    server._count('errors')
+                    self._send_error(500, "Internal error (injected by mock server)", 'server_error')
+                    return
+
+                server._count('completions')
+                if request.get('stream'):
+                    self._send_stream(server.completion(request), request)
+                else:
+                    self._send_json(200, server.completion(request))
+
+            def _send_stream(self, completion: Dict[str, Any], request: Dict[str, Any]):
+                """Send a completion as server-sent chunks, one per word"""
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+
+                base = {key: completion[key] for key in ('id', 'created', 'model')}
+                base['object'] = 'chat.completion.chunk'
+                choice = completion['choices'][0]
+                words = re.findall(r'\S*\s*', choice['message']['content'])
+                deltas = [{'role': 'assistant', 'content': ''}] + [{'content': w} for w in words if w]
+                chunks = [dict(base, choices=[{'index': 0, 'delta': d, 'finish_reason': None}]) for d in deltas]
+                chunks.append(dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': choice['finish_reason']}]))
+                if (request.get('stream_options') or {}).get('include_usage'):
+                    chunks.append(dict(base, choices=[], usage=completion['usage']))
+                try:
+                    for position, chunk in enumerate(chunks):
+                        if position and server.stream_interval:
+                            time.sleep(server.stream_interval)
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    server._count('streams_abandoned')
+
+        return Handler
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Local OpenAI-compatible mock LLM server')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=8089, help='Port to listen on')
+    parser.add_argument('--latency', type=str, help='Latency distribution, e.g. fixed:0.05 or lognormal:-3,0.5')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests failing with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--script', type=str, help='JSON or YAML file of scripted responses')
+    parser.add_argument('--seed', type=int, help='Seed for latency and failure injection')
+    parser.add_argument('--stream-interval', type=float, default=0.0, help='Seconds between streamed chunks')
+    parser.add_argument('--batch-delay', type=float, default=0.0, help='Seconds spent per request when processing batches')
+    return parser.parse_args()
+
+def main():
+    """Main entry point"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    server = MockLLMServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        script=load_script(args.script) if args.script else None,
+        seed=args.seed,
+        batch_delay=args.batch_delay,
+        stream_interval=args.stream_interval
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
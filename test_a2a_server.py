@@ -0,0 +1,116 @@
+import json
+import time
+import threading
+import urllib.request
+import pytest
+from a2a_server import A2AServer
+
+class WarmTester:
+    """Counts how many testers the server builds"""
+    built = 0
+
+    def __init__(self):
+        WarmTester.built += 1
+
+def handler(card, tester):
+    if card.get('prompt') == 'boom':
+        raise RuntimeError('model unavailable')
+    time.sleep(card.get('delay', 0))
+    return {'task_id': card['id'], 'status': 'completed', 'result': {'echo': card.get('prompt'), 'tester': id(tester)}}
+
+def request(method, url, body=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req) as response:
+            return response.status, response.read().decode('utf-8')
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode('utf-8')
+
+@pytest.fixture
+def server(tmp_path):
+    WarmTester.built = 0
+    server = A2AServer(handler, WarmTester, port=0, workers=2, output_dir=str(tmp_path)).start()
+    yield server
+    server.stop()
+
+def test_tasks_run_on_warm_testers_and_are_polled(server, tmp_path):
+    """Submitted cards run concurrently on the workers' own testers"""
+    ids = []
+    for i in range(6):
+        status, body = request('POST', f"{server.url}/tasks", {'id': f"task-{i}", 'prompt': f"p{i}", 'delay': 0.05})
+        assert status == 202
+        ids.append(json.loads(body)['task_id'])
+
+    results = [json.loads(request('GET', f"{server.url}/tasks/{task_id}?wait=5")[1]) for task_id in ids]
+    assert all(r['status'] == 'completed' for r in results)
+    assert results[3]['result']['echo'] == 'p3'
+    assert WarmTester.built == 2
+    assert (tmp_path / 'task-0_result.json').exists()
+
+    status, body = request('POST', f"{server.url}/tasks", {'id': 'bad', 'prompt': 'boom'})
+    failed = json.loads(request('GET', f"{server.url}/tasks/bad?wait=5")[1])
+    assert failed['status'] == 'failed' and 'model unavailable' in failed['error']
+
+def test_task_ids_cannot_escape_output_dir(server, tmp_path):
+    """Ids that are not plain file names are rejected before anything is queued"""
+    for task_id in ('../../escaped', 'a/b', '..\\x', ' '):
+        status, body = request('POST', f"{server.url}/tasks", {'id': task_id, 'prompt': 'p'})
+        assert status == 400, task_id
+    assert server.list_tasks() == []
+    assert not (tmp_path.parent.parent / 'escaped_result.json').exists()
+
+def test_higher_priority_tasks_run_first(tmp_path):
+    """Queued tasks are taken by priority, then in submission order"""
+    order = []
+    gate = threading.Event()
+
+    def ordered(card, tester):
+        gate.wait(5)
+        order.append(card['id'])
+        return {'status': 'completed', 'result': None}
+
+    server = A2AServer(ordered, port=0, workers=1, output_dir=None).start()
+    try:
+        server.submit({'id': 'blocker'})
+        time.sleep(0.1)
+        server.submit({'id': 'low', 'priority': 0})
+        server.submit({'id': 'high', 'priority': 5})
+        server.submit({'id': 'cancel-me', 'priority': 9})
+        assert server.cancel('cancel-me')['status'] == 'cancelled'
+        gate.set()
+        assert server.get('low', wait=5)['status'] == 'completed'
+    finally:
+        server.stop()
+    assert order == ['blocker', 'high', 'low']
+
+def test_event_stream_reports_status_changes(server):
+    """The events endpoint streams every status change until the task finishes"""
+    request('POST', f"{server.url}/tasks", {'id': 'streamed', 'prompt': 'hi', 'delay': 0.1})
+    with urllib.request.urlopen(f"{server.url}/tasks/streamed/events?timeout=5") as response:
+        stream = response.read().decode('utf-8')
+    statuses = [line.split(': ', 1)[1] for line in stream.splitlines() if line.startswith('event: ')]
+    assert statuses == ['queued', 'running', 'completed']
+    assert '"echo": "hi"' in stream
+
+def test_tester_construction_failure_fails_tasks_and_degrades_health(tmp_path):
+    """A worker whose tester cannot be built fails its tasks instead of dying silently"""
+    def broken_factory():
+        raise RuntimeError('no credentials')
+
+    server = A2AServer(handler, broken_factory, port=0, workers=1, output_dir=str(tmp_path)).start()
+    try:
+        server.submit({'id': 't1', 'prompt': 'p'})
+        task = server.get('t1', wait=5)
+        assert task['status'] == 'failed' and 'no credentials' in task['error']
+        health = server.health()
+        assert health['status'] == 'degraded' and list(health['worker_errors'].values()) == ['no credentials']
+    finally:
+        server.stop()
+
+def test_bad_query_parameters_are_rejected(server):
+    """Malformed wait and timeout values get a 400; negative ones are clamped"""
+    server.submit({'id': 'q', 'prompt': 'p'})
+    assert request('GET', f"{server.url}/tasks/q?wait=abc")[0] == 400
+    assert request('GET', f"{server.url}/tasks/q/events?timeout=soon")[0] == 400
+    assert request('GET', f"{server.url}/tasks/q?wait=-5")[0] == 200
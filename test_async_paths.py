@@ -0,0 +1,65 @@
+import asyncio
+from types import SimpleNamespace
+from agents.chat_injector_agent import ChatInjectorAgent
+from chat_interface import ChatInterface
+
+class FakeAsyncClient:
+    """Async client shaped like ``AsyncOpenAI`` that echoes the last user message"""
+
+    def __init__(self, delays=None):
+        self.chat = SimpleNamespace(completions=self)
+        self.delays = delays or {}
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **request):
+        self.requests.append(request)
+        text = request['messages'][-1]['content']
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(next((d for key, d in self.delays.items() if key in text), 0.01))
+            if 'fail' in text:
+                raise RuntimeError('upstream error')
+        finally:
+            self.in_flight -= 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(role='assistant', content=f"echo: {text}"),
+                                     finish_reason='stop')],
+            created=0,
+            model=request.get('model'),
+            usage=SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2)
+        )
+
+def test_execute_injections_bounds_concurrency_and_reports_errors():
+    """Results arrive as they complete, in-flight requests stay capped and failures become error dicts"""
+    client = FakeAsyncClient(delays={'slow': 0.1})
+    agent = ChatInjectorAgent(async_client=client)
+    prompts = ['slow one', 'a', 'b', 'please fail', 'c']
+    batch = [{'prompt': {'type': 'test', 'content': p}, 'target_url': 'http://target'} for p in prompts]
+
+    async def collect():
+        return [result async for result in agent.execute_injections(batch, max_concurrency=2)]
+
+    results = asyncio.run(collect())
+    assert len(results) == 5
+    assert client.max_in_flight == 2
+    assert results[-1]['prompt']['content'] == 'slow one'
+    errors = [r for r in results if 'error' in r]
+    assert len(errors) == 1 and errors[0]['prompt']['content'] == 'please fail'
+
+def test_send_message_async_keeps_history(monkeypatch):
+    """The async chat path sends the history and records each exchange"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    client = FakeAsyncClient()
+    chat = ChatInterface(async_client=client)
+
+    async def talk():
+        await chat.send_message_async('hello')
+        return await chat.send_message_async('again')
+
+    assert asyncio.run(talk()) == 'echo: again'
+    assert chat.conversation_history == ['hello', 'echo: hello', 'again', 'echo: again']
+    assert [m['content'] for m in client.requests[-1]['messages']] == chat.conversation_history[:3]
+    assert len(chat.current_session['messages']) == 2
@@ -0,0 +1,93 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from agents.atlas_sync import AtlasSync
+
+def technique_row(tid, name, tactic='Initial Access'):
+    return (f'<tr class="technique-row" id="{tid}"><td class="name">{name}</td>'
+            f'<td class="description">{name} description</td><td class="tactic">{tactic}</td></tr>')
+
+class AtlasStandIn(BaseHTTPRequestHandler):
+    """Serves a techniques page with ETag support and counts full downloads"""
+    page = {'etag': '"v1"', 'rows': [technique_row('AML.T0051', 'LLM Prompt Injection')]}
+    requests_seen = []
+
+    def do_GET(self):
+        AtlasStandIn.requests_seen.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == self.page['etag']:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = ('<table>' + ''.join(self.page['rows']) + '</table>').encode()
+        self.send_response(200)
+        self.send_header('ETag', self.page['etag'])
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def atlas_url():
+    AtlasStandIn.page = {'etag': '"v1"', 'rows': [technique_row('AML.T0051', 'LLM Prompt Injection')]}
+    AtlasStandIn.requests_seen = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), AtlasStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/techniques"
+    server.shutdown()
+
+def test_refresh_interval_and_conditional_requests(tmp_path, atlas_url):
+    """Syncs within the interval stay local and unchanged pages return 304"""
+    snapshot = str(tmp_path / 'techniques.csv')
+    sync = AtlasSync(snapshot_path=snapshot, url=atlas_url, refresh_interval=3600)
+
+    assert [t['id'] for t in sync.sync()] == ['AML.T0051']
+    assert sync.sync() == []
+    assert len(AtlasStandIn.requests_seen) == 1
+
+    assert sync.sync(force=True) == []
+    assert AtlasStandIn.requests_seen[-1] == '"v1"'
+
+def test_only_new_techniques_are_reported(tmp_path, atlas_url):
+    """A changed page yields only the ids missing from the local index"""
+    snapshot = str(tmp_path / 'techniques.csv')
+    AtlasSync(snapshot_path=snapshot, url=atlas_url).sync(force=True)
+
+    AtlasStandIn.page = {'etag': '"v2"', 'rows': AtlasStandIn.page['rows'] + [
+        technique_row('AML.T0054', 'LLM Jailbreak', tactic='Privilege Escalation')
+    ]}
+    sync = AtlasSync(snapshot_path=snapshot, url=atlas_url, refresh_interval=0)
+    new = sync.sync()
+
+    assert [t['id'] for t in new] == ['AML.T0054']
+    assert {t['id'] for t in sync.techniques()} == {'AML.T0051', 'AML.T0054'}
+
+def test_offline_mode_serves_snapshot(tmp_path, atlas_url):
+    """Offline mode answers from the local snapshot without any request"""
+    snapshot = str(tmp_path / 'techniques.csv')
+    AtlasSync(snapshot_path=snapshot, url=atlas_url).sync(force=True)
+    seen = len(AtlasStandIn.requests_seen)
+
+    offline = AtlasSync(snapshot_path=snapshot, url=atlas_url, refresh_interval=0, offline=True)
+    assert offline.sync(force=True) == []
+    assert offline.get('AML.T0051')['name'] == 'LLM Prompt Injection'
+    assert len(AtlasStandIn.requests_seen) == seen
+
+def test_source_agent_retries_failed_first_fetch(tmp_path, monkeypatch, atlas_url):
+    """A first ATLAS fetch that fails is tried again on the next use"""
+    from agents.prompt_source_agent import PromptSourceAgent
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('ATTACK_SCHEDULER_STATE', raising=False)
+    agent = PromptSourceAgent()
+    agent.atlas.url = 'http://127.0.0.1:9/unreachable'
+    agent.atlas.timeout = 1
+    agent._ensure_csv_exists()
+    assert not agent._techniques_ready
+
+    agent.atlas.url = atlas_url
+    agent._ensure_csv_exists()
+    assert agent._techniques_ready
+    assert (tmp_path / 'prompts' / 'mitre_techniques.csv').exists()
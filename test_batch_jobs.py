@@ -0,0 +1,50 @@
+import json
+import pytest
+from mock_llm_server import MockLLMServer
+from agents.chat_injector_agent import ChatInjectorAgent
+from agents.recorder_agent import RecorderAgent
+from agents.rate_limiter import RateLimiter, set_rate_limiter
+
+@pytest.fixture(autouse=True)
+def limiter():
+    set_rate_limiter(RateLimiter(base_delay=0.01, max_delay=0.05))
+    yield
+    set_rate_limiter(None)
+
+def make_batch(n):
+    return [{'prompt': {'id': f"p{i}", 'content': f"prompt {i}"}, 'target_url': f"http://target/{i}"} for i in range(n)]
+
+def test_batch_results_map_back_to_injections(tmp_path):
+    """Results come back in submission order, recorded like live injections"""
+    script = [{'match': 'prompt 3', 'response': 'Refused.'}]
+    with MockLLMServer(script=script) as server:
+        agent = ChatInjectorAgent(base_url=server.base_url)
+        recorder = RecorderAgent(str(tmp_path / 'results'))
+        results = agent.execute_injections_batch(make_batch(6), recorder=recorder, name='nightly',
+                                                 workdir=str(tmp_path / 'batches'), poll_interval=0.01, timeout=10)
+
+    assert [r['prompt']['id'] for r in results] == [f"p{i}" for i in range(6)]
+    assert results[3]['generated_text'] == 'Refused.'
+    assert results[0]['context']['target_url'] == 'http://target/0'
+    assert results[0]['usage']['total_tokens'] > 0
+    assert len({r['batch']['batch_id'] for r in results}) == 1
+
+    input_lines = (tmp_path / 'batches' / 'nightly.input.jsonl').read_text().splitlines()
+    assert json.loads(input_lines[0])['url'] == '/v1/chat/completions'
+    assert list((tmp_path / 'results').glob('nightly*.json'))
+
+def test_failed_requests_are_reported_and_state_reloads(tmp_path):
+    """Errored lines become error results; a job can be collected from its state file"""
+    with MockLLMServer(error_rate=0.5, seed=3) as server:
+        agent = ChatInjectorAgent(base_url=server.base_url)
+        state_path = agent.submit_injection_batch(make_batch(10), name='flaky', workdir=str(tmp_path))
+        results = ChatInjectorAgent(base_url=server.base_url).collect_injection_batch(
+            state_path, poll_interval=0.01, timeout=10)
+
+    failed = [r for r in results if 'error' in r]
+    assert len(results) == 10
+    assert 0 < len(failed) < 10
+    assert all(r['prompt']['id'] for r in failed)
+    state = json.loads(open(state_path).read())
+    assert state['status'] == 'completed'
+    assert state['request_counts']['failed'] == len(failed)
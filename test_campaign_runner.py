@@ -0,0 +1,171 @@
+import os
+import json
+import time
+from campaign_runner import CampaignRunner, ResultWriter
+
+class FakeTester:
+    """Stand-in for ConversationTester that sleeps instead of calling a model"""
+    instances = 0
+
+    def __init__(self, delay: float = 0.05):
+        FakeTester.instances += 1
+        self.delay = delay
+        self.saved = []
+
+    def run_static_conversation_test(self, initial_prompt, num_exchanges=3):
+        if initial_prompt == 'boom':
+            raise RuntimeError('model unavailable')
+        time.sleep(self.delay if initial_prompt != 'slow' else 1.0)
+        return {'status': 'completed', 'exchanges': num_exchanges}
+
+    def run_dynamic_conversation_test(self, context):
+        time.sleep(self.delay)
+        return {'status': 'completed', 'exchanges': 1}
+
+    def save_results(self, test_name):
+        self.saved.append(test_name)
+
+def read_results(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_concurrent_run_streams_every_result(tmp_path):
+    """Tests run in parallel and each one is appended to the results file"""
+    tests = [{'id': f't{i}', 'type': 'static', 'prompt': 'p'} for i in range(8)]
+    runner = CampaignRunner(FakeTester, workers=8, result_dir=str(tmp_path), save_results=False)
+
+    start = time.monotonic()
+    summary = runner.run(tests)
+    elapsed = time.monotonic() - start
+
+    assert summary['completed'] == 8
+    assert elapsed < 8 * 0.05
+    assert sorted(r['test_id'] for r in read_results(summary['results_file'])) == sorted(t['id'] for t in tests)
+
+def test_single_worker_reuses_one_tester(tmp_path):
+    """One worker is the sequential loop with a single tester instance"""
+    FakeTester.instances = 0
+    tests = [
+        {'id': 'a', 'type': 'static', 'prompt': 'p'},
+        {'id': 'b', 'type': 'dynamic', 'context': {}}
+    ]
+    summary = CampaignRunner(FakeTester, workers=1, result_dir=str(tmp_path)).run(tests)
+
+    assert summary['completed'] == 2
+    assert FakeTester.instances == 1
+
+def test_errors_and_timeouts_do_not_stop_campaign(tmp_path):
+    """A failing or hanging test is recorded and the rest still run"""
+    tests = [
+        {'id': 'ok', 'type': 'static', 'prompt': 'p'},
+        {'id': 'fail', 'type': 'static', 'prompt': 'boom'},
+        {'id': 'hang', 'type': 'static', 'prompt': 'slow'}
+    ]
+    runner = CampaignRunner(FakeTester, workers=2, test_timeout=0.2, result_dir=str(tmp_path))
+    summary = runner.run(tests)
+
+    statuses = {r['test_id']: r['status'] for r in read_results(summary['results_file'])}
+    assert statuses == {'ok': 'completed', 'fail': 'error', 'hang': 'timeout'}
+    assert summary['failed'] == 1 and summary['timed_out'] == 1
+
+class CrashingTester(FakeTester):
+    """Kills its worker process the first time it sees the 'crash' prompt"""
+
+    def run_static_conversation_test(self, initial_prompt, num_exchanges=3):
+        import os
+        marker = os.path.join(os.environ['RESULT_DIRECTORY'], 'crashed')
+        if initial_prompt == 'crash' and not os.path.exists(marker):
+            open(marker, 'w').close()
+            os._exit(1)
+        return super().run_static_conversation_test(initial_prompt, num_exchanges)
+
+def test_sharded_campaign_resumes_dead_shard_and_merges(tmp_path):
+    """A shard whose process dies is re-run and the merged report is complete"""
+    from campaign_runner import ShardedCampaign
+
+    tests = [{'id': f't{i}', 'type': 'static', 'prompt': 'p'} for i in range(12)]
+    tests.append({'id': 'crasher', 'type': 'static', 'prompt': 'crash'})
+    campaign = ShardedCampaign(CrashingTester, shards=3, result_dir=str(tmp_path),
+                               save_results=False, max_shard_retries=3)
+    summary = campaign.run(tests)
+
+    assert summary['total'] == 13
+    assert summary['completed'] == 13
+    with open(summary['report_file']) as f:
+        report = json.load(f)
+    assert {r['test_id'] for r in report['results']} == {t['id'] for t in tests}
+
+class AlwaysCrashingTester(FakeTester):
+    """Kills its worker process every time it sees the 'crash' prompt"""
+
+    def run_static_conversation_test(self, initial_prompt, num_exchanges=3):
+        import os
+        if initial_prompt == 'crash':
+            os._exit(1)
+        return super().run_static_conversation_test(initial_prompt, num_exchanges)
+
+def test_given_up_shard_does_not_affect_others(tmp_path):
+    """Healthy shards finish and the abandoned shard's missing tests are reported"""
+    from campaign_runner import ShardedCampaign, shard_for
+
+    tests = [{'id': f't{i}', 'type': 'static', 'prompt': 'p'} for i in range(12)]
+    tests.append({'id': 'crasher', 'type': 'static', 'prompt': 'crash'})
+    campaign = ShardedCampaign(AlwaysCrashingTester, shards=3, result_dir=str(tmp_path),
+                               save_results=False, max_shard_retries=1)
+    summary = campaign.run(tests)
+
+    crashed = shard_for('crasher', 3)
+    with open(summary['report_file']) as f:
+        statuses = {r['test_id']: r['status'] for r in json.load(f)['results']}
+    assert summary['total'] == 13
+    assert statuses['crasher'] == 'not_run'
+    assert summary['not_run'] >= 1
+    assert summary['completed'] + summary['not_run'] == 13
+    assert all(statuses[t['id']] == 'completed' for t in tests if shard_for(t['id'], 3) != crashed)
+
+def test_merge_ignores_shards_without_tests(tmp_path):
+    """Stale results left in a shard directory this run did not use are not merged"""
+    from campaign_runner import ShardedCampaign, shard_for
+
+    campaign = ShardedCampaign(FakeTester, shards=3, result_dir=str(tmp_path), save_results=False)
+    used = shard_for('only', 3)
+    for index in range(3):
+        if index != used:
+            writer = ResultWriter(os.path.join(campaign.shard_dir(index), 'results.jsonl'))
+            writer.write({'test_id': f'stale{index}', 'status': 'error'})
+            writer.close()
+
+    summary = campaign.run([{'id': 'only', 'type': 'static', 'prompt': 'p'}])
+    assert summary['total'] == 1
+    assert summary['completed'] == 1 and summary['failed'] == 0
+
+def test_resume_skips_completed_tests(tmp_path):
+    """A resumed run only re-runs failed, edited or new tests"""
+    tests = [
+        {'id': 'ok', 'type': 'static', 'prompt': 'p'},
+        {'id': 'fail', 'type': 'static', 'prompt': 'boom'}
+    ]
+    CampaignRunner(FakeTester, result_dir=str(tmp_path)).run(tests)
+
+    tests[1]['prompt'] = 'p'
+    tests.append({'id': 'new', 'type': 'static', 'prompt': 'p'})
+    summary = CampaignRunner(FakeTester, result_dir=str(tmp_path), resume=True).run(tests)
+
+    assert summary['skipped'] == 1
+    assert summary['completed'] == 2
+    statuses = [(r['test_id'], r['status']) for r in read_results(summary['results_file'])]
+    assert statuses[:2] == [('ok', 'completed'), ('fail', 'error')]
+    assert sorted(statuses[2:]) == [('fail', 'completed'), ('new', 'completed')]
+
+def test_resume_reruns_tests_when_settings_change(tmp_path, monkeypatch):
+    """Completed tests are re-run once the target, timeout or configuration changes"""
+    tests = [{'id': 'ok', 'type': 'static', 'prompt': 'p'}]
+    config = {'configuration': {'result_directory': str(tmp_path), 'model': 'gpt-4'}}
+    CampaignRunner.from_config(config, FakeTester).run(tests)
+
+    assert CampaignRunner.from_config(config, FakeTester, resume=True, workers=4).run(tests)['skipped'] == 1
+    assert CampaignRunner.from_config(config, FakeTester, resume=True, test_timeout=5).run(tests)['skipped'] == 0
+    config['configuration']['model'] = 'gpt-4o'
+    assert CampaignRunner.from_config(config, FakeTester, resume=True).run(tests)['skipped'] == 0
+    monkeypatch.setenv('OPENAI_BASE_URL', 'http://other/v1')
+    assert CampaignRunner.from_config(config, FakeTester, resume=True).run(tests)['skipped'] == 0
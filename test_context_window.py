@@ -0,0 +1,66 @@
+import pytest
+from context_window import FullHistory, SlidingWindow, TokenBudget, RollingSummary
+
+HISTORY = []
+for i in range(10):
+    HISTORY.extend([f"Question {i}. " + "detail " * 20, f"Answer {i}. " + "detail " * 20])
+
+def test_full_history_sends_everything():
+    """The default strategy reproduces the original message list"""
+    window = FullHistory().build("system", HISTORY, "next")
+    assert len(window.messages) == len(HISTORY) + 2
+    assert window.tokens_saved == 0
+
+def test_sliding_window_keeps_recent_exchanges():
+    """Only the last N exchanges are sent and the savings are reported"""
+    window = SlidingWindow(max_turns=2).build("system", HISTORY, "next")
+    assert [m['content'] for m in window.messages[1:-1]] == HISTORY[-4:]
+    assert window.messages[1]['role'] == 'user'
+    assert window.tokens_saved > 0
+
+def test_token_budget_stays_under_budget():
+    """Recent exchanges are added until the token budget is reached"""
+    window = TokenBudget(max_tokens=200).build("system", HISTORY, "next")
+    assert window.tokens_used <= 200
+    assert window.messages[-2]['content'] == HISTORY[-1]
+
+def test_rolling_summary_pins_system_prompt():
+    """Evicted exchanges are folded into a summary after the system prompt"""
+    strategy = RollingSummary(keep_turns=1)
+    window = strategy.build("system", HISTORY, "next")
+    assert window.messages[0] == {"role": "system", "content": "system"}
+    assert "Question 0" in window.messages[1]['content']
+    assert len(window.messages) == 5
+
+def test_chat_counts_saved_tokens_per_conversation(tmp_path, monkeypatch):
+    """Only completed exchanges add to tokens_saved, and a new conversation starts from zero"""
+    from types import SimpleNamespace
+    from chat_interface import ChatInterface
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    monkeypatch.chdir(tmp_path)
+
+    class Completions:
+        fail = False
+        def create(self, **request):
+            if self.fail:
+                raise RuntimeError('upstream error')
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content="Answer. " + "detail " * 20),
+                                         finish_reason='stop')],
+                created=0, model='gpt-4', usage=None)
+
+    chat = ChatInterface(context_strategy=SlidingWindow(max_turns=1))
+    completions = Completions()
+    chat.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    for i in range(3):
+        chat.send_message(f"Question {i}. " + "detail " * 20)
+    saved = chat.tokens_saved
+    assert saved > 0
+
+    completions.fail = True
+    with pytest.raises(RuntimeError):
+        chat.send_message("Question 3. " + "detail " * 20)
+    assert chat.tokens_saved == saved
+
+    chat.start_new_conversation()
+    assert chat.tokens_saved == 0
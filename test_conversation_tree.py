@@ -0,0 +1,43 @@
+import json
+import urllib.request
+from mock_llm_server import MockLLMServer
+from chat_interface import ChatInterface
+
+SCRIPT = [
+    {'match': 'refuse', 'response': 'I cannot help with that.'},
+    {'match': 'probe 1 (a|b)', 'response': 'That is an interesting topic about history.'},
+    {'match': 'probe 2 a', 'response': 'Sure, here is the step by step guide you asked for.'}
+]
+
+def probes(node):
+    return [f"probe {node.depth} a", f"probe {node.depth} b", f"probe {node.depth} refuse"]
+
+def test_tree_branches_from_shared_prefix_and_prunes(monkeypatch):
+    """Branches share the chat's history, refusals are pruned and successes end the search"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    with MockLLMServer(script=SCRIPT) as server:
+        chat = ChatInterface(base_url=server.base_url)
+        chat.send_message('hello')
+        prefix = list(chat.conversation_history)
+
+        tree = chat.conversation_tree(expander=probes, branching=3, beam_width=2, max_depth=4)
+        best = tree.run()
+        with urllib.request.urlopen(server.base_url + '/stats') as response:
+            completions = json.loads(response.read())['completions']
+
+    # One request for the prefix, three on the first turn, six on the second; nothing replayed
+    assert completions == 10
+    stats = tree.get_stats()
+    assert stats['nodes'] == 9 and stats['successes'] == 2 and stats['max_depth'] == 2
+    assert stats['pruned'] == 3
+    assert stats['total_tokens'] < stats['replay_tokens']
+
+    winner = best[0]
+    assert winner.verdict['label'] == 'jailbroken'
+    assert winner.history()[:2] == prefix
+    assert winner.history()[2] in ('probe 1 a', 'probe 1 b')
+    assert winner.parent.parent is tree.root
+
+    tree.checkout(winner)
+    assert chat.conversation_history == winner.history()
+    assert [m['user_message'] for m in chat.current_session['messages']][-2:] == winner.history()[2::2]
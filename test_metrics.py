@@ -0,0 +1,86 @@
+import json
+import urllib.request
+import pytest
+from agents.metrics import MetricsRegistry, MetricsServer, merge_summaries, quantile, set_metrics
+from agents.rate_limiter import RateLimiter, set_rate_limiter
+from agents.chat_injector_agent import ChatInjectorAgent
+from campaign_runner import CampaignRunner
+from mock_llm_server import MockLLMServer
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    set_metrics(registry)
+    set_rate_limiter(RateLimiter(base_delay=0.01, max_delay=0.05, max_retries=10))
+    yield registry
+    set_metrics(None)
+    set_rate_limiter(None)
+
+def test_quantiles_interpolate_within_buckets():
+    """p50/p95/p99 are estimated from cumulative bucket counts"""
+    registry = MetricsRegistry()
+    for value in range(1, 101):
+        registry.observe('latency', value / 1000, buckets=(0.025, 0.05, 0.075, 0.1))
+    stats = registry.summary()['histograms']['latency']
+    assert stats['count'] == 100
+    assert abs(stats['p50'] - 0.05) < 1e-9
+    assert abs(stats['p99'] - 0.099) < 1e-9
+    assert quantile([(1.0, 0), (float('inf'), 0)], 0.5) is None
+
+def test_summary_since_and_merge():
+    """A run summary excludes earlier observations and shard summaries add up"""
+    registry = MetricsRegistry()
+    registry.inc('calls_total', outcome='success')
+    registry.observe('latency', 0.2)
+    before = registry.summary()
+    registry.inc('calls_total', 2, outcome='success')
+    registry.observe('latency', 0.02)
+
+    run = registry.summary(since=before)
+    assert run['counters'] == {'calls_total{outcome="success"}': 2}
+    assert run['histograms']['latency']['count'] == 1
+
+    merged = merge_summaries([before, run])
+    assert merged['counters']['calls_total{outcome="success"}'] == 3
+    assert merged['histograms']['latency']['count'] == 2
+
+def test_model_calls_are_instrumented_and_exported(registry):
+    """Latency, tokens and retries of real client calls reach the exporter"""
+    with MockLLMServer(rate_limit_rate=0.3, retry_after=0.01, seed=3) as server:
+        agent = ChatInjectorAgent(base_url=server.base_url)
+        for i in range(5):
+            result = agent.execute_injection({}, {'content': f'prompt {i}'}, 'http://target')
+        assert result['usage']['total_tokens'] > 0
+
+    summary = registry.summary()
+    assert summary['counters']['llm_requests_total{model="gpt-4",outcome="success"}'] == 5
+    assert summary['counters']['llm_completion_tokens_total{model="gpt-4"}'] > 0
+    assert summary['counters'].get('llm_retries_total{reason="429"}', 0) > 0
+    assert summary['histograms']['llm_request_attempts']['count'] == 5
+    assert summary['histograms']['pipeline_stage_seconds{stage="injection"}']['count'] == 5
+
+    exporter = MetricsServer(registry, port=0).start()
+    try:
+        with urllib.request.urlopen(exporter.url) as response:
+            text = response.read().decode('utf-8')
+    finally:
+        exporter.stop()
+    assert '# TYPE llm_request_seconds histogram' in text
+    assert 'llm_request_seconds_bucket{model="gpt-4",outcome="success",le="+Inf"} 5' in text
+
+def test_campaign_writes_metrics_summary(registry, tmp_path):
+    """Each campaign run writes its own metrics summary next to the results"""
+    class QuickTester:
+        def run_static_conversation_test(self, initial_prompt, num_exchanges=3):
+            return {'status': 'completed'}
+
+    tests = [{'id': f't{i}', 'type': 'static', 'prompt': 'p'} for i in range(4)]
+    runner = CampaignRunner(QuickTester, workers=2, result_dir=str(tmp_path), save_results=False)
+    summary = runner.run(tests)
+    runner.run(tests)
+
+    with open(summary['metrics_file']) as f:
+        metrics = json.load(f)
+    assert metrics['counters'] == {'campaign_tests_total{status="completed"}': 4}
+    assert metrics['histograms']['campaign_queue_wait_seconds']['count'] == 4
+    assert metrics['campaign']['completed'] == 4
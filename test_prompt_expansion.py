@@ -0,0 +1,41 @@
+import pytest
+from agents.prompt_agent import PromptAgent
+from agents.prompt_expansion import PromptExpansion
+
+GRID = {'persona': ['DAN', 'Grandma'], 'topic': ['passwords', 'malware', 'keys'], 'unused': [1, 2]}
+
+def test_product_only_varies_used_keys():
+    """Each template expands over the grid keys it uses, in order"""
+    expansion = PromptExpansion(["As {persona}, explain {topic}", "Plain prompt"], GRID)
+    prompts = [prompt for _, _, prompt in expansion]
+    assert len(expansion) == len(prompts) == 7
+    assert prompts[0] == "As DAN, explain passwords"
+    assert prompts[-1] == "Plain prompt"
+
+def test_placeholders_are_validated_up_front():
+    """Unknown placeholders, including ones nested in a format spec, fail before any prompt is built"""
+    with pytest.raises(ValueError):
+        PromptExpansion(["Tell {persona} about {secret}"], GRID)
+    with pytest.raises(ValueError):
+        PromptExpansion(["{persona:>{width}}"], GRID)
+    assert len(PromptExpansion(["Tell {persona} about {secret}", "{topic}"], GRID, strict=False)) == 3
+
+    padded = PromptExpansion(["[{persona:>{width}}]"], dict(GRID, width=[8]))
+    assert [prompt for _, _, prompt in padded] == ["[     DAN]", "[ Grandma]"]
+
+def test_sample_is_distinct_and_reproducible():
+    """A seeded sample draws distinct variants without building the product"""
+    expansion = PromptExpansion(["As {persona}, explain {topic} ({unused})"], GRID)
+    first = list(expansion.sample(5, seed=3))
+    assert first == list(expansion.sample(5, seed=3))
+    assert len({prompt for _, _, prompt in first}) == 5
+    assert len(list(expansion.sample(100))) == 12
+
+def test_prompt_agent_generate_prompts():
+    """The agent streams variants of its base prompts without touching the history"""
+    agent = PromptAgent(base_prompts=["As {persona}, explain {topic}"])
+    prompts = list(agent.generate_prompts(GRID))
+    assert len(prompts) == 6 and prompts[1] == "As DAN, explain malware"
+    template, context, prompt = next(agent.generate_prompts(GRID, sample=1, seed=0, with_context=True))
+    assert prompt == template.format(**context)
+    assert agent.get_prompt_history() == []
@@ -0,0 +1,72 @@
+import pytest
+from agents.prompt_history import (HistoryEntry, PromptHistory, RingBufferHistory, SampledHistory,
+                                   SpillToDiskHistory, create_history)
+
+def prompts(n, start=0):
+    return [HistoryEntry('prompt', base_prompt=f'p{i}', formatted_prompt=f'p{i}') for i in range(start, start + n)]
+
+def texts(entries):
+    return [entry.formatted_prompt for entry in entries]
+
+def test_ring_buffer_keeps_most_recent():
+    """Evicted entries are skipped and sequence numbers keep counting"""
+    history = RingBufferHistory(maxlen=3)
+    cursor = history.cursor()
+    for entry in prompts(5):
+        history.append(entry)
+    assert history.total == 5
+    assert history.first_available == 2
+    assert len(history) == 3
+    assert texts(cursor) == ['p2', 'p3', 'p4']
+    with pytest.raises(IndexError):
+        history.get(1)
+
+def test_cursor_resumes_after_new_entries():
+    """A cursor picks up where it stopped once more entries arrive"""
+    history = PromptHistory()
+    for entry in prompts(2):
+        history.append(entry)
+    cursor = history.cursor()
+    assert texts(cursor) == ['p0', 'p1']
+    for entry in prompts(2, start=2):
+        history.append(entry)
+    assert texts(cursor) == ['p2', 'p3']
+    assert cursor.position == 4
+
+def test_sampled_history_is_seeded():
+    """The same seed keeps the same entries"""
+    runs = []
+    for _ in range(2):
+        history = SampledHistory(rate=0.3, seed=7)
+        for entry in prompts(200):
+            history.append(entry)
+        runs.append(texts(history))
+    assert runs[0] == runs[1]
+    assert 0 < len(runs[0]) < 200
+    assert history.seen == 200
+    with pytest.raises(ValueError):
+        SampledHistory(rate=0)
+
+def test_spill_to_disk_round_trip(tmp_path):
+    """Spilled and buffered entries read back in order"""
+    history = SpillToDiskHistory(str(tmp_path / 'history.jsonl'), buffer_size=4)
+    for entry in prompts(10):
+        history.append(entry)
+    assert history._spilled == 8
+    assert texts(history) == [f'p{i}' for i in range(10)]
+    assert history.get(3).formatted_prompt == 'p3'
+    history.flush()
+    assert texts(history.cursor(7)) == ['p7', 'p8', 'p9']
+
+def test_sampled_spill_history_reads_file_once(tmp_path, monkeypatch):
+    """A cursor over a sampled spill history reads spilled entries sequentially"""
+    inner = SpillToDiskHistory(str(tmp_path / 'history.jsonl'), buffer_size=5)
+    history = create_history('sampled', rate=1, inner=inner)
+    for entry in prompts(12):
+        history.append(entry)
+
+    reads = []
+    read_spilled = inner._read_spilled
+    monkeypatch.setattr(inner, '_read_spilled', lambda start: reads.append(start) or read_spilled(start))
+    assert texts(history) == [f'p{i}' for i in range(12)]
+    assert reads == [0]
@@ -0,0 +1,126 @@
+import time
+import asyncio
+from types import SimpleNamespace
+import pytest
+from agents.rate_limiter import RateLimiter, TokenBucket, estimate_tokens
+
+class FakeRateLimitError(Exception):
+    """Mimics the status_code attribute of openai.RateLimitError"""
+    status_code = 429
+
+def test_token_bucket_reserves_into_debt():
+    """Draining the bucket yields a wait proportional to the debt"""
+    bucket = TokenBucket(per_minute=60)
+    now = time.monotonic()
+    assert bucket.reserve(60, now) == 0.0
+    assert abs(bucket.reserve(1, now) - 1.0) < 1e-6
+
+def test_limiter_throttles_requests_per_minute():
+    """Requests over the per-minute budget are spaced out"""
+    limiter = RateLimiter(requests_per_minute=600)
+    limiter.requests.balance = 0
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.25
+
+def test_retries_rate_limit_errors_and_backs_off():
+    """A 429 is retried, and the effective rate is reduced"""
+    limiter = RateLimiter(requests_per_minute=6000, base_delay=0.01, max_retries=3)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise FakeRateLimitError()
+        return 'ok'
+
+    assert limiter.call(flaky) == 'ok'
+    state = limiter.get_state()
+    assert state['retries'] == 2
+    assert state['throttled'] == 2
+    assert state['rate_factor'] < 1.0
+    assert state['in_flight'] == 0
+
+def test_gives_up_after_max_retries():
+    """Persistent errors are re-raised once retries are exhausted"""
+    limiter = RateLimiter(base_delay=0.001, max_retries=2)
+
+    async def always_limited():
+        raise FakeRateLimitError()
+
+    with pytest.raises(FakeRateLimitError):
+        asyncio.run(limiter.acall(always_limited))
+    assert limiter.get_state()['failures'] == 1
+
+def test_failed_attempts_refund_their_tokens():
+    """Retries charge the request budget but not the token budget"""
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=60000, base_delay=0.001, max_retries=3)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise FakeRateLimitError()
+        return 'ok'
+
+    assert limiter.call(flaky, tokens=10000) == 'ok'
+    # Only the successful attempt's tokens are still reserved, while all three requests are
+    assert 49000 < limiter.tokens.balance <= 50100
+    assert limiter.requests.balance <= 597.1
+
+def test_estimate_tokens_includes_completion_budget():
+    """Estimated cost covers prompt characters and max_tokens"""
+    request = {'messages': [{'role': 'user', 'content': 'x' * 400}], 'max_tokens': 100}
+    assert estimate_tokens(request) == 200
+
+class RecordingLimiter(RateLimiter):
+    """Keeps the actual token counts it is reconciled with"""
+
+    def __init__(self):
+        super().__init__()
+        self.reconciled = []
+
+    def reconcile(self, estimated, actual):
+        self.reconciled.append(actual)
+
+class FakeClient:
+    """Answers every create call with a fixed object"""
+
+    def __init__(self, answer):
+        self.chat = SimpleNamespace(completions=self)
+        self.answer = answer
+
+    def create(self, **request):
+        return self.answer
+
+class DroppedStream:
+    """Sends one chunk, then fails like a dropped connection"""
+
+    def __iter__(self):
+        delta = SimpleNamespace(content='partial answer')
+        yield SimpleNamespace(id='c1', created=1, usage=None,
+                              choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+        raise ConnectionError('stream dropped')
+
+    def close(self):
+        pass
+
+def test_streams_reconcile_spent_tokens():
+    """Failed streams and whole completions from non-streaming clients are charged"""
+    from agents import clients
+    from agents.rate_limiter import set_rate_limiter
+    limiter = RecordingLimiter()
+    set_rate_limiter(limiter)
+    request = {'model': 'gpt-4', 'messages': [{'role': 'user', 'content': 'hi'}]}
+    try:
+        with pytest.raises(ConnectionError):
+            clients.stream_completion(FakeClient(DroppedStream()), **request)
+        completion = SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=5, completion_tokens=3,
+                                                                       total_tokens=8))
+        assert clients.stream_completion(FakeClient(completion), **request) is completion
+    finally:
+        set_rate_limiter(None)
+
+    partial = estimate_tokens({'messages': request['messages']}) + len('partial answer') // 4
+    assert limiter.reconciled == [partial, 8]
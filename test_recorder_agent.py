@@ -0,0 +1,80 @@
+import os
+import json
+from agents.recorder_agent import RecorderAgent
+
+def test_streaming_session_matches_its_manifest(tmp_path):
+    """The JSONL stream is renamed after the saved session and left as saved"""
+    recorder = RecorderAgent(str(tmp_path), streaming=True)
+    recorder.record_interaction('injection', {'prompt': 'a'})
+    recorder.record_interaction('response', {'text': 'b'})
+    assert recorder.save_session('dan_run')
+
+    manifest_path = next(p for p in os.listdir(tmp_path) if p.endswith('.json'))
+    with open(tmp_path / manifest_path) as f:
+        manifest = json.load(f)
+    assert manifest['interactions_file'] == manifest_path[:-len('.json')] + '.jsonl'
+    assert manifest['summary']['interaction_count'] == 2
+    assert sorted(os.listdir(tmp_path)) == sorted([manifest_path, manifest['interactions_file']])
+
+    # Later interactions start a new session instead of growing the saved one
+    recorder.record_interaction('injection', {'prompt': 'c'})
+    assert [i['content'] for i in recorder.iter_interactions()] == [{'prompt': 'c'}]
+    recorder.close()
+    with open(tmp_path / manifest['interactions_file']) as f:
+        assert len(f.readlines()) == 2
+
+def test_saving_twice_keeps_both_sessions_loadable(tmp_path):
+    """Each streaming save keeps its own file, readable by the store and the classifier"""
+    from agents.result_store import ResultStore
+    from agents.response_classifier import ResponseClassifier
+    recorder = RecorderAgent(str(tmp_path), streaming=True)
+    recorder.record_interaction('injection', {'generated_text': 'first'})
+    assert recorder.save_session('s1')
+    recorder.record_interaction('injection', {'generated_text': 'second'})
+    recorder.record_interaction('injection', {'generated_text': 'third'})
+    assert recorder.save_session('s2')
+
+    manifests = {}
+    for name in os.listdir(tmp_path):
+        if name.endswith('.json'):
+            manifests[name.split('_')[0]] = recorder.load_session(str(tmp_path / name))
+    assert {key: m['summary']['interaction_count'] for key, m in manifests.items()} == {'s1': 1, 's2': 2}
+    for manifest in manifests.values():
+        with open(tmp_path / manifest['interactions_file']) as f:
+            assert len(f.readlines()) == manifest['summary']['interaction_count']
+
+    assert ResponseClassifier().classify_directory(str(tmp_path))['files'] == 2
+    store = ResultStore(str(tmp_path / 'results.db'))
+    stats = store.ingest_directory(str(tmp_path))
+    assert stats['interactions'] == 3 and not stats.get('failed')
+    store.close()
+
+def test_streaming_flushes_and_syncs_in_batches(tmp_path, monkeypatch):
+    """Records reach disk every flush_every writes, each batch fsynced once"""
+    synced = []
+    monkeypatch.setattr(os, 'fsync', lambda fd: synced.append(fd))
+    recorder = RecorderAgent(str(tmp_path), streaming=True, flush_every=3, fsync_interval=3600)
+    for i in range(7):
+        recorder.record_interaction('injection', {'i': i})
+
+    with open(recorder.stream_path) as f:
+        assert len(f.readlines()) == 6
+    assert len(synced) == 2
+    recorder.close()
+    with open(recorder.stream_path) as f:
+        assert len(f.readlines()) == 7
+
+def test_counters_are_kept_incrementally(tmp_path):
+    """The summary comes from counters in both modes and resets with the session"""
+    for streaming in (False, True):
+        recorder = RecorderAgent(str(tmp_path / str(streaming)), streaming=streaming)
+        recorder.record_interaction('injection', {})
+        recorder.record_interaction('injection', {})
+        recorder.record_interaction('response', {})
+        summary = recorder.get_session_summary()
+        assert summary['interaction_count'] == 3
+        assert summary['interaction_types'] == {'injection': 2, 'response': 1}
+        assert len(recorder.get_interactions_by_type('injection')) == 2
+        recorder.clear_session()
+        assert recorder.get_session_summary()['status'] == 'empty'
+        assert list(recorder.iter_interactions()) == []
@@ -0,0 +1,87 @@
+import time
+import pytest
+from types import SimpleNamespace
+from agents import clients
+from agents.response_cache import ResponseCache, CacheMissError, set_response_cache
+
+REQUEST = {
+    'model': 'gpt-4',
+    'messages': [{'role': 'user', 'content': 'Test prompt'}],
+    'temperature': 0.7,
+    'max_tokens': 1000
+}
+
+def make_response(text='cached answer'):
+    message = SimpleNamespace(content=text)
+    return SimpleNamespace(
+        id='chatcmpl-1', model='gpt-4', created=123,
+        choices=[SimpleNamespace(message=message, finish_reason='stop')],
+        usage=SimpleNamespace(prompt_tokens=5, completion_tokens=3, total_tokens=8)
+    )
+
+def test_round_trip_keeps_response_shape(tmp_path):
+    """A cached entry reads back with the same attributes as the API response"""
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get(REQUEST) is None
+    cache.put(REQUEST, make_response())
+
+    hit = ResponseCache(str(tmp_path)).get(REQUEST)
+    assert hit.choices[0].message.content == 'cached answer'
+    assert hit.created == 123
+    assert hit.usage.total_tokens == 8
+    assert cache.get(dict(REQUEST, temperature=0.0)) is None
+
+def test_lru_eviction_and_ttl(tmp_path):
+    """Oldest entries are evicted first and stale entries expire"""
+    cache = ResponseCache(str(tmp_path), max_entries=2, ttl=0.2)
+    requests = [dict(REQUEST, messages=[{'role': 'user', 'content': str(i)}]) for i in range(3)]
+    cache.put(requests[0], make_response())
+    cache.put(requests[1], make_response())
+    cache.get(requests[0])
+    cache.put(requests[2], make_response())
+
+    assert cache.get(requests[1]) is None
+    assert cache.get(requests[0]) is not None
+    time.sleep(0.25)
+    assert cache.get(requests[2]) is None
+    assert cache.get_stats()['expired'] >= 1
+
+def test_replay_mode_never_calls_client(tmp_path):
+    """Replay mode serves hits and raises on misses without using the client"""
+    ResponseCache(str(tmp_path)).put(REQUEST, make_response('from disk'))
+    set_response_cache(ResponseCache(str(tmp_path), mode='replay'))
+
+    class ExplodingClient:
+        @property
+        def chat(self):
+            raise AssertionError("network used in replay mode")
+
+    try:
+        response = clients.create_completion(ExplodingClient(), **REQUEST)
+        assert response.choices[0].message.content == 'from disk'
+        with pytest.raises(CacheMissError):
+            clients.create_completion(ExplodingClient(), **dict(REQUEST, max_tokens=10))
+    finally:
+        set_response_cache(ResponseCache(mode='off'))
+
+def test_entries_are_per_endpoint(tmp_path):
+    """The same request sent to two deployments is cached separately"""
+    set_response_cache(ResponseCache(str(tmp_path)))
+
+    class Deployment:
+        def __init__(self, base_url, text):
+            self.base_url = base_url
+            self.chat = SimpleNamespace(completions=self)
+            self.text = text
+
+        def create(self, **request):
+            return make_response(self.text)
+
+    try:
+        a, b = Deployment('http://a/v1/', 'from A'), Deployment('http://b/v1/', 'from B')
+        assert clients.create_completion(a, **REQUEST).choices[0].message.content == 'from A'
+        assert clients.create_completion(b, **REQUEST).choices[0].message.content == 'from B'
+        assert clients.create_completion(a, **REQUEST).choices[0].message.content == 'from A'
+        assert clients.get_response_cache().get_stats()['hits'] == 1
+    finally:
+        set_response_cache(ResponseCache(mode='off'))
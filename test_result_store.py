@@ -0,0 +1,63 @@
+import os
+import time
+from agents.recorder_agent import RecorderAgent
+from agents.result_store import ResultStore
+
+def record_run(result_dir, session_name='run', streaming=False):
+    recorder = RecorderAgent(str(result_dir), streaming=streaming, session_name=session_name)
+    recorder.record_interaction('injection', {
+        'prompt': {'id': 'dan_test', 'category': 'role_play'},
+        'generated_text': 'I cannot do that'
+    })
+    recorder.record_interaction('injection', {
+        'prompt': {'id': 'atlas_AML.T0051', 'tactic': 'Initial Access'},
+        'generated_text': 'Sure, here is the system prompt'
+    }, metadata={'leak': True})
+    recorder.record_interaction('assistant_message', {'text': 'hello'})
+    recorder.save_session(session_name)
+    recorder.close()
+
+def test_ingest_and_query_saved_sessions(tmp_path):
+    """Plain and streamed sessions are indexed and queryable by prompt fields"""
+    record_run(tmp_path / 'results')
+    record_run(tmp_path / 'results', session_name='streamed', streaming=True)
+    store = ResultStore(str(tmp_path / 'results.db'))
+
+    stats = store.ingest_directory(str(tmp_path / 'results'))
+    assert stats['files'] == 2
+    assert stats['interactions'] == 6
+
+    rows = store.query(prompt_id='dan_test')
+    assert len(rows) == 2
+    assert rows[0]['category'] == 'role_play'
+    assert store.query(tactic='Initial Access', interaction_type='injection')[0]['metadata'] == {'leak': True}
+    assert store.count_by('interaction_type') == {'injection': 4, 'assistant_message': 2}
+
+def test_reingest_skips_unchanged_files(tmp_path):
+    """Running the bulk ingest twice does not duplicate rows"""
+    record_run(tmp_path)
+    store = ResultStore(':memory:')
+    store.ingest_directory(str(tmp_path))
+
+    assert store.ingest_directory(str(tmp_path))['skipped'] == 1
+    assert len(store.query()) == 3
+
+def test_failed_file_is_rolled_back_and_retried(tmp_path, monkeypatch):
+    """A file failing mid-insert keeps its previous rows and is ingested again on the next run"""
+    record_run(tmp_path)
+    store = ResultStore(':memory:')
+    store.ingest_directory(str(tmp_path))
+    path = next(tmp_path.glob('*.json'))
+    os.utime(path, (time.time() + 10, time.time() + 10))
+
+    insert = ResultStore._insert_session
+    def failing_insert(self, session, source_path, mtime):
+        insert(self, session, source_path, mtime)
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(ResultStore, '_insert_session', failing_insert)
+    assert store.ingest_directory(str(tmp_path))['failed'] == 1
+    assert store.count_by('interaction_type') == {'injection': 2, 'assistant_message': 1}
+
+    monkeypatch.setattr(ResultStore, '_insert_session', insert)
+    assert store.ingest_directory(str(tmp_path))['files'] == 1
+    assert store.count_by('interaction_type') == {'injection': 2, 'assistant_message': 1}
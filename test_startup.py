@@ -0,0 +1,21 @@
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def loaded_modules(code, cwd):
+    probe = f"import sys, json\n{code}\nprint(json.dumps(sorted(m for m in ('openai', 'yaml', 'pandas', 'bs4', 'requests') if m in sys.modules)))"
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, '-c', probe], cwd=cwd, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def test_agents_load_lazily(tmp_path):
+    """Importing and constructing agents does not pull in heavy dependencies or touch disk"""
+    assert loaded_modules("import agents", tmp_path) == []
+    assert loaded_modules("from agents import PromptAgent; PromptAgent(['hi']).generate_prompt()", tmp_path) == []
+    assert loaded_modules("from agents import ChatInjectorAgent; ChatInjectorAgent()", tmp_path) == []
+    assert loaded_modules("from agents import PromptSourceAgent; PromptSourceAgent()", tmp_path) == []
+    assert not (tmp_path / 'prompts').exists()